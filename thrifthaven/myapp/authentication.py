@@ -0,0 +1,67 @@
+"""
+JWT authentication with the user loaded from a small in-process LRU instead of
+one ``User`` query per request.
+
+Entries are keyed by user id and token version (simplejwt's password-hash
+claim when ``CHECK_REVOKE_TOKEN`` is on, so a new password never matches an old
+entry), live ``AUTH_USER_CACHE_TTL`` seconds and are dropped as soon as the
+user is saved or deleted in this process (shop/signals.py); other processes
+see the change within the TTL. Only users that passed every check
+(active, password claim) are cached; each request gets its own copy.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+class UserLRU:
+    def __init__(self):
+        self.entries = OrderedDict()  # (user_id, version) -> (expires, user)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, user):
+        ttl = getattr(settings, "AUTH_USER_CACHE_TTL", 30)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, user)
+            self.entries.move_to_end(key)
+            while len(self.entries) > getattr(settings, "AUTH_USER_CACHE_SIZE", 1024):
+                self.entries.popitem(last=False)
+
+    def forget(self, user_id):
+        user_id = str(user_id)
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == user_id]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+users = UserLRU()
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or getattr(settings, "AUTH_USER_CACHE_TTL", 30) <= 0:
+            return super().get_user(validated_token)
+        key = (str(user_id), validated_token.get(api_settings.REVOKE_TOKEN_CLAIM))
+        user = users.get(key)
+        if user is None:
+            user = super().get_user(validated_token)  # raises for unknown / inactive / revoked
+            users.put(key, user)
+        # a view may change request.user; that must not leak into the next request
+        return copy.copy(user)
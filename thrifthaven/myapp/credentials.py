@@ -0,0 +1,57 @@
+"""
+Email + password checks for ``signin``.
+
+Emails are matched case-insensitively through the ``lower(email)`` index
+(myapp migration 0009). The password hash is verified on a bounded pool of
+``PASSWORD_HASH_WORKERS`` threads: a burst of sign-ins queues for those instead
+of taking every CPU from the requests being served next to them. ``check`` is a
+coroutine that awaits the hash rather than blocking on it, so a sign-in holds a
+pool thread for the hash and no request thread at all while it waits. Unknown
+emails and inactive users cost one hash with the default hasher, like a real
+check, and hashes made with an older hasher or work factor are upgraded on a
+good login.
+
+This replaces ``authenticate()``: AUTHENTICATION_BACKENDS are not consulted
+(only the model's own password hash is), and ``signin`` sends
+``user_login_failed`` itself.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX, verify_password
+from django.contrib.auth.models import User
+from django.db.models.functions import Lower
+
+# threads start on first use
+pool = ThreadPoolExecutor(max_workers=getattr(settings, "PASSWORD_HASH_WORKERS", None) or os.cpu_count() or 1,
+                          thread_name_prefix="password-hash")
+
+def normalize_email(email):
+    return (email or "").strip().lower()
+
+def user_by_email(email):
+    """The user with this email, any case; the oldest account if several share it."""
+    return (User.objects.alias(email_key=Lower("email")).filter(email_key=normalize_email(email))
+            .order_by("id").first())
+
+async def check(email, password):
+    """The active user with these credentials, or None; takes about one hash either way."""
+    if not isinstance(email, str) or not email or not isinstance(password, str):
+        return None
+    user = await sync_to_async(user_by_email)(email)
+    # an unusable hash still runs the default hasher once (verify_password's fake runtime)
+    encoded = user.password if user is not None and user.is_active else UNUSABLE_PASSWORD_PREFIX
+    # only the hash runs on the pool: no DB connection opens on its threads
+    correct, must_update = await asyncio.get_running_loop().run_in_executor(pool, verify_password, password, encoded)
+    if not correct:
+        return None
+    if must_update:
+        await sync_to_async(upgrade)(user, password)
+    return user
+
+def upgrade(user, password):
+    user.set_password(password)
+    user._password = None  # an upgrade, not a password change
+    user.save(update_fields=["password"])
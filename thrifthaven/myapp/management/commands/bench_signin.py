@@ -0,0 +1,60 @@
+import logging
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from myapp.models import Profile
+
+class Command(BaseCommand):
+    help = "Sign in from concurrent clients against /api/auth/signin/; reports throughput and latency for good, wrong and unknown credentials."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=48, help="sign-ins per run")
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+
+    def handle(self, *args, **opts):
+        logging.getLogger("django.request").setLevel(logging.ERROR)  # no "Unauthorized" line per 401
+        # committed, so the client threads (each on its own connection) see them
+        users = [User.objects.create_user(username=f"bench-signin-{i}@example.com", email=f"Bench-Signin-{i}@Example.com",
+                                          password="correct horse") for i in range(8)]
+        Profile.objects.bulk_create([Profile(user=u, phone=f"9{u.pk:09d}"[-10:]) for u in users], ignore_conflicts=True)
+        try:
+            cases = [
+                ("good", lambda i: (users[i % len(users)].email.upper(), "correct horse"), 200),
+                ("wrong password", lambda i: (users[i % len(users)].email, "battery staple"), 401),
+                ("unknown email", lambda i: (f"nobody-{i}@example.com", "correct horse"), 401),
+            ]
+            for concurrency in opts["concurrency"]:
+                for name, credentials, expected in cases:
+                    took, latencies = self.run(opts["requests"], concurrency, credentials, expected)
+                    self.stdout.write(
+                        f"c={concurrency:<3} {name:<15} {opts['requests'] / took:7.1f}/s  "
+                        f"p50 {statistics.median(latencies) * 1000:7.1f}ms  max {max(latencies) * 1000:7.1f}ms"
+                    )
+        finally:
+            User.objects.filter(pk__in=[u.pk for u in users]).delete()
+
+    def run(self, count, concurrency, credentials, expected):
+        def one(i):
+            email, password = credentials(i)
+            start = time.perf_counter()
+            response = Client(HTTP_HOST="localhost").post(
+                "/api/auth/signin/", {"email": email, "password": password}, content_type="application/json"
+            )
+            took = time.perf_counter() - start
+            assert response.status_code == expected, (response.status_code, response.content)
+            return took
+
+        def worker(i):
+            try:
+                return one(i)
+            finally:
+                connections.close_all()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(worker, range(count)))
+        return time.perf_counter() - start, latencies
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:11
+
+import shop.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_profile_created_at_profile_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='profile_picture',
+            field=models.ImageField(blank=True, default='profile_pictures/default.png', null=True, storage=shop.storage.content_storage, upload_to='profile_pictures/'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:02
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_profile_picture_content_storage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # signin looks users up by lower(email) (myapp/credentials.py); auth_user has no index on email at all
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS "auth_user_email_lower_idx" ON "auth_user" (lower("email"));',
+            reverse_sql='DROP INDEX IF EXISTS "auth_user_email_lower_idx";',
+        ),
+    ]
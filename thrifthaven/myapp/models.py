@@ -1,11 +1,13 @@
 from django.db import models
 from django.contrib.auth.models import User
+from shop.storage import content_storage
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     phone = models.CharField(max_length=10, unique=True)
     profile_picture = models.ImageField(
         upload_to="profile_pictures/",
+        storage=content_storage,
         blank=True,
         null=True,
         default="profile_pictures/default.png"
@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.db import transaction
+from shop.images import srcset
+from shop.jobs import enqueue
+from shop.sparse import SparseFieldsMixin
+from .credentials import normalize_email, user_by_email
 from .models import Profile
 
 # ------------------ USER SERIALIZER ------------------
@@ -15,8 +19,9 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['email', 'password', 'confirm_password', 'phone', 'location']
 
     def validate(self, data):
-        # Check if email already exists
-        if User.objects.filter(username=data['email']).exists():
+        # Check if email already exists, in any case (signin matches it that way)
+        data['email'] = normalize_email(data['email'])
+        if User.objects.filter(username=data['email']).exists() or user_by_email(data['email']):
             raise serializers.ValidationError({"email": "User with this email already exists."})
 
         # Check password match
@@ -54,15 +59,21 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 # ------------------ PROFILE SERIALIZER ------------------
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     email = serializers.EmailField(source="user.email", read_only=True)
     username = serializers.CharField(source="user.username", required=False)
     profile_picture = serializers.SerializerMethodField()
+    profile_picture_srcset = serializers.SerializerMethodField()
     location = serializers.CharField(required=False)
 
     class Meta:
         model = Profile
-        fields = ['email', 'username', 'phone', 'profile_picture', 'location']
+        fields = ['email', 'username', 'phone', 'profile_picture', 'profile_picture_srcset', 'location']
+        # ?fields= (shop/sparse.py)
+        field_columns = {
+            'email': ['user__email'], 'username': ['user__username'],
+            'profile_picture_srcset': ['profile_picture'],
+        }
 
     def get_profile_picture(self, obj):
         request = self.context.get("request")
@@ -70,6 +81,9 @@ class ProfileSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.profile_picture.url)
         return None
 
+    def get_profile_picture_srcset(self, obj):
+        return srcset(obj.profile_picture, self.context.get("request"))
+
     def update(self, instance, validated_data):
         # Extract nested user data
         user_data = validated_data.pop('user', {})
@@ -83,6 +97,7 @@ class ProfileSerializer(serializers.ModelSerializer):
             instance.user.save()
 
         # --- Handle profile picture update explicitly ---
+        profile_picture = None
         if "profile_picture" in validated_data:
             profile_picture = validated_data.pop("profile_picture")
             if profile_picture:
@@ -94,4 +109,7 @@ class ProfileSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
 
         instance.save()
+        if profile_picture:
+            # resized variants are built by the job worker, not in the request
+            enqueue("image_variants", source=instance.profile_picture.name)
         return instance
@@ -1,3 +1,64 @@
+import asyncio
+import threading
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import verify_password
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_login_failed
 from django.test import TestCase
+from rest_framework.test import APIClient
+from .credentials import check
 
-# Create your tests here.
+class SigninTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("ada", email="Ada@Example.com", password="correct horse")
+
+    def signin(self, data, **kwargs):
+        return APIClient().post("/api/auth/signin/", data, **kwargs)
+
+    def test_signin(self):
+        response = self.signin({"email": " ada@example.COM", "password": "correct horse"}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIn("access", response.json())
+        # form posts are parsed too
+        self.assertEqual(self.signin({"email": "ada@example.com", "password": "correct horse"}).status_code, 200)
+        self.assertEqual(self.signin({"email": "ada@example.com", "password": "wrong"}, format="json").status_code, 401)
+        self.assertEqual(self.signin({"email": "nobody@example.com", "password": "x"}, format="json").status_code, 401)
+        self.assertEqual(self.signin({"email": "ada@example.com", "password": 1}, format="json").status_code, 401)
+
+    def test_failures_send_user_login_failed(self):
+        failed = mock.Mock()
+        user_login_failed.connect(failed)
+        self.addCleanup(user_login_failed.disconnect, failed)
+        self.signin({"email": "ada@example.com", "password": "correct horse"}, format="json")
+        failed.assert_not_called()
+        self.signin({"email": "ada@example.com", "password": "wrong"}, format="json")
+        failed.assert_called_once()
+        self.assertEqual(failed.call_args.kwargs["credentials"], {"email": "ada@example.com"})
+        self.assertIn("request", failed.call_args.kwargs)
+
+    def test_bad_requests(self):
+        response = self.signin("{", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("detail", response.json())
+        self.assertEqual(APIClient().get("/api/auth/signin/").status_code, 405)
+
+    async def test_hash_does_not_hold_the_sync_thread(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_verify(password, encoded):
+            started.set()
+            release.wait(5)
+            return verify_password(password, encoded)
+
+        with mock.patch("myapp.credentials.verify_password", slow_verify):
+            signing_in = asyncio.ensure_future(check("ada@example.com", "correct horse"))
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+                # the thread sync views (and sync_to_async) run on is free while the hash runs
+                count = await asyncio.wait_for(sync_to_async(User.objects.count)(), 2)
+            finally:
+                release.set()
+            self.assertEqual(count, 1)
+            self.assertEqual((await signing_in).pk, self.user.pk)
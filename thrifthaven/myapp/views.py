@@ -1,13 +1,19 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.signals import user_login_failed
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.decorators import api_view, permission_classes, parser_classes
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import ParseError
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.contrib.auth import authenticate
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
+from .credentials import check
 from .serializers import UserSerializer, ProfileSerializer
 from .models import Profile
-from django.contrib.auth.models import User
+from shop.cache import get_representation, set_representation, variant
 
 # ----------------- SIGNUP -----------------
 @api_view(['POST'])
@@ -21,17 +27,25 @@ def signup(request):
 
 
 # ----------------- SIGNIN -----------------
+# Async, so the password hash is awaited on its pool (myapp/credentials.py) instead of
+# holding a request thread while it runs; DRF still answers, through _signin.
+@csrf_exempt
+async def signin(request):
+    try:
+        data = Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES]).data
+    except ParseError as e:
+        return await sync_to_async(_signin)(request, user=None, error=e)
+    user = await check(data.get('email'), data.get('password'))
+    if user is None:
+        # what authenticate() would have sent (lockout and audit receivers listen for it)
+        await user_login_failed.asend(sender=__name__, credentials={"email": data.get('email')}, request=request)
+    return await sync_to_async(_signin)(request, user=user)
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
-def signin(request):
-    email = request.data.get('email')
-    password = request.data.get('password')
-
-    try:
-        user_obj = User.objects.get(email=email)
-        user = authenticate(username=user_obj.username, password=password)
-    except User.DoesNotExist:
-        user = None
+def _signin(request, user, error=None):
+    if error is not None:
+        raise error
 
     if user:
         refresh = RefreshToken.for_user(user)
@@ -48,12 +62,18 @@ def signin(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def profile(request):
+    # served from the cache; dropped by shop.signals whenever the Profile or User changes
+    shape = variant(request)
+    data = get_representation("profile", request.user.pk, shape)
+    if data is not None:
+        return Response(data, status=status.HTTP_200_OK)
     try:
-        profile = Profile.objects.get(user=request.user)
+        profile = Profile.objects.select_related("user").get(user=request.user)
     except Profile.DoesNotExist:
         return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
     serializer = ProfileSerializer(profile, context={"request": request})
+    set_representation("profile", request.user.pk, shape, serializer.data, profile)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
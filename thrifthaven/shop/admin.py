@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Item, Notification
+from .models import Category, Item, Job, Notification
 
 @admin.register(Item)
 class ItemAdmin(admin.ModelAdmin):
@@ -21,3 +21,8 @@ class CategoryAdmin(admin.ModelAdmin):
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ("user", "item", "message", "is_read", "created_at")
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("kind", "status", "attempts", "run_at", "created_at")
+    list_filter = ("status", "kind")
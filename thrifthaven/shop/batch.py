@@ -0,0 +1,92 @@
+"""
+``POST /api/batch/``: several GETs against the API in one round trip.
+
+    {"requests": ["/api/categories/", {"path": "/api/items/?page_size=20",
+                                      "headers": {"If-None-Match": "W/\\"...\\""}}],
+     "parallel": false}
+
+answers ``{"responses": [{"status": 200, "headers": {...}, "body": ...}, ...]}``
+in request order. Sub-requests are resolved against the URLconf and run the
+normal views and permissions, but share the batch request's authentication
+(the token is decoded and the user loaded once) and skip the middleware. They
+run one after another on the request's DB connection, or with ``parallel`` on
+up to ``BATCH_MAX_WORKERS`` threads, each with its own connection.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+# sub-request headers a client may set; everything else comes from the batch request
+FORWARDED_HEADERS = {"if-none-match", "if-modified-since", "accept-language"}
+DROPPED_META = ("CONTENT_LENGTH", "CONTENT_TYPE", "HTTP_IF_NONE_MATCH", "HTTP_IF_MODIFIED_SINCE",
+                "HTTP_ACCEPT_LANGUAGE", "QUERY_STRING")
+
+def max_requests():
+    return getattr(settings, "BATCH_MAX_REQUESTS", 20)
+
+def max_workers():
+    return getattr(settings, "BATCH_MAX_WORKERS", 4)
+
+def resolve_api(path):
+    """The view ``path`` routes to, or None unless it is a DRF view (other than the batch view itself)."""
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        return None
+    if not hasattr(match.func, "cls") or match.url_name == "batch":
+        return None
+    return match
+
+def sub_request(request, path, headers):
+    parts = urlsplit(path)
+    environ = {key: value for key, value in request.META.items() if key not in DROPPED_META}
+    environ.update({
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": parts.path,
+        "SCRIPT_NAME": "",
+        "QUERY_STRING": parts.query,
+        "HTTP_ACCEPT": "application/json",
+        "wsgi.input": BytesIO(),
+        "wsgi.url_scheme": request.scheme,
+    })
+    for name, value in headers.items():
+        environ["HTTP_" + name.upper().replace("-", "_")] = value
+    sub = WSGIRequest(environ)
+    if request.user.is_authenticated:
+        # DRF's hook for an already authenticated user: the views don't authenticate again
+        sub._force_auth_user, sub._force_auth_token = request.user, request.auth
+        sub.user = request.user
+    return sub
+
+def run_one(request, spec):
+    match = resolve_api(spec["path"])
+    if match is None:
+        return {"status": 404, "headers": {}, "body": {"detail": "Not an API endpoint."}}
+    sub = sub_request(request, spec["path"], spec.get("headers", {}))
+    sub.resolver_match = match
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+    except Exception:
+        logger.exception("Batched request %s failed", spec["path"])
+        return {"status": 500, "headers": {}, "body": {"detail": "Server error."}}
+    headers = {name: value for name, value in response.items() if name.lower() != "content-type"}
+    return {"status": response.status_code, "headers": headers, "body": getattr(response, "data", None)}
+
+def _run_in_thread(request, spec):
+    try:
+        return run_one(request, spec)
+    finally:
+        connections.close_all()  # this thread's own connections
+
+def run(request, specs, parallel=False):
+    if not parallel or len(specs) < 2:
+        return [run_one(request, spec) for spec in specs]
+    with ThreadPoolExecutor(max_workers=min(max_workers(), len(specs))) as pool:
+        return list(pool.map(lambda spec: _run_in_thread(request, spec), specs))
@@ -0,0 +1,81 @@
+"""
+Read-through cache of serialized representations (item detail, profile), on
+Django's cache framework.
+
+An entry is keyed by kind and primary key and holds one representation per
+variant: the origin (absolute media URLs depend on the host) plus the
+``?fields=``/``?expand=`` shape. Writers never update
+entries, they drop them after commit via ``invalidate`` (wired to model
+signals in shop/signals.py); readers fill them from the database on a miss,
+except from a read replica, which may not have replayed the write yet.
+
+``invalidate`` only reaches the cache this process sees, and writes also happen
+in other processes (the job worker, other web workers). So with a per-process
+backend (local memory, the default) an entry is only used when it carries the
+``ResourceVersion`` state it was built from (shop/conditional.py), which the
+reader checks against the database; untagged entries need a shared cache.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework.response import Response
+
+SCHEMA = 2  # bump when a cached representation changes shape
+
+LOCAL_BACKENDS = {"django.core.cache.backends.locmem.LocMemCache", "django.core.cache.backends.dummy.DummyCache"}
+
+def shared():
+    """Whether every process sees the same cache; ``SHOP_CACHE_SHARED`` overrides the guess from the backend."""
+    setting = getattr(settings, "SHOP_CACHE_SHARED", None)
+    return settings.CACHES["default"]["BACKEND"] not in LOCAL_BACKENDS if setting is None else setting
+
+def key(kind, pk):
+    return f"shop:{SCHEMA}:{kind}:{pk}"
+
+def timeout():
+    return getattr(settings, "SHOP_CACHE_TIMEOUT", 300)
+
+def variant(request):
+    params = request.query_params if hasattr(request, "query_params") else request.GET
+    return f"{request.build_absolute_uri('/')}|{params.get('fields', '')}|{params.get('expand', '')}"
+
+def get_representation(kind, pk, variant, state=None):
+    """The cached data, or None; ``state`` is the version state the caller read for it, if any."""
+    if state is None and not shared():
+        return None
+    entry = cache.get(key(kind, pk))
+    if not entry or entry.get("state") != state:
+        return None
+    return entry["variants"].get(variant)
+
+def set_representation(kind, pk, variant, data, instance=None, state=None):
+    if state is None and not shared():
+        return
+    if instance is not None and instance._state.db != DEFAULT_DB_ALIAS:
+        return  # read from a replica (shop/routers.py): possibly behind the invalidation that made this miss
+    entry = cache.get(key(kind, pk))
+    if not entry or entry.get("state") != state:
+        entry = {"state": state, "variants": {}}
+    entry["variants"][variant] = data
+    cache.set(key(kind, pk), entry, timeout())
+
+def invalidate(kind, *pks):
+    # after commit: dropping it earlier lets a concurrent reader re-cache the old row
+    keys = [key(kind, pk) for pk in pks]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+class CachedRetrieveMixin:
+    """``retrieve`` served from the cache; set ``cache_kind``. Only for views whose detail needs no object permission."""
+    cache_kind = None
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        shape = variant(request)
+        state = getattr(self, "version_state", None)  # set by ConditionalGetMixin
+        data = get_representation(self.cache_kind, pk, shape, state)
+        if data is None:
+            instance = self.get_object()
+            data = self.get_serializer(instance).data
+            set_representation(self.cache_kind, instance.pk, shape, data, instance, state)
+        return Response(data)
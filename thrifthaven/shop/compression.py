@@ -0,0 +1,73 @@
+"""
+Response compression: brotli when the client takes it and the brotli package is
+installed, gzip otherwise.
+
+Only non-streaming responses of a compressible type and at least
+``COMPRESSION_MIN_SIZE`` bytes are compressed; media files (streamed) and small
+bodies are sent as they are, where compressing costs more than it saves.
+"""
+import gzip
+import re
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE = ("text/", "application/json", "application/msgpack", "application/javascript",
+                "application/xml", "image/svg+xml")
+
+_coding_re = re.compile(r"^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$")
+
+def accepted_encodings(header):
+    """``{coding: q}`` from an Accept-Encoding header; malformed entries are ignored."""
+    accepted = {}
+    for part in header.split(","):
+        match = _coding_re.match(part)
+        if match:
+            try:
+                accepted[match[1].lower()] = float(match[2]) if match[2] else 1.0
+            except ValueError:
+                pass
+    return accepted
+
+def choose_encoding(header):
+    accepted = accepted_encodings(header)
+    offered = ["br", "gzip"] if brotli else ["gzip"]
+    # ties go to the first offered (brotli: smaller at the same speed)
+    q, coding = max((accepted.get(c, accepted.get("*", 0)), -i) for i, c in enumerate(offered))
+    return offered[-coding] if q > 0 else None
+
+def compress(content, coding):
+    if coding == "br":
+        return brotli.compress(content, quality=getattr(settings, "COMPRESSION_BROTLI_QUALITY", 5))
+    return gzip.compress(content, compresslevel=getattr(settings, "COMPRESSION_GZIP_LEVEL", 6), mtime=0)
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (response.streaming or response.has_header("Content-Encoding")
+                or not response.get("Content-Type", "").startswith(COMPRESSIBLE)):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if len(response.content) < getattr(settings, "COMPRESSION_MIN_SIZE", 1024):
+            return response
+        coding = choose_encoding(request.headers.get("Accept-Encoding", ""))
+        if coding is None:
+            return response
+        compressed = compress(response.content, coding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = coding
+        # the compressed body is a different representation: a strong ETag must not match it
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
@@ -0,0 +1,137 @@
+"""
+Conditional GET for the catalog and notification endpoints.
+
+Each response depends on a few change counters (``ResourceVersion`` rows,
+e.g. ``"categories"``, ``"item:42"``, ``"notifications:7"``) that are bumped in
+the same transaction as the change. A GET first reads those counters, from
+the cache or with one primary-key query; if the client's ``If-None-Match`` (or ``If-Modified-Since``)
+still matches, it gets a 304 without the queryset or serializer ever running.
+
+The list-wide keys every item write touches (``HOT_KEYS``) are bumped right
+after the transaction commits instead, in a statement of their own: bumped
+inside it, their row lock would be held to the end and serialize all item
+writes. For the moment in between, a list's ETag can still match a copy from
+before the change.
+
+Counters are only cached in a shared cache (``shop.cache.shared``): bumps happen
+in the job worker and in other web workers too, and their invalidation would
+never reach another process's local memory.
+"""
+import hashlib
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, router, transaction
+from django.utils.cache import parse_etags
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+from . import cache as shop_cache
+from .models import ResourceVersion
+
+HOT_KEYS = {"items", "notifications:staff"}
+
+def bump(*keys):
+    """Invalidate every ETag built on ``keys``; ``HOT_KEYS`` once the current transaction commits."""
+    keys = set(keys)
+    hot = sorted(keys & HOT_KEYS)
+    if hot and connection.in_atomic_block:
+        transaction.on_commit(lambda: _bump(hot))
+        keys -= HOT_KEYS
+    _bump(sorted(keys))
+
+def _bump(keys):
+    # keys sorted, so concurrent bumps can't deadlock
+    if not keys:
+        return
+    with connection.cursor() as cur:
+        cur.execute(
+            f"""
+            INSERT INTO {ResourceVersion._meta.db_table} AS v (key, version, changed_at)
+            SELECT k, 1, now() FROM unnest(%s::text[]) AS k
+            ON CONFLICT (key) DO UPDATE SET version = v.version + 1, changed_at = now()
+            """,
+            [keys],
+        )
+    shop_cache.invalidate("version", *keys)
+
+def current(keys):
+    """``(state, changed_at)`` for ``keys``: an opaque string of their versions and the latest change, or None."""
+    db = router.db_for_read(ResourceVersion)
+    if db != DEFAULT_DB_ALIAS:
+        # a replica (shop/routers.py): read the versions from it, uncached, before the body is read
+        # from it too. The ETag then never claims more than the body holds, and a lagging replica's
+        # versions never reach the shared cache.
+        return _state(keys, _read(keys, db))
+    if not shop_cache.shared():
+        return _state(keys, _read(keys))
+    # read through the cache, so a 304 normally costs no query at all
+    names = {k: shop_cache.key("version", k) for k in keys}
+    cached = cache.get_many(list(names.values()))
+    rows = {k: cached[name] for k, name in names.items() if name in cached}
+    missing = [k for k in keys if k not in rows]
+    if missing:
+        # never-bumped keys are cached too (as version 0), so they don't query every time
+        fetched = _read(missing)
+        for k, row in fetched.items():
+            cache.add(names[k], row, shop_cache.timeout())
+        # a bump may have committed, and dropped these from the cache, between our read and
+        # the add: then the add cached the old version, and reading again shows it
+        if _read(missing) != fetched:
+            cache.delete_many([names[k] for k in missing])
+        rows.update(fetched)
+    return _state(keys, rows)
+
+def _read(keys, db=DEFAULT_DB_ALIAS):
+    found = {k: (v, at) for k, v, at in
+             ResourceVersion.objects.using(db).filter(key__in=keys).values_list("key", "version", "changed_at")}
+    return {k: found.get(k, (0, None)) for k in keys}
+
+def _state(keys, rows):
+    state = ",".join(f"{k}={rows[k][0]}" for k in keys)
+    changed = [at for _, at in rows.values() if at]
+    return state, max(changed) if changed else None
+
+def item_keys(*item_ids):
+    return ["items", *(f"item:{pk}" for pk in item_ids)]
+
+def notification_keys(user_ids=(), staff=False):
+    return [*(f"notifications:{pk}" for pk in user_ids), *(["notifications:staff"] if staff else [])]
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified on ``list`` and ``retrieve`` for a ViewSet that defines
+    ``version_keys(pk)``: the counters its response is built from.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(None, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(kwargs.get(self.lookup_url_kwarg or self.lookup_field), super().retrieve,
+                                 request, *args, **kwargs)
+
+    def _conditional(self, pk, handler, request, /, *args, **kwargs):
+        state, changed_at = current(self.version_keys(pk))
+        self.version_state = state  # what CachedRetrieveMixin checks a cached body against
+        seed = "|".join([str(request.user.pk), request.get_host(), request.get_full_path(),
+                         request.accepted_renderer.format, state])
+        etag = f'W/"{hashlib.blake2b(seed.encode(), digest_size=12).hexdigest()}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if changed_at:
+            headers["Last-Modified"] = http_date(changed_at.timestamp())
+        if self._not_modified(request, etag, changed_at):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            for name, value in headers.items():
+                response[name] = value
+        return response
+
+    @staticmethod
+    def _not_modified(request, etag, changed_at):
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match:
+            # weak comparison, and If-Modified-Since is ignored when this is present (RFC 9110)
+            tags = parse_etags(if_none_match)
+            return "*" in tags or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags)
+        since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+        return bool(since and changed_at and int(changed_at.timestamp()) <= since)
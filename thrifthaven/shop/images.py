@@ -0,0 +1,100 @@
+"""
+Resized, re-encoded variants of uploaded pictures (item images, profile pictures).
+
+A variant of ``items/abc.jpg`` lives at ``variants/items/abc.jpg.600w.webp``.
+Sources are never overwritten in place (their names are content hashes, see
+shop/storage.py), so a variant URL is immutable and can be cached forever. Variants are built by the
+``image_variants`` job after upload, and on demand by ``serve_variant`` if one
+is ever missing. That endpoint is public, so it only builds variants of uploads
+(``SOURCES``), never of variants, and images over Pillow's decompression-bomb
+limit are refused rather than decoded.
+"""
+import logging
+import re
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (200, 600, 1200)
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+PREFIX = "variants/"
+# where uploads live (Item.image, Profile.profile_picture, and shop/storage.py's content names)
+SOURCES = ("items/", "profile_pictures/", "cas/")
+VARIANT_RE = re.compile(r"^(?P<source>.+)\.(?P<width>\d+)w\.(?P<fmt>webp|jpeg)$")
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def variant_name(source, width, fmt):
+    return f"{PREFIX}{source}.{width}w.{fmt}"
+
+def srcset(field, request=None):
+    """``{"webp": {"200": url, ...}, "jpeg": {...}}`` for an image field, or None when it is empty."""
+    if not field:
+        return None
+    build = request.build_absolute_uri if request else (lambda url: url)
+    return {
+        fmt: {str(width): build(default_storage.url(variant_name(field.name, width, fmt))) for width in WIDTHS}
+        for fmt in FORMATS
+    }
+
+def thumbnail(field, request=None):
+    """The smallest WebP variant's URL, or None when the field is empty."""
+    if not field:
+        return None
+    url = default_storage.url(variant_name(field.name, min(WIDTHS), "webp"))
+    return request.build_absolute_uri(url) if request else url
+
+def has_variants(source):
+    return all(default_storage.exists(variant_name(source, w, fmt)) for w in WIDTHS for fmt in FORMATS)
+
+def generate_variants(source):
+    """Decode ``source`` once and write every width/format; returns the names written."""
+    with default_storage.open(source, "rb") as fh:
+        image = Image.open(fh)
+        # JPEG can decode straight at a reduced scale, which is most of the work for phone photos
+        image.draft("RGB", (max(WIDTHS), max(WIDTHS)))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+    written = []
+    current = image
+    for width in sorted(WIDTHS, reverse=True):
+        # downscale from the previous (larger) variant, never upscale
+        if current.width > width:
+            current = current.resize((width, max(1, round(current.height * width / current.width))), Image.LANCZOS)
+        for fmt, (pil_format, options) in FORMATS.items():
+            frame = current.convert("RGB") if pil_format == "JPEG" and current.mode != "RGB" else current
+            buf = BytesIO()
+            frame.save(buf, pil_format, **options)
+            name = variant_name(source, width, fmt)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            written.append(default_storage.save(name, ContentFile(buf.getvalue())))
+    return written
+
+def serve_variant(request, name):
+    """Serve a variant with long-lived caching headers, building it first if it is missing."""
+    match = VARIANT_RE.match(name)
+    if (not match or int(match["width"]) not in WIDTHS or ".." in name.split("/")
+            or match["source"].startswith(PREFIX) or not match["source"].startswith(SOURCES)):
+        raise Http404("No such variant.")
+    path = PREFIX + name
+    if not default_storage.exists(path):
+        if not default_storage.exists(match["source"]):
+            raise Http404("No such image.")
+        try:
+            generate_variants(match["source"])
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+            logger.exception("Could not build variants for %s", match["source"])
+            raise Http404("Image could not be processed.")
+    response = FileResponse(default_storage.open(path, "rb"), content_type=f"image/{match['fmt']}")
+    response["Cache-Control"] = CACHE_CONTROL
+    return response
@@ -0,0 +1,165 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+from . import notifications
+from .images import generate_variants, has_variants
+from .models import Item, Job, Notification
+from .storage import is_content_name
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 10  # 10s, 20s, 40s, 80s ... between attempts
+
+HANDLERS = {}
+
+def handler(kind):
+    """Register ``func(payloads)`` for a job kind; it gets every claimed payload of that kind at once."""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+def enqueue(kind, **payload):
+    """Record work for the worker. Cheap enough to call from a request handler."""
+    return Job.objects.create(kind=kind, payload=payload)
+
+def _notify_payload(user_id, item_id, type, message, offer_price=None):
+    return {
+        "user_id": user_id,
+        "item_id": item_id,
+        "type": type,
+        "message": message,
+        "offer_price": str(offer_price) if offer_price is not None else None,
+    }
+
+def notify(user, item, type, message, offer_price=None):
+    return enqueue("notify", **_notify_payload(user.pk, item.pk if item else None, type, message, offer_price))
+
+def notify_many(rows):
+    """Queue many notifications with one INSERT; ``rows`` are dicts of user_id, item_id, type, message[, offer_price]."""
+    return Job.objects.bulk_create(
+        [Job(kind="notify", payload=_notify_payload(**row)) for row in rows],
+        batch_size=1000,
+    )
+
+def run_batch(batch_size=100):
+    """
+    Claim up to ``batch_size`` due jobs and run them; returns how many were claimed.
+
+    Jobs are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` so concurrent
+    workers never take the same rows, and the claim lives in the same
+    transaction as the work: a worker that dies mid-batch simply releases its
+    locks and the jobs become due again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status="PENDING", run_at__lte=now)
+            .order_by("run_at", "id")[:batch_size]
+        )
+        by_kind = defaultdict(list)
+        for job in jobs:
+            by_kind[job.kind].append(job)
+
+        done, retry = [], []
+
+        def failed(job, exc):
+            job.attempts += 1
+            job.last_error = f"{type(exc).__name__}: {exc}"
+            if job.attempts >= MAX_ATTEMPTS:
+                job.status = "FAILED"
+            else:
+                job.run_at = now + timedelta(seconds=BACKOFF_SECONDS * 2 ** (job.attempts - 1))
+            retry.append(job)
+
+        for kind, group in by_kind.items():
+            try:
+                _run(kind, group)
+                done.extend(group)
+                continue
+            except Exception as exc:
+                logger.exception("Job batch %s failed (%d jobs)", kind, len(group))
+                if len(group) == 1:
+                    failed(group[0], exc)
+                    continue
+            # one bad payload should not hold back the rest of its kind: run them one by one
+            for job in group:
+                try:
+                    _run(kind, [job])
+                    done.append(job)
+                except Exception as exc:
+                    logger.exception("Job %s #%s failed", kind, job.pk)
+                    failed(job, exc)
+
+        if done:
+            Job.objects.filter(pk__in=[job.pk for job in done]).delete()
+        if retry:
+            Job.objects.bulk_update(retry, ["attempts", "last_error", "status", "run_at"])
+    return len(jobs)
+
+def _run(kind, jobs):
+    func = HANDLERS[kind]
+    with transaction.atomic():
+        func([job.payload for job in jobs])
+        if connection.vendor == "postgresql":
+            # FKs are DEFERRABLE INITIALLY DEFERRED: check them inside this savepoint, so a
+            # bad row fails its own jobs here instead of the whole batch at the outer commit
+            with connection.cursor() as cur:
+                cur.execute("SET CONSTRAINTS ALL IMMEDIATE")
+                cur.execute("SET CONSTRAINTS ALL DEFERRED")
+
+# ----------------- handlers -----------------
+
+@handler("notify")
+def create_notifications(payloads):
+    # Users and items can be deleted between enqueue and run: a deleted user's
+    # notifications are dropped; for a deleted item keep the message, drop the link.
+    users = set(User.objects.filter(pk__in={p["user_id"] for p in payloads}).values_list("pk", flat=True))
+    payloads = [p for p in payloads if p["user_id"] in users]
+    item_ids = {p["item_id"] for p in payloads if p.get("item_id")}
+    existing = set(Item.objects.filter(pk__in=item_ids).values_list("pk", flat=True))
+    created = Notification.objects.bulk_create([
+        Notification(
+            user_id=p["user_id"],
+            item_id=p["item_id"] if p.get("item_id") in existing else None,
+            type=p["type"],
+            message=p["message"],
+            offer_price=Decimal(p["offer_price"]) if p.get("offer_price") else None,
+        )
+        for p in payloads
+    ], batch_size=500)
+    notifications.created(created)
+
+@handler("notify_staff_new_item")
+def notify_staff_new_items(payloads):
+    # One broadcast row per item, shared by every staff user (see notifications.visible_to)
+    items = Item.objects.filter(pk__in=[p["item_id"] for p in payloads]).only("id", "name", "price")
+    created = Notification.objects.bulk_create([
+        Notification(
+            user=None,
+            audience="STAFF",
+            item=item,
+            type="INFO",
+            message=f"🆕 New item submitted: '{item.name}' for ${item.price}"
+        )
+        for item in items
+    ], batch_size=500)
+    notifications.created(created)
+
+@handler("image_variants")
+def build_image_variants(payloads):
+    for source in {p["source"] for p in payloads}:
+        if is_content_name(source) and has_variants(source):
+            continue  # a re-upload of a stored picture: same content, same variants
+        try:
+            generate_variants(source)
+        except (FileNotFoundError, UnidentifiedImageError, Image.DecompressionBombError):
+            # replaced, deleted, not a picture or too large to decode; serve_variant 404s for it, nothing to retry
+            logger.warning("Skipping image variants for %s", source)
@@ -0,0 +1,113 @@
+"""
+The item lifecycle as a state machine:
+
+    pending --approve--> offered --accept_offer--> live --mark_sold--> sold
+       |                    |
+    decline           decline_offer
+       v                    v
+    (deleted)           (deleted)
+
+There is no state column; the state follows from ``approved``, ``offer_price``
+and ``stock`` (``STATES``). A transition is one statement whose WHERE re-checks
+the source state, for any number of items at once: of two concurrent attempts
+on an item exactly one applies and the other finds nothing to change, so the
+caller can answer 409 instead of overwriting. Updates write only the columns
+the transition sets, and lock only the rows they change, in id order. Deletes go
+through the ORM (cascades, media references) under the same row locks.
+
+Declines are transitions too: an admin declines only a pending item and an
+owner declines only an outstanding offer (before, both deleted an item in any
+state), so a decline can't race an accept or a sale and delete a live listing.
+"""
+from collections import namedtuple
+from django.db import connection, transaction
+from django.db.models import Q
+from .cache import invalidate
+from .conditional import bump, item_keys
+from .models import Item
+
+STATES = {
+    "pending": Q(approved=False, offer_price__isnull=True),
+    "offered": Q(approved=False, offer_price__isnull=False),
+    "live": Q(approved=True, stock=False),
+    "sold": Q(approved=True, stock=True),
+}
+
+# changes: columns every item gets; per-item values (approve's offer) are passed to advance()
+Transition = namedtuple("Transition", "source target changes")
+
+TRANSITIONS = {
+    "approve": Transition("pending", "offered", {"claimed_by_id": None, "claimed_until": None}),  # ends a review lease
+    "accept_offer": Transition("offered", "live", {"approved": True}),
+    "mark_sold": Transition("live", "sold", {"stock": True}),
+    "decline": Transition("pending", None, {}),
+    "decline_offer": Transition("offered", None, {}),
+}
+
+class Conflict(Exception):
+    """The item is not in the state the transition starts from (or no longer exists)."""
+    def __init__(self, transition, state):
+        self.transition = transition
+        self.state = state
+
+def state_of(item):
+    if item is None:
+        return "deleted"
+    if item.approved:
+        return "sold" if item.stock else "live"
+    return "pending" if item.offer_price is None else "offered"
+
+def _condition(state):
+    query = Item.objects.filter(STATES[state]).query
+    return query.get_compiler(connection=connection).compile(query.where)
+
+def advance(name, ids, **per_item):
+    """
+    Move those of the items ``ids`` that are in ``name``'s source state; returns the ids it applied to.
+
+    ``per_item`` sets columns per item, as ``{column: {id: value}}``.
+    """
+    source, target, changes = TRANSITIONS[name]
+    ids = list(ids)
+    if not ids:
+        return set()
+    if target is None:
+        return _delete(source, ids)
+    qn = connection.ops.quote_name
+    table = qn(Item._meta.db_table)
+    fields = [Item._meta.get_field(column) for column in per_item]
+    where, where_params = _condition(source)
+    assignments = [f"{qn(column)} = %s" for column in changes] + [f"{qn(f.column)} = v.{qn(f.column)}" for f in fields]
+    arrays = ", ".join(["%s::bigint[]", *(f"%s::{f.db_type(connection)}[]" for f in fields)])
+    with connection.cursor() as cur:
+        cur.execute(
+            f"""
+            WITH v AS (SELECT * FROM unnest({arrays}) AS v({", ".join(qn(c) for c in ["id", *(f.column for f in fields)])})),
+            -- lock in id order, so batches over the same items queue instead of deadlocking
+            locked AS (SELECT id FROM {table} WHERE id IN (SELECT id FROM v) AND {where} ORDER BY id FOR UPDATE)
+            UPDATE {table} SET {", ".join(assignments)}
+            FROM v WHERE {table}.id = v.id AND {table}.id IN (SELECT id FROM locked)
+            RETURNING {table}.id
+            """,
+            [ids, *([per_item[f.name][pk] for pk in ids] for f in fields), *where_params, *changes.values()],
+        )
+        applied = {row[0] for row in cur.fetchall()}
+    if applied:
+        # raw UPDATE: no post_save to do it
+        bump(*item_keys(*applied))
+        invalidate("item", *applied)
+    return applied
+
+@transaction.atomic
+def _delete(source, ids):
+    # a concurrent transition on one of these waits for the lock, then finds the row gone
+    doomed = list(Item.objects.select_for_update().filter(STATES[source], pk__in=ids)
+                  .order_by("pk").values_list("pk", flat=True))
+    Item.objects.filter(pk__in=doomed).delete()
+    return set(doomed)
+
+def apply(name, pk, **values):
+    """``advance`` for one item, raising Conflict (with the item's current state) if it did not apply."""
+    if not advance(name, [pk], **{column: {pk: value} for column, value in values.items()}):
+        current = Item.objects.filter(pk=pk).only("approved", "offer_price", "stock").first()
+        raise Conflict(name, state_of(current))
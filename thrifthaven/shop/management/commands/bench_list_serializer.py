@@ -0,0 +1,78 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from shop.models import Category, Item
+from shop.serializers import ItemListSerializer, ItemSerializer, item_rows
+
+class Command(BaseCommand):
+    # that both render the same JSON is shop.tests.ItemListSerializerTests' job
+    help = "Seed items inside a rolled-back transaction and compare ItemListSerializer's speed with ItemSerializer's."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **opts):
+        request = RequestFactory().get("/api/items/", HTTP_HOST="localhost")
+        renderer = JSONRenderer()
+        with transaction.atomic():
+            self.seed(opts["items"])
+            base = Item.objects.select_related("user").defer("search_vector").order_by("-created_at", "-id")
+            instances = list(base.prefetch_related("categories"))
+            rows = list(item_rows(base))
+
+            fast = renderer.render(ItemListSerializer(rows, many=True, context={"request": request}).data)
+            self.stdout.write(f"{len(rows)} items, {len(fast) / 2**20:.1f} MiB of JSON")
+
+            def best(fn):
+                timings = []
+                for _ in range(opts["repeat"]):
+                    start = time.perf_counter()
+                    fn()
+                    timings.append(time.perf_counter() - start)
+                return min(timings)
+
+            ser_slow = best(lambda: ItemSerializer(instances, many=True, context={"request": request}).data)
+            ser_fast = best(lambda: ItemListSerializer(rows, many=True, context={"request": request}).data)
+            all_slow = best(lambda: ItemSerializer(list(base.prefetch_related("categories")), many=True,
+                                                   context={"request": request}).data)
+            all_fast = best(lambda: ItemListSerializer(list(item_rows(base)), many=True,
+                                                       context={"request": request}).data)
+            self.stdout.write(f"serialize only     ItemSerializer {ser_slow * 1000:8.1f}ms  "
+                              f"ItemListSerializer {ser_fast * 1000:8.1f}ms  ({ser_slow / ser_fast:.1f}x)")
+            self.stdout.write(f"query + serialize  ItemSerializer {all_slow * 1000:8.1f}ms  "
+                              f"ItemListSerializer {all_fast * 1000:8.1f}ms  ({all_slow / all_fast:.1f}x)")
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        user = User.objects.create_user(username="bench-list@example.com", password=None)
+        cat_ids = [c.id for c in Category.objects.bulk_create([Category(name=f"bench-{i}") for i in range(10)])]
+        with connection.cursor() as cur:
+            # a mix of set and empty optional columns: media, purchase date, offer
+            cur.execute(
+                """
+                INSERT INTO shop_item (name, description, price, purchase_date, image, video,
+                                       approved, stock, offer_price, created_at, user_id)
+                SELECT 'item ' || g, CASE WHEN g %% 4 = 0 THEN NULL ELSE 'a nice thing, number ' || g END,
+                       round((random() * 500)::numeric, 2),
+                       CASE WHEN g %% 3 = 0 THEN NULL ELSE current_date - (g %% 4000) END,
+                       CASE WHEN g %% 5 = 0 THEN '' ELSE 'cas/' || substr(md5(g::text), 1, 2) || '/' || md5(g::text) || md5(g::text) || '.jpg' END,
+                       CASE WHEN g %% 7 = 0 THEN 'items/videos/clip ' || g || '.mp4' ELSE NULL END,
+                       g %% 2 = 0, false,
+                       CASE WHEN g %% 2 = 0 THEN round((random() * 100)::numeric, 2) ELSE NULL END,
+                       now() - make_interval(secs => g + random()), %s
+                FROM generate_series(1, %s) AS g
+                """,
+                [user.id, count],
+            )
+            cur.execute(
+                """
+                INSERT INTO shop_item_categories (item_id, category_id)
+                SELECT id, c FROM shop_item, unnest(%s::bigint[]) AS c
+                WHERE user_id = %s AND (id + c) %% 4 = 0
+                """,
+                [cat_ids, user.id],
+            )
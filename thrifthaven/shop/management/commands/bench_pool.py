@@ -0,0 +1,81 @@
+import io
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework_simplejwt.tokens import AccessToken
+
+class Command(BaseCommand):
+    help = (
+        "Serve a cheap authenticated GET through the WSGI handler from concurrent threads, connecting per request, "
+        "with persistent per-thread connections and with the connection pool; reports throughput and latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=400, help="requests per run")
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+        parser.add_argument("--path", default="/api/notifications/unread_count/")
+
+    def handle(self, *args, **opts):
+        # the real handler, not the test client: that one disconnects close_old_connections
+        # and so never opens or returns a connection per request
+        self.handler = WSGIHandler()
+        db = connections.settings[DEFAULT_DB_ALIAS]
+        saved = {name: db.get(name) for name in ("OPTIONS", "CONN_MAX_AGE")}
+        pool = saved["OPTIONS"].get("pool") or {"min_size": 2, "max_size": 20, "timeout": 10}
+        if pool is True:
+            pool = {}
+        user = User.objects.create_user(username="bench-pool@example.com", email="bench-pool@example.com")
+        self.token = str(AccessToken.for_user(user))
+        modes = [
+            ("connect per request", {"CONN_MAX_AGE": 0}),
+            ("persistent", {"CONN_MAX_AGE": 60}),
+            ("pool", {"CONN_MAX_AGE": 0, "OPTIONS": {**saved["OPTIONS"], "pool": pool}}),
+        ]
+        try:
+            for concurrency in opts["concurrency"]:
+                for name, changes in modes:
+                    self.configure(db, saved, changes)
+                    took, latencies = self.run(opts["path"], opts["requests"], concurrency)
+                    self.stdout.write(
+                        f"c={concurrency:<3} {name:<20} {opts['requests'] / took:7.1f}/s  "
+                        f"p50 {statistics.median(latencies) * 1000:6.1f}ms  "
+                        f"p99 {statistics.quantiles(latencies, n=100)[98] * 1000:6.1f}ms"
+                    )
+        finally:
+            self.configure(db, saved, {})
+            user.delete()
+
+    def configure(self, db, saved, changes):
+        connections.close_all()
+        connections[DEFAULT_DB_ALIAS].close_pool()
+        # the wrappers share this dict, so every thread sees the change
+        db["OPTIONS"] = {name: value for name, value in saved["OPTIONS"].items() if name != "pool"}
+        db["CONN_MAX_AGE"] = saved["CONN_MAX_AGE"]
+        db.update(changes)
+
+    def get(self, path):
+        environ = {
+            "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": "", "SCRIPT_NAME": "",
+            "SERVER_NAME": "localhost", "SERVER_PORT": "80", "HTTP_HOST": "localhost",
+            "HTTP_AUTHORIZATION": f"Bearer {self.token}", "wsgi.input": io.BytesIO(), "wsgi.url_scheme": "http",
+        }
+        start = time.perf_counter()
+        response = self.handler(environ, lambda status, headers: None)
+        b"".join(response)
+        response.close()  # request_finished: the connection is closed or handed back here
+        took = time.perf_counter() - start
+        if response.status_code != 200:
+            raise CommandError(f"{path} answered {response.status_code}: {response.content[:200]!r}")
+        return took
+
+    def run(self, path, count, concurrency):
+        with ThreadPoolExecutor(max_workers=concurrency) as workers:
+            list(workers.map(lambda _: self.get(path), range(concurrency)))  # threads up, pool opened
+            start = time.perf_counter()
+            latencies = list(workers.map(lambda _: self.get(path), range(count)))
+            took = time.perf_counter() - start
+        return took, latencies
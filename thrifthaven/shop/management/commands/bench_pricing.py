@@ -0,0 +1,44 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from django.core.management.base import BaseCommand, CommandError
+from shop.pricing import compute_offer_price, compute_offers
+
+class Command(BaseCommand):
+    help = "Check compute_offers against compute_offer_price on random data and compare their throughput."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=100_000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **opts):
+        rng = random.Random(opts["seed"])
+        today = date.today()
+        prices, dates = [], []
+        edge_dates = [None, today, today + timedelta(days=1), date(2020, 2, 29), date(2024, 2, 29),
+                      today.replace(year=today.year - 1), today.replace(year=today.year - 8)]
+        for _ in range(opts["items"]):
+            cents = rng.choice([0, 1, 5, 49, 50, 99, 100]) if rng.random() < 0.05 else rng.randint(-10**6, 10**10 - 1)
+            prices.append(Decimal(cents).scaleb(-2))
+            dates.append(rng.choice(edge_dates) if rng.random() < 0.1
+                         else today - timedelta(days=rng.randint(-400, 365 * 12)))
+        items = [SimpleNamespace(price=p, purchase_date=d) for p, d in zip(prices, dates)]
+
+        start = time.perf_counter()
+        scalar = [compute_offer_price(item) for item in items]
+        scalar_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = compute_offers(prices, dates, today)
+        batch_s = time.perf_counter() - start
+
+        mismatches = [(p, d, s, b) for p, d, s, b in zip(prices, dates, scalar, batch)
+                      if s != b or str(s) != str(b)]
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} mismatches, first: {mismatches[0]}")
+        n = len(items)
+        self.stdout.write(f"{n} items, identical results")
+        self.stdout.write(f"scalar compute_offer_price: {n / scalar_s:12,.0f} items/s")
+        self.stdout.write(f"batch  compute_offers:      {n / batch_s:12,.0f} items/s  ({scalar_s / batch_s:.1f}x)")
@@ -0,0 +1,50 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework import renderers
+from shop import compression
+from shop.models import Item
+from shop.renderers import JSONRenderer, MessagePackRenderer, msgpack
+from shop.serializers import ItemListSerializer, item_rows
+from .bench_list_serializer import Command as ListBench
+
+class Command(BaseCommand):
+    # that both write the same bytes is shop.tests.RendererTests' job
+    help = "Render a large item list with DRF's and the orjson renderer, and compare compressed sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **opts):
+        request = RequestFactory().get("/api/items/", HTTP_HOST="localhost")
+        with transaction.atomic():
+            ListBench().seed(opts["items"])
+            rows = list(item_rows(Item.objects.defer("search_vector").order_by("-created_at", "-id")))
+            data = {"next": None, "previous": None,
+                    "results": ItemListSerializer(rows, many=True, context={"request": request}).data}
+            transaction.set_rollback(True)
+
+        def best(fn):
+            timings = []
+            for _ in range(opts["repeat"]):
+                start = time.perf_counter()
+                result = fn()
+                timings.append(time.perf_counter() - start)
+            return min(timings), result
+
+        slow_t, slow = best(lambda: renderers.JSONRenderer().render(data))
+        fast_t, fast = best(lambda: JSONRenderer().render(data))
+        self.stdout.write(f"{len(rows)} items, {len(fast) / 2**20:.2f} MiB of JSON")
+        self.stdout.write(f"render  DRF json {slow_t * 1000:8.1f}ms  orjson {fast_t * 1000:8.1f}ms  ({slow_t / fast_t:.1f}x)")
+        bodies = [("json", fast)]
+        if msgpack:
+            packed_t, packed = best(lambda: MessagePackRenderer().render(data))
+            self.stdout.write(f"render  msgpack  {packed_t * 1000:8.1f}ms  {len(packed) / 2**20:.2f} MiB")
+            bodies.append(("msgpack", packed))
+        for coding in ["gzip", "br"] if compression.brotli else ["gzip"]:
+            for name, body in bodies:
+                took, out = best(lambda: compression.compress(body, coding))
+                self.stdout.write(f"{coding:<4} {name:<8} {took * 1000:8.1f}ms  {len(out) / 2**20:.2f} MiB "
+                                  f"({len(out) / len(body):.0%} of {len(body) / 2**20:.2f} MiB)")
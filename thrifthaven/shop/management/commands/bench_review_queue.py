@@ -0,0 +1,73 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from shop import lifecycle
+from shop.models import Item
+from shop.review import claim_pending, pending_items
+
+class Command(BaseCommand):
+    help = (
+        "Have parallel admins work through a review queue, either leasing items with claim_next or all taking "
+        "the oldest pending items (the old /pending/ workflow); reports items reviewed per second and wasted attempts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=400)
+        parser.add_argument("--admins", type=int, nargs="+", default=[1, 2, 4, 8])
+        parser.add_argument("--count", type=int, default=10, help="items taken per claim / page")
+        parser.add_argument("--think-ms", type=float, default=5, help="time an admin spends on one item")
+
+    def handle(self, *args, **opts):
+        # the admins work the real queue: anything already in it would be reviewed too
+        if pending_items().exists():
+            raise CommandError("The review queue is not empty; run this against a scratch database.")
+        owner = User.objects.create_user(username="bench-review-owner@example.com")
+        admins = [User.objects.create_user(username=f"bench-review-{i}@example.com", is_staff=True)
+                  for i in range(max(opts["admins"]))]
+        failed = False
+        try:
+            for mode in ("claim", "head"):
+                for n in opts["admins"]:
+                    ids = [item.pk for item in Item.objects.bulk_create(
+                        Item(user=owner, name=f"review {i}", price=Decimal("40.00")) for i in range(opts["items"])
+                    )]
+                    took, done, wasted = self.run(mode, admins[:n], opts)
+                    offered = Item.objects.filter(lifecycle.STATES["offered"], pk__in=ids).count()
+                    ok = done == offered == len(ids)
+                    failed |= not ok
+                    self.stdout.write(f"{mode:<5} admins={n:<3} {done / took:7.1f} items/s  "
+                                      f"{wasted:5} wasted attempts  {'ok' if ok else 'WRONG'}")
+                    Item.objects.filter(pk__in=ids).delete()
+        finally:
+            User.objects.filter(pk__in=[owner.pk, *(a.pk for a in admins)]).delete()
+        if failed:
+            raise CommandError("some items were reviewed more (or less) than once")
+
+    def run(self, mode, admins, opts):
+        def admin(user):
+            done = wasted = 0
+            try:
+                while True:
+                    if mode == "claim":
+                        ids, _ = claim_pending(user, opts["count"])
+                    else:
+                        ids = list(pending_items().order_by("created_at", "id").values_list("pk", flat=True)[:opts["count"]])
+                    if not ids:
+                        return done, wasted
+                    for pk in ids:
+                        time.sleep(opts["think_ms"] / 1000)
+                        try:
+                            lifecycle.apply("approve", pk, offer_price=Decimal("12.00"))
+                            done += 1
+                        except lifecycle.Conflict:
+                            wasted += 1
+            finally:
+                connections.close_all()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(admins)) as pool:
+            results = list(pool.map(admin, admins))
+        return time.perf_counter() - start, sum(d for d, _ in results), sum(w for _, w in results)
@@ -0,0 +1,85 @@
+import statistics
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.http import QueryDict
+from shop.models import Category, Item
+from shop.search import filter_items
+
+WORDS = [
+    "vintage", "denim", "jacket", "leather", "boots", "wool", "sweater", "silk", "scarf",
+    "linen", "shirt", "cotton", "dress", "retro", "lamp", "oak", "table", "ceramic", "vase",
+    "vinyl", "record", "camera", "film", "bicycle", "guitar", "acoustic", "watch", "brass",
+    "mirror", "velvet", "chair", "cashmere", "coat", "sneakers", "handbag", "canvas", "tote",
+]
+
+def sample_queries(cat_ids):
+    return [
+        {"q": "vintage leather jacket"},
+        {"q": "denim", "max_price": "50"},
+        {"q": "oak table", "approved": "true"},
+        {"q": "silk scarf", "category": f"{cat_ids[0]},{cat_ids[1]}"},
+        {"q": "guitar -electric", "min_price": "100", "max_price": "400"},
+        {"category": str(cat_ids[2]), "min_price": "20", "max_price": "60"},
+    ]
+
+class Command(BaseCommand):
+    help = "Seed a throwaway catalog inside a rolled-back transaction and time the item search path."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=1_000_000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--explain", action="store_true", help="Print the plan of each query once.")
+
+    def handle(self, *args, **opts):
+        with transaction.atomic():
+            cat_ids = self.seed(opts["items"])
+            base = Item.objects.defer("search_vector").order_by("-created_at", "-id")
+            for params in sample_queries(cat_ids):
+                qd = QueryDict(mutable=True)
+                qd.update(params)
+                qs = filter_items(base, qd)[:opts["page_size"] + 1]
+                if opts["explain"]:
+                    self.stdout.write(qs.explain(analyze=True))
+                timings = []
+                for _ in range(opts["repeat"]):
+                    start = time.perf_counter()
+                    rows = list(qs.all())
+                    timings.append((time.perf_counter() - start) * 1000)
+                timings.sort()
+                self.stdout.write(
+                    f"{qd.urlencode():<55} rows={len(rows):<3} "
+                    f"p50={statistics.median(timings):7.2f}ms p95={timings[int(len(timings) * 0.95) - 1]:7.2f}ms"
+                )
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        start = time.perf_counter()
+        user = User.objects.create_user(username="bench-search@example.com", password=None)
+        categories = Category.objects.bulk_create([Category(name=f"bench-{i}") for i in range(20)])
+        cat_ids = [c.id for c in categories]
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO shop_item (name, description, price, approved, stock, created_at, user_id)
+                SELECT w[1 + floor(random() * n)::int] || ' ' || w[1 + floor(random() * n)::int],
+                       w[1 + floor(random() * n)::int] || ' ' || w[1 + floor(random() * n)::int] || ' '
+                       || w[1 + floor(random() * n)::int] || ' in good condition',
+                       round((random() * 500)::numeric, 2), random() < 0.5, false,
+                       now() - make_interval(secs => g), %s
+                FROM generate_series(1, %s) AS g, (SELECT %s::text[] AS w, %s AS n) AS words
+                """,
+                [user.id, count, WORDS, len(WORDS)],
+            )
+            cur.execute(
+                """
+                INSERT INTO shop_item_categories (item_id, category_id)
+                SELECT id, (%s::bigint[])[1 + (id %% %s)] FROM shop_item WHERE user_id = %s
+                """,
+                [cat_ids, len(cat_ids), user.id],
+            )
+            cur.execute("ANALYZE shop_item; ANALYZE shop_item_categories;")
+        self.stdout.write(f"seeded {count} items in {time.perf_counter() - start:.1f}s")
+        return cat_ids
@@ -0,0 +1,163 @@
+import hashlib
+import math
+import os
+import shutil
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from myapp.models import Profile
+from shop.images import PREFIX as VARIANTS, VARIANT_RE
+from shop.models import Item, Upload
+from shop.storage import PREFIX as CAS, content_storage, is_content_name
+
+# (model, field) pairs whose values are names under MEDIA_ROOT. Uploads first: a
+# finished upload is attached to its item before the session row goes away, so
+# reading in this order cannot miss a file on its way from one to the other.
+REFERENCES = [
+    (Upload, "file"),
+    (Item, "image"),
+    (Item, "video"),
+    (Profile, "profile_picture"),
+]
+
+class BloomFilter:
+    """Set membership in ~14.4 bits (1.8 bytes) per name at 0.1% false positives; a false positive only keeps a file."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(self.size // 8 + 1)
+
+    def _positions(self, name):
+        digest = hashlib.blake2b(name.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, name):
+        for pos in self._positions(name):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, name):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(name))
+
+def walk(root, skip):
+    """Yield (relative name, DirEntry) for every file under root; memory is bounded by tree depth."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.path not in skip:
+                        stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield os.path.relpath(entry.path, root).replace(os.sep, "/"), entry
+
+class Command(BaseCommand):
+    help = "Find media files no row refers to any more and delete or quarantine them, in rate-limited batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be removed without touching it.")
+        parser.add_argument("--quarantine", metavar="DIR", help="Move orphans here (same relative paths) instead of deleting.")
+        parser.add_argument("--min-age", type=float, default=24, help="Hours; newer files are never collected (in-flight uploads).")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--sleep", type=float, default=0.5, help="Seconds to pause between batches.")
+        parser.add_argument("--exact", action="store_true", help="Use an exact set instead of a bloom filter (more memory).")
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **opts):
+        self.verbosity = opts["verbosity"]
+        root = os.path.abspath(settings.MEDIA_ROOT)
+        quarantine = os.path.abspath(opts["quarantine"]) if opts["quarantine"] else None
+        if quarantine and (quarantine == root or not os.path.isdir(os.path.dirname(quarantine))):
+            raise CommandError("--quarantine must be a directory (or a new one in an existing parent) other than MEDIA_ROOT.")
+        cutoff = time.time() - opts["min_age"] * 3600
+        referenced = self.referenced_names(opts["exact"], opts["chunk_size"])
+
+        def dispose(path):
+            if quarantine:
+                target = os.path.join(quarantine, os.path.relpath(path, root))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(path, target)
+            else:
+                os.unlink(path)
+
+        storage = content_storage()
+        scanned = 0
+        orphans, orphan_bytes = Counter(), Counter()
+        batch = []
+        for name, entry in walk(root, skip={quarantine}):
+            scanned += 1
+            if self.is_referenced(name, referenced):
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime >= cutoff:
+                continue
+            if opts["dry_run"]:
+                self.count(name, stat.st_size, orphans, orphan_bytes)
+                continue
+            batch.append((name, stat.st_size))
+            if len(batch) >= opts["batch_size"]:
+                self.collect(batch, storage, root, cutoff, dispose, orphans, orphan_bytes)
+                batch = []
+                time.sleep(opts["sleep"])
+        self.collect(batch, storage, root, cutoff, dispose, orphans, orphan_bytes)
+
+        verb = "would remove" if opts["dry_run"] else ("quarantined" if quarantine else "removed")
+        for area in sorted(orphans):
+            self.stdout.write(f"  {area}: {orphans[area]} file(s), {orphan_bytes[area] / 2**20:.1f} MiB")
+        self.stdout.write(
+            f"scanned {scanned} file(s), {verb} {sum(orphans.values())} "
+            f"({sum(orphan_bytes.values()) / 2**20:.1f} MiB)"
+        )
+
+    def referenced_names(self, exact, chunk_size):
+        # every field default (the stock profile picture) counts as referenced
+        defaults = [model._meta.get_field(field).get_default() for model, field in REFERENCES]
+        if exact:
+            referenced = set()
+        else:
+            total = sum(model.objects.count() for model, _ in REFERENCES) + len(defaults)
+            referenced = BloomFilter(total)
+        for name in defaults:
+            if name:
+                referenced.add(str(name))
+        for model, field in REFERENCES:
+            # iterator() streams through a server-side cursor on PostgreSQL
+            names = model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True})
+            for name in names.values_list(field, flat=True).iterator(chunk_size=chunk_size):
+                referenced.add(name)
+        return referenced
+
+    def is_referenced(self, name, referenced):
+        if name.startswith(CAS + "tmp/"):
+            return False  # left behind by an interrupted save
+        if name.startswith(VARIANTS):
+            match = VARIANT_RE.match(name[len(VARIANTS):])
+            return bool(match) and match["source"] in referenced
+        return name in referenced
+
+    def count(self, name, size, orphans, orphan_bytes):
+        area = name.split("/", 1)[0] if "/" in name else "."
+        orphans[area] += 1
+        orphan_bytes[area] += size
+        if self.verbosity >= 2:
+            self.stdout.write(name)
+
+    def collect(self, batch, storage, root, cutoff, dispose, orphans, orphan_bytes):
+        for name, size in batch:
+            if is_content_name(name):
+                # under the storage's lock, so a concurrent re-upload of the same content wins
+                if not storage.reclaim(name, cutoff, dispose):
+                    continue
+            else:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) >= cutoff:
+                        continue
+                    dispose(path)
+                except FileNotFoundError:
+                    continue
+            self.count(name, size, orphans, orphan_bytes)
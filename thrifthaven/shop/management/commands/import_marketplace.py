@@ -0,0 +1,330 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from multiprocessing import get_context
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import Min
+from django.db.models.functions import Lower
+from myapp.credentials import normalize_email
+from myapp.models import Profile
+from shop.conditional import bump, item_keys
+from shop.models import Category, Item, Notification
+
+# Input files are CSV with a header row, or JSON Lines (.jsonl / .ndjson), one record per row.
+#   users: email, phone, location, and password (plain) or password_hash (a Django hash); neither = unusable
+#   items: seller_email, name, description, price, purchase_date (YYYY-MM-DD), categories
+#          (a list in JSONL, "a|b" in CSV)
+
+def read_records(path):
+    """Yield ``(record number, dict)``; numbers count records, not physical lines."""
+    with open(path, newline="", encoding="utf-8") as fh:
+        if path.endswith((".jsonl", ".ndjson")):
+            number = 0
+            for line in fh:
+                if line.strip():
+                    number += 1
+                    try:
+                        record = json.loads(line)
+                    except ValueError as exc:
+                        record = {"_error": f"bad JSON: {exc}"}
+                    yield number, record if isinstance(record, dict) else {"_error": "not an object"}
+        else:
+            yield from enumerate(csv.DictReader(fh), start=1)
+
+def chunks(records, size):
+    records = iter(records)
+    while chunk := list(islice(records, size)):
+        yield chunk
+
+def text(record, name):
+    """The field as stripped text; numbers (e.g. a phone in JSON) become their digits. Raises ValueError otherwise."""
+    value = record.get(name)
+    if value is None or isinstance(value, str):
+        return value and value.strip()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise ValueError(f"{name} must be text")
+
+def hash_password(record):
+    if record.get("password_hash"):
+        return record["password_hash"]
+    return make_password(record.get("password") or None)
+
+class Checkpoint:
+    """
+    Records done per input file, written (atomically) after every committed chunk.
+
+    Before a chunk commits, ``prepare`` notes its transaction id as pending, so a
+    crash between the commit and ``advance`` is settled on resume by asking the
+    database whether that transaction committed, instead of importing it twice.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.state = {}
+        if path and os.path.exists(path):
+            with open(path) as fh:
+                self.state = json.load(fh)
+
+    def done(self, kind, source):
+        entry = self.state.get(kind)
+        if not entry:
+            return 0
+        if entry["path"] != os.path.abspath(source) or entry["size"] > os.path.getsize(source):
+            raise CommandError(f"{self.path} is for another {kind} file; remove it to start over.")
+        pending = entry.get("pending")
+        if pending:
+            with connection.cursor() as cur:
+                cur.execute("SELECT txid_status(%s)", [pending["txid"]])
+                if cur.fetchone()[0] == "committed":
+                    return pending["rows"]
+        return entry["rows"]
+
+    def prepare(self, kind, source, rows):
+        """Call inside the chunk's transaction, after its writes."""
+        if not self.path:
+            return
+        with connection.cursor() as cur:
+            cur.execute("SELECT txid_current()")
+            txid = cur.fetchone()[0]
+        self.write(kind, source, self.state.get(kind, {}).get("rows", 0), {"rows": rows, "txid": txid})
+
+    def advance(self, kind, source, rows):
+        if self.path:
+            self.write(kind, source, rows)
+
+    def write(self, kind, source, rows, pending=None):
+        self.state[kind] = {"path": os.path.abspath(source), "size": os.path.getsize(source), "rows": rows,
+                            **({"pending": pending} if pending else {})}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump(self.state, fh)
+        os.replace(tmp, self.path)
+
+class Command(BaseCommand):
+    help = (
+        "Import sellers (users + profiles) and their listings from CSV / JSONL: passwords hashed in a "
+        "process pool, rows written with bulk_create in one transaction per chunk, resumable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", metavar="FILE")
+        parser.add_argument("--items", metavar="FILE")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                            help="Processes hashing passwords; 0 hashes in this process.")
+        parser.add_argument("--checkpoint", metavar="FILE",
+                            help="Resume from / record progress in this file. A crash between a commit and the "
+                                 "checkpoint write repeats at most that one chunk (users are skipped by email).")
+        parser.add_argument("--rejects", metavar="FILE", help="Write rejected records here as JSON Lines, with the reason.")
+
+    def handle(self, *args, **opts):
+        if not opts["users"] and not opts["items"]:
+            raise CommandError("Give --users and/or --items.")
+        self.verbosity = opts["verbosity"]
+        self.checkpoint = Checkpoint(opts["checkpoint"])
+        self.rejects = open(opts["rejects"], "a", encoding="utf-8") if opts["rejects"] else None
+        self.reasons = Counter()
+        self.categories = {}  # name -> id, filled as we go
+        self.pool = None
+        try:
+            if opts["users"]:
+                if opts["workers"]:
+                    # fork before this process has opened a connection the children could inherit
+                    connections.close_all()
+                    self.pool = ProcessPoolExecutor(opts["workers"], mp_context=get_context("fork"))
+                    list(self.pool.map(int, range(opts["workers"])))
+                self.run("users", opts["users"], opts["chunk_size"], self.import_users)
+            if opts["items"]:
+                self.run("items", opts["items"], opts["chunk_size"], self.import_items)
+        finally:
+            if self.pool:
+                self.pool.shutdown()
+            if self.rejects:
+                self.rejects.close()
+        for reason, n in self.reasons.most_common():
+            self.stdout.write(f"  rejected {n}: {reason}")
+
+    def run(self, kind, source, size, import_chunk):
+        skip = self.checkpoint.done(kind, source)
+        if skip:
+            self.stdout.write(f"{kind}: resuming after record {skip}")
+        start, done, created = time.perf_counter(), skip, 0
+        for chunk in chunks(islice(read_records(source), skip, None), size):
+            done = chunk[-1][0]
+            created += import_chunk(source, chunk, lambda: self.checkpoint.prepare(kind, source, done))
+            self.checkpoint.advance(kind, source, done)
+            if self.verbosity:
+                rate = (done - skip) / (time.perf_counter() - start)
+                self.stdout.write(f"{kind}: {done} read, {created} created, "
+                                  f"{sum(self.reasons.values())} rejected so far, {rate:.0f}/s")
+        if kind == "items" and created:
+            # one staff broadcast for the whole import instead of one per item
+            Notification.objects.create(
+                user=None, audience="STAFF", type="INFO",
+                message=f"📦 Imported {created} item(s) from a partner; they are in the review queue.",
+            )
+        self.stdout.write(f"{kind}: {created} created from {done - skip} record(s) in {time.perf_counter() - start:.1f}s")
+
+    def reject(self, source, number, record, reason):
+        self.reasons[reason] += 1
+        if self.rejects:
+            self.rejects.write(json.dumps({"file": source, "record": number, "reason": reason, "data": record},
+                                          default=str) + "\n")
+
+    # -------------------------------------------------------------- users
+    def import_users(self, source, chunk, mark):
+        candidates = []
+        seen = set()
+        for number, record in chunk:
+            reason = record.get("_error")
+            try:
+                email, phone = normalize_email(text(record, "email")), text(record, "phone") or ""
+                text(record, "location")
+                if not all(isinstance(record.get(name) or "", str) for name in ("password", "password_hash")):
+                    raise ValueError("password must be text")
+            except ValueError as exc:
+                reason = reason or str(exc)
+            if not reason:
+                try:
+                    validate_email(email)
+                except ValidationError:
+                    reason = "invalid email"
+            if not reason and len(email) > User._meta.get_field("username").max_length:
+                reason = "email too long"
+            elif not reason and not (phone.isdigit() and len(phone) == 10):
+                reason = "phone must be exactly 10 digits"
+            elif not reason and record.get("password_hash"):
+                try:
+                    identify_hasher(record["password_hash"])
+                except ValueError:
+                    reason = "unknown password hash format"
+            if not reason and (email in seen or phone in seen):
+                reason = "duplicate email or phone in this chunk"
+            if reason:
+                self.reject(source, number, record, reason)
+                continue
+            seen.update((email, phone))
+            candidates.append((number, record, email, phone))
+        if not candidates:
+            return 0
+        records = [record for _, record, _, _ in candidates]
+        hashes = (self.pool.map(hash_password, records, chunksize=max(1, len(records) // 64))
+                  if self.pool else map(hash_password, records))
+        candidates = [(*c, h) for c, h in zip(candidates, hashes)]
+        try:
+            created, rejected = self.insert_users(candidates, mark)
+        except IntegrityError:
+            # a signup took an email or phone between our check and the insert: check again, once
+            created, rejected = self.insert_users(candidates, mark)
+        for number, record, reason in rejected:
+            self.reject(source, number, record, reason)
+        return created
+
+    @transaction.atomic
+    def insert_users(self, candidates, mark):
+        emails = [email for _, _, email, _, _ in candidates]
+        taken = set(User.objects.annotate(key=Lower("email")).filter(key__in=emails).values_list("key", flat=True))
+        taken |= set(User.objects.filter(username__in=emails).values_list("username", flat=True))
+        phones = set(Profile.objects.filter(phone__in=[p for _, _, _, p, _ in candidates]).values_list("phone", flat=True))
+        rows, rejected = [], []
+        for number, record, email, phone, password in candidates:
+            if email in taken:
+                rejected.append((number, record, "email already registered"))
+            elif phone in phones:
+                rejected.append((number, record, "phone already registered"))
+            else:
+                rows.append((User(username=email, email=email, password=password), phone, text(record, "location")))
+        # bulk_create sends no post_save: nothing to fan out for a new user with no activity yet
+        users = User.objects.bulk_create([user for user, _, _ in rows])
+        Profile.objects.bulk_create([Profile(user=user, phone=phone, location=location or None)
+                                     for user, (_, phone, location) in zip(users, rows)])
+        mark()
+        return len(users), rejected
+
+    # -------------------------------------------------------------- items
+    def import_items(self, source, chunk, mark):
+        emails = set()
+        for _, record in chunk:
+            try:
+                emails.add(normalize_email(text(record, "seller_email")))
+            except ValueError:
+                pass  # rejected in parse_item
+        sellers = dict(User.objects.annotate(key=Lower("email")).filter(key__in=emails)
+                       .values_list("key").annotate(id=Min("id")))
+        items, names = [], []
+        for number, record in chunk:
+            try:
+                item, categories = self.parse_item(record, sellers)
+            except ValueError as exc:
+                self.reject(source, number, record, str(exc))
+                continue
+            items.append(item)
+            names.append(categories)
+        if not items:
+            return 0
+        with transaction.atomic():
+            new_categories = self.category_ids({name for categories in names for name in categories})
+            Item.objects.bulk_create(items, batch_size=500)
+            Through = Item.categories.through
+            Through.objects.bulk_create(
+                [Through(item_id=item.pk, category_id=self.categories[name])
+                 for item, categories in zip(items, names) for name in categories],
+                batch_size=2000,
+            )
+            # what the per-row signals would have done, once for the chunk (new items are only on lists)
+            bump(*item_keys(), *(["categories"] if new_categories else []))
+            mark()
+        return len(items)
+
+    def parse_item(self, record, sellers):
+        if record.get("_error"):
+            raise ValueError(record["_error"])
+        seller = sellers.get(normalize_email(text(record, "seller_email")))
+        if seller is None:
+            raise ValueError("unknown seller")
+        name = text(record, "name") or ""
+        if not 0 < len(name) <= Item._meta.get_field("name").max_length:
+            raise ValueError("name missing or too long")
+        try:
+            price = Decimal(str(text(record, "price")))
+        except InvalidOperation:
+            raise ValueError("invalid price")
+        # bound first: quantize() raises InvalidOperation on huge exponents
+        if not price.is_finite() or price < 0 or price >= 10 ** 8 or price != price.quantize(Decimal("0.01")):
+            raise ValueError("invalid price")
+        bought = text(record, "purchase_date") or None
+        if bought:
+            try:
+                bought = date.fromisoformat(bought)
+            except (TypeError, ValueError):
+                raise ValueError("invalid purchase_date")
+        categories = record.get("categories") or []
+        if isinstance(categories, str):
+            categories = categories.split("|")
+        categories = list(dict.fromkeys(c.strip() for c in categories if isinstance(c, str) and c.strip()))
+        if any(len(c) > Category._meta.get_field("name").max_length for c in categories):
+            raise ValueError("category name too long")
+        return Item(user_id=seller, name=name, description=text(record, "description") or None, price=price,
+                    purchase_date=bought), categories
+
+    def category_ids(self, names):
+        """Fill ``self.categories`` for ``names``, creating the missing ones; returns how many were created."""
+        missing = names - self.categories.keys()
+        if not missing:
+            return 0
+        self.categories.update(Category.objects.filter(name__in=missing).values_list("name").annotate(id=Min("id")))
+        created = Category.objects.bulk_create([Category(name=name) for name in missing - self.categories.keys()])
+        self.categories.update((c.name, c.pk) for c in created)
+        return len(created)
@@ -0,0 +1,19 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from shop.models import Upload
+from shop.uploads import discard
+
+class Command(BaseCommand):
+    help = "Delete chunked upload sessions that have not been touched for a while, with their files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, default=24)
+
+    def handle(self, *args, **opts):
+        cutoff = timezone.now() - timedelta(hours=opts["hours"])
+        purged = 0
+        for upload in Upload.objects.filter(updated_at__lt=cutoff).iterator():
+            discard(upload)
+            purged += 1
+        self.stdout.write(f"purged {purged} upload session(s)")
@@ -0,0 +1,48 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from shop.models import Notification, NotificationCounter
+from shop.notifications import count_unread
+
+class Command(BaseCommand):
+    help = "Recompute every user's unread notification counter from the notification rows and fix drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without writing.")
+
+    def handle(self, *args, **opts):
+        chunk = opts["chunk_size"]
+        checked = drifted = 0
+        last_id = 0
+        while True:
+            users = list(User.objects.filter(pk__gt=last_id).order_by("pk").only("id", "is_staff")[:chunk])
+            if not users:
+                break
+            last_id = users[-1].pk
+            ids = [u.pk for u in users]
+
+            # personal unread for the whole chunk in one GROUP BY; staff also see broadcasts
+            expected = dict.fromkeys(ids, 0)
+            expected.update(
+                Notification.objects.filter(user_id__in=ids, audience="USER", is_read=False)
+                .values_list("user_id").annotate(n=Count("id")).values_list("user_id", "n")
+            )
+            for user in users:
+                if user.is_staff:
+                    expected[user.pk] = count_unread(user)
+
+            current = dict(NotificationCounter.objects.filter(pk__in=ids).values_list("pk", "unread"))
+            fixes = [
+                NotificationCounter(user_id=user_id, unread=n)
+                for user_id, n in expected.items()
+                if current.get(user_id) != n
+            ]
+            checked += len(ids)
+            drifted += len(fixes)
+            if fixes and not opts["dry_run"]:
+                NotificationCounter.objects.bulk_create(
+                    fixes, update_conflicts=True, unique_fields=["user"], update_fields=["unread"]
+                )
+        verb = "would fix" if opts["dry_run"] else "fixed"
+        self.stdout.write(f"checked {checked} user(s), {verb} {drifted} counter(s)")
@@ -0,0 +1,51 @@
+import time
+from django.core.management.base import BaseCommand
+from shop.jobs import notify_many
+from shop.models import Item
+from shop.pricing import compute_offers
+from shop.review import apply_reprices
+
+class Command(BaseCommand):
+    help = "Re-price outstanding (not yet accepted) offers whose items have crossed a purchase anniversary."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--dry-run", action="store_true", help="Count what would change without writing.")
+        parser.add_argument("--no-notify", action="store_true", help="Do not tell owners about the new offer.")
+
+    def handle(self, *args, **opts):
+        start = time.perf_counter()
+        scanned = changed = 0
+        last_id = 0
+        outstanding = Item.objects.filter(approved=False, offer_price__isnull=False, purchase_date__isnull=False)
+        while True:
+            rows = list(
+                outstanding.filter(pk__gt=last_id).order_by("pk")
+                .values_list("id", "price", "purchase_date", "offer_price", "user_id", "name")[:opts["chunk_size"]]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            scanned += len(rows)
+            ids, prices, dates, current, owners, names = zip(*rows)
+            offers = compute_offers(prices, dates)
+            changes = {pk: (old, new) for pk, old, new in zip(ids, current, offers) if old != new}
+            if not changes or opts["dry_run"]:
+                changed += len(changes)
+                continue
+            applied = apply_reprices(changes)
+            changed += len(applied)
+            if not opts["no_notify"]:
+                notify_many([
+                    dict(
+                        user_id=owner,
+                        item_id=pk,
+                        type="OFFER",
+                        offer_price=changes[pk][1],
+                        message=f"We updated our offer for '{name}': ${changes[pk][1]}. Accept or decline."
+                    )
+                    for pk, owner, name in zip(ids, owners, names) if pk in applied
+                ])
+        elapsed = time.perf_counter() - start
+        verb = "would re-price" if opts["dry_run"] else "re-priced"
+        self.stdout.write(f"scanned {scanned} offer(s), {verb} {changed} in {elapsed:.2f}s")
@@ -0,0 +1,34 @@
+import logging
+import time
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections
+from shop.jobs import run_batch
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (notification fan-out etc.). Safe to run several workers at once."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--idle-sleep", type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit.")
+
+    def handle(self, *args, **opts):
+        total = 0
+        while True:
+            try:
+                claimed = run_batch(opts["batch_size"])
+            except DatabaseError:
+                # e.g. the database restarting: the batch rolled back, its jobs are due again
+                if opts["once"]:
+                    raise
+                logging.getLogger("shop.jobs").exception("Job batch could not run")
+                connections.close_all()
+                time.sleep(opts["idle_sleep"])
+                continue
+            total += claimed
+            if claimed:
+                continue
+            if opts["once"]:
+                break
+            time.sleep(opts["idle_sleep"])
+        self.stdout.write(f"processed {total} job(s)")
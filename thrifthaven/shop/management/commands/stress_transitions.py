@@ -0,0 +1,84 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from shop import lifecycle
+from shop.models import Item
+
+PHASES = ["approve", "accept_offer", "mark_sold"]
+
+class Command(BaseCommand):
+    help = (
+        "Drive approve -> accept_offer -> mark_sold over the same items from parallel workers that all try every "
+        "item, and check each item moved exactly once. --naive does the old read-check-save instead, for comparison."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=500)
+        parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+        parser.add_argument("--batch-size", type=int, default=1, help="items per transition statement")
+        parser.add_argument("--naive", action="store_true")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **opts):
+        owner = User.objects.create_user(username="stress-transitions@example.com")
+        failed = False
+        try:
+            for workers in opts["workers"]:
+                # bulk_create: no post_save, so no staff fan-out jobs for the fixtures
+                ids = [item.pk for item in Item.objects.bulk_create(
+                    Item(user=owner, name=f"stress {i}", price=Decimal("40.00")) for i in range(opts["items"])
+                )]
+                for phase in PHASES:
+                    took, applied = self.run(phase, ids, workers, opts)
+                    target = lifecycle.TRANSITIONS[phase].target
+                    arrived = Item.objects.filter(lifecycle.STATES[target], pk__in=ids).count()
+                    ok = applied == arrived == len(ids)
+                    failed |= not ok
+                    self.stdout.write(
+                        f"workers={workers:<3} {phase:<13} {workers * len(ids) / took:8.0f} attempts/s  "
+                        f"{applied:5} applied for {len(ids)} items, {arrived} {target}  {'ok' if ok else 'WRONG'}"
+                    )
+                Item.objects.filter(pk__in=ids).delete()
+        finally:
+            owner.delete()
+        if failed:
+            raise CommandError("some items were moved more (or less) than once")
+
+    def run(self, phase, ids, workers, opts):
+        rng = random.Random(opts["seed"])
+        orders = [rng.sample(ids, len(ids)) for _ in range(workers)]  # every worker tries every item
+        size = max(1, opts["batch_size"])
+        step = self.naive if opts["naive"] else self.advance
+
+        def worker(order):
+            try:
+                return sum(step(phase, order[i:i + size]) for i in range(0, len(order), size))
+            finally:
+                connections.close_all()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            applied = sum(pool.map(worker, orders))
+        return time.perf_counter() - start, applied
+
+    def advance(self, phase, ids):
+        values = {"offer_price": {pk: Decimal("12.00") for pk in ids}} if phase == "approve" else {}
+        return len(lifecycle.advance(phase, ids, **values))
+
+    def naive(self, phase, ids):
+        # what the views did before: read, check, save every column
+        applied = 0
+        for item in Item.objects.filter(pk__in=ids):
+            if lifecycle.state_of(item) != lifecycle.TRANSITIONS[phase].source:
+                continue
+            if phase == "approve":
+                item.offer_price = Decimal("12.00")
+            for column, value in lifecycle.TRANSITIONS[phase].changes.items():
+                setattr(item, column, value)
+            item.save()
+            applied += 1
+        return applied
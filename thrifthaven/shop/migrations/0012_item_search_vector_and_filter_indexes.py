@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:50
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_item_notification_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('name', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector('description', config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='item_search_vector_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['price'], name='item_price_idx'),
+        ),
+        # The auto-created M2M table only has (item_id, category_id); category filters
+        # drive the join from the category side, so give them an index-only path too.
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS "shop_item_categories_category_item_idx" '
+            'ON "shop_item_categories" ("category_id", "item_id");',
+            reverse_sql='DROP INDEX IF EXISTS "shop_item_categories_category_item_idx";',
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def collapse_staff_copies(apps, schema_editor):
+    """Fold the per-admin copies of "new item submitted" into one broadcast per item."""
+    Notification = apps.get_model('shop', 'Notification')
+    NotificationRead = apps.get_model('shop', 'NotificationRead')
+    copies = Notification.objects.filter(
+        audience='USER', type='INFO', user__is_staff=True, item__isnull=False,
+        message__startswith='\U0001f195 New item submitted:',
+    ).order_by('item_id', 'id')
+    current, group = None, []
+    for notif in copies.iterator(chunk_size=2000):
+        if current is not None and notif.item_id != current:
+            _fold(Notification, NotificationRead, group)
+            group = []
+        current = notif.item_id
+        group.append(notif)
+    if group:
+        _fold(Notification, NotificationRead, group)
+
+
+def _fold(Notification, NotificationRead, group):
+    first = group[0]
+    broadcast = Notification.objects.create(
+        audience='STAFF', user=None, item_id=first.item_id, type='INFO', message=first.message,
+    )
+    Notification.objects.filter(pk=broadcast.pk).update(created_at=first.created_at)
+    NotificationRead.objects.bulk_create(
+        [NotificationRead(notification=broadcast, user_id=n.user_id) for n in group if n.is_read],
+        ignore_conflicts=True,
+    )
+    Notification.objects.filter(pk__in=[n.pk for n in group]).delete()
+
+
+def drop_broadcasts(apps, schema_editor):
+    # user becomes NOT NULL again on the way back
+    apps.get_model('shop', 'Notification').objects.filter(audience='STAFF').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('shop', '0013_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationRead',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NotificationReadMark',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last_read_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='audience',
+            field=models.CharField(choices=[('USER', 'User'), ('STAFF', 'Staff')], default='USER', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('audience', 'STAFF')), fields=['created_at', 'id'], name='notif_broadcast_created_id_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('audience', 'USER'), ('user__isnull', False)), models.Q(('audience', 'STAFF'), ('user__isnull', True)), _connector='OR'), name='notif_audience_user_consistent'),
+        ),
+        migrations.AddField(
+            model_name='notificationread',
+            name='notification',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reads', to='shop.notification'),
+        ),
+        migrations.AddField(
+            model_name='notificationread',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='notificationread',
+            constraint=models.UniqueConstraint(fields=('user', 'notification'), name='notifread_user_notification_uniq'),
+        ),
+        migrations.RunPython(collapse_staff_copies, drop_broadcasts),
+    ]
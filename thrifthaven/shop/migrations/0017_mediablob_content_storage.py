@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:11
+
+import shop.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0016_upload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('size', models.BigIntegerField()),
+                ('refs', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=shop.storage.content_storage, upload_to='items/'),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='video',
+            field=models.FileField(blank=True, null=True, storage=shop.storage.content_storage, upload_to='items/videos/'),
+        ),
+    ]
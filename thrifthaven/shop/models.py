@@ -1,5 +1,10 @@
+import uuid
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from .storage import content_storage
 
 class Category(models.Model):
     name = models.CharField(max_length=255)
@@ -11,14 +16,38 @@ class Item(models.Model):
     description = models.TextField(blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     purchase_date = models.DateField(blank=True, null=True)  # <- needed by algo
-    image = models.ImageField(upload_to="items/", blank=True, null=True)
-    video = models.FileField(upload_to="items/videos/", blank=True, null=True)
+    image = models.ImageField(upload_to="items/", storage=content_storage, blank=True, null=True)
+    video = models.FileField(upload_to="items/videos/", storage=content_storage, blank=True, null=True)
     categories = models.ManyToManyField(Category)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     approved = models.BooleanField(default=False)   # becomes True when user accepts offer
     stock = models.BooleanField(default=False)      # optional “sold” flag
     offer_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)  # <- new
     created_at = models.DateTimeField(auto_now_add=True)
+    # review lease (shop/review.py claim_next): the admin working on a pending item, until when
+    claimed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    claimed_until = models.DateTimeField(blank=True, null=True)
+    # weighted tsvector kept by PostgreSQL itself: name ranks above description
+    search_vector = models.GeneratedField(
+        expression=SearchVector("name", weight="A", config="english")
+        + SearchVector("description", weight="B", config="english"),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            # keyset pagination on (created_at, id), walked in either direction
+            models.Index(fields=["created_at", "id"], name="item_created_id_idx"),
+            GinIndex(fields=["search_vector"], name="item_search_vector_gin"),
+            models.Index(fields=["price"], name="item_price_idx"),
+            # the review queue in claim order; the lease is read from the index, not the row
+            models.Index(
+                "approved", models.ExpressionWrapper(models.Q(offer_price__isnull=True), output_field=models.BooleanField()),
+                "created_at", "id", name="item_review_queue_idx", include=["claimed_until"],
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -30,12 +59,119 @@ class Notification(models.Model):
         ("DECLINED", "Declined"),
         ("SOLD", "Sold"),
     ]
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # USER rows belong to `user`; STAFF rows are stored once and shown to every staff user
+    AUDIENCE_CHOICES = [
+        ("USER", "User"),
+        ("STAFF", "Staff"),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    audience = models.CharField(max_length=10, choices=AUDIENCE_CHOICES, default="USER")
     item = models.ForeignKey(Item, on_delete=models.CASCADE, null=True, blank=True)
     message = models.TextField()
     type = models.CharField(max_length=20, choices=TYPE_CHOICES, default="INFO")
     offer_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    is_read = models.BooleanField(default=False)
+    is_read = models.BooleanField(default=False)  # personal rows only; broadcasts use NotificationRead
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at", "id"], name="notif_user_created_id_idx"),
+            models.Index(fields=["created_at", "id"], name="notif_broadcast_created_id_idx",
+                         condition=models.Q(audience="STAFF")),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(audience="USER", user__isnull=False) | models.Q(audience="STAFF", user__isnull=True),
+                name="notif_audience_user_consistent",
+            ),
+        ]
+
+    def __str__(self):
+        who = self.user.username if self.user_id else self.audience.lower()
+        return f"{who} - {self.message[:20]}"
+
+class NotificationRead(models.Model):
+    """Per-user read receipt for a broadcast notification."""
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name="reads")
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    read_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "notification"], name="notifread_user_notification_uniq"),
+        ]
+
+class NotificationReadMark(models.Model):
+    """Broadcasts with ``id <= last_read_id`` count as read for ``user``; moved by mark_all_read."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    last_read_id = models.BigIntegerField(default=0)
+
+class Upload(models.Model):
+    """A resumable chunked upload session; the finished file is attached to an Item by id."""
+    KIND_CHOICES = [
+        ("image", "Image"),
+        ("video", "Video"),
+    ]
+    STATUS_CHOICES = [
+        ("OPEN", "Open"),
+        ("COMPLETE", "Complete"),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)  # optional, checked on finalize
+    offset = models.BigIntegerField(default=0)            # bytes received so far
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="OPEN")
+    file = models.CharField(max_length=255, blank=True)   # storage name once complete
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+class MediaBlob(models.Model):
+    """One stored file in shop.storage.ContentAddressedStorage and how many fields refer to it."""
+    name = models.CharField(max_length=100, primary_key=True)
+    size = models.BigIntegerField()
+    refs = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refs} refs)"
+
+class ResourceVersion(models.Model):
+    """Change counter behind the API's ETags (shop.conditional); bumped whenever what a key covers changes."""
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    changed_at = models.DateTimeField()
+
+class NotificationCounter(models.Model):
+    """Denormalised unread badge per user; kept in step by shop.notifications, rebuilt by repair_unread_counts."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    unread = models.PositiveIntegerField(default=0)
+
+class Job(models.Model):
+    """A unit of deferred work; rows are deleted once they run successfully."""
+    STATUS_CHOICES = [
+        ("PENDING", "Pending"),
+        ("FAILED", "Failed"),
+    ]
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
+    attempts = models.PositiveIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # workers only ever scan due, pending jobs
+            models.Index(fields=["run_at", "id"], name="job_pending_run_at_idx",
+                         condition=models.Q(status="PENDING")),
+        ]
+
     def __str__(self):
-        return f"{self.user.username} - {self.message[:20]}"
+        return f"{self.kind} #{self.pk} ({self.status})"
@@ -0,0 +1,154 @@
+from collections import Counter, defaultdict
+from django.db import connection, transaction
+from django.db.models import BooleanField, Case, Exists, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from .conditional import bump, notification_keys
+from .models import Notification, NotificationCounter, NotificationRead, NotificationReadMark
+from .pubsub import publish
+
+def visible_to(user):
+    """
+    Personal notifications plus, for staff, the shared broadcasts.
+
+    Every row carries ``read_state``: the row's own ``is_read`` for personal
+    notifications, and for broadcasts whether the user's read watermark or a
+    per-user receipt covers it.
+    """
+    audience = Q(user=user)
+    if user.is_staff:
+        audience |= Q(audience="STAFF")
+    watermark = Coalesce(
+        Subquery(NotificationReadMark.objects.filter(user=user).values("last_read_id")[:1]),
+        Value(0),
+    )
+    receipt = NotificationRead.objects.filter(notification=OuterRef("pk"), user=user)
+    return Notification.objects.filter(audience).annotate(
+        read_state=Case(
+            When(audience="USER", then=F("is_read")),
+            When(id__lte=watermark, then=Value(True)),
+            default=Exists(receipt),
+            output_field=BooleanField(),
+        )
+    )
+
+def mark_read(notification, user):
+    bump(*notification_keys([user.pk]))
+    if notification.audience == "STAFF":
+        with transaction.atomic():
+            mark = _read_mark(user)  # a concurrent mark_all_read would count this broadcast too
+            _, created = NotificationRead.objects.get_or_create(notification=notification, user=user)
+            if created and mark.last_read_id < notification.pk:
+                _decrement(NotificationCounter.objects.filter(pk=user.pk))
+    else:
+        # conditional so two concurrent mark_reads only count once
+        if Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+            _decrement(NotificationCounter.objects.filter(pk=notification.user_id))
+        notification.is_read = True
+
+def mark_unread(notification):
+    """Personal notifications only: a broadcast has no per-user flag to clear."""
+    bump(*notification_keys([notification.user_id]))
+    if Notification.objects.filter(pk=notification.pk, is_read=True).update(is_read=False):
+        NotificationCounter.objects.filter(pk=notification.user_id).update(unread=F("unread") + 1)
+    notification.is_read = False
+
+@transaction.atomic
+def mark_all_read(user):
+    # the counter drops by what this call marked read, not to 0: a notification
+    # created meanwhile was counted and is still unread
+    bump(*notification_keys([user.pk]))
+    read = Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+    broadcasts = Notification.objects.filter(audience="STAFF")
+    latest = user.is_staff and broadcasts.order_by("-id").values_list("id", flat=True).first()
+    if latest:
+        mark = _read_mark(user)
+        if latest > mark.last_read_id:
+            read += broadcasts.filter(id__gt=mark.last_read_id, id__lte=latest).exclude(reads__user=user).count()
+            mark.last_read_id = latest
+            mark.save(update_fields=["last_read_id"])
+        # receipts under the watermark are now redundant
+        NotificationRead.objects.filter(user=user, notification_id__lte=latest).delete()
+    if read:
+        NotificationCounter.objects.filter(pk=user.pk).update(unread=Greatest(F("unread") - read, Value(0)))
+
+def _read_mark(user):
+    """The user's broadcast watermark, locked: their mark_read and mark_all_read take turns."""
+    NotificationReadMark.objects.get_or_create(user=user)
+    return NotificationReadMark.objects.select_for_update().get(user=user)
+
+# ----------------- unread counter -----------------
+
+def unread_count(user):
+    """The badge number: one primary-key read, seeded from the source rows the first time."""
+    unread = NotificationCounter.objects.filter(pk=user.pk).values_list("unread", flat=True).first()
+    return _seed(user) if unread is None else unread
+
+# A counter is seeded by inserting its row and counting, in one transaction that
+# created() can't overlap: created() holds its recipients' seed locks shared and
+# _seed() its user's exclusively (plus the broadcast key, for staff), so a seed
+# waits for the notifications being inserted for that user and counts them, and
+# those inserted after it find the seeded row to bump. Seeds are once per user, and
+# only block notifications for the user being seeded.
+SEED_LOCK = 0x6e6f7469  # pg_advisory_xact_lock(SEED_LOCK, <user id>)
+STAFF_SEEDS = 0  # the second key for broadcasts; no user has id 0
+
+def _lock_seeds(function, keys):
+    if connection.vendor == "postgresql" and keys:
+        with connection.cursor() as cur:
+            # in key order, so transactions taking several keys can't deadlock
+            cur.execute(f"SELECT {function}(%s, key) FROM unnest(%s::integer[]) AS key",
+                        [SEED_LOCK, sorted(keys)])
+
+@transaction.atomic
+def _seed(user):
+    _lock_seeds("pg_advisory_xact_lock", [user.pk, STAFF_SEEDS] if user.is_staff else [user.pk])
+    with connection.cursor() as cur:
+        cur.execute(f"INSERT INTO {connection.ops.quote_name(NotificationCounter._meta.db_table)} (user_id, unread) "
+                    "VALUES (%s, 0) ON CONFLICT DO NOTHING", [user.pk])
+        inserted = cur.rowcount
+    if not inserted:  # seeded by the time we got the lock
+        return NotificationCounter.objects.filter(pk=user.pk).values_list("unread", flat=True).get()
+    unread = count_unread(user)
+    NotificationCounter.objects.filter(pk=user.pk).update(unread=unread)
+    return unread
+
+def count_unread(user):
+    """Exact unread count from the notification rows themselves (slow path)."""
+    return visible_to(user).filter(read_state=False).count()
+
+def created(notifications):
+    """
+    Bump counters for newly inserted notifications and push them to open streams
+    once committed; callers of bulk_create must call this themselves, in the
+    transaction that inserted them.
+    """
+    pairs = [(n.pk, n.user_id if n.audience == "USER" else None) for n in notifications]
+    _lock_seeds("pg_advisory_xact_lock_shared", {STAFF_SEEDS if user_id is None else user_id for _, user_id in pairs})
+    transaction.on_commit(lambda: publish(pairs))
+    bump(*notification_keys({n.user_id for n in notifications if n.audience == "USER"},
+                            staff=any(n.audience == "STAFF" for n in notifications)))
+    by_delta = defaultdict(list)
+    for user_id, n in Counter(n.user_id for n in notifications if n.audience == "USER").items():
+        by_delta[n].append(user_id)
+    for delta, user_ids in by_delta.items():
+        NotificationCounter.objects.filter(pk__in=user_ids).update(unread=F("unread") + delta)
+    broadcasts = sum(1 for n in notifications if n.audience == "STAFF")
+    if broadcasts:
+        NotificationCounter.objects.filter(user__is_staff=True).update(unread=F("unread") + broadcasts)
+
+def deleted(notification):
+    """Take a notification that is about to be deleted out of the counters of everyone it was unread for."""
+    bump(*notification_keys([notification.user_id] if notification.audience == "USER" else [],
+                            staff=notification.audience == "STAFF"))
+    if notification.audience == "USER":
+        if not notification.is_read:
+            _decrement(NotificationCounter.objects.filter(pk=notification.user_id))
+        return
+    _decrement(
+        NotificationCounter.objects.filter(user__is_staff=True)
+        .exclude(user__notificationreadmark__last_read_id__gte=notification.pk)
+        .exclude(user__notificationread__notification=notification)
+    )
+
+def _decrement(counters):
+    counters.update(unread=Greatest(F("unread") - 1, Value(0)))
@@ -0,0 +1,173 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    # Full precision on purpose: DjangoJSONEncoder drops microseconds, which breaks ties.
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque-cursor keyset pagination over the queryset's own ``order_by``.
+
+    The last ordering field must be unique (``id``), so every row has a stable
+    position and pages never shift under concurrent inserts. Each page is a
+    single indexed range scan with ``LIMIT page_size + 1``; there is no COUNT(*)
+    and no OFFSET, so page N costs the same as page 1.
+    """
+    page_size = getattr(settings, "SHOP_PAGE_SIZE", 20)
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.fields = [self.get_field(queryset, f.lstrip("-")) for f in self.ordering]
+
+        position, reverse = self.decode_cursor(request)
+        if reverse:
+            queryset = queryset.order_by(*[self._flip(f) for f in self.ordering])
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position, reverse))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # Walking backwards: "more" lies before us, and we certainly came from a next page.
+        self.has_next = (position is not None) if reverse else has_more
+        self.has_previous = has_more if reverse else (position is not None)
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+            if size > 0:
+                return min(size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        ordering = tuple(queryset.query.order_by)
+        assert ordering and ordering[-1].lstrip("-") in ("id", "pk"), (
+            "KeysetPagination needs a queryset ordered by a unique 'id' tiebreaker."
+        )
+        return ordering
+
+    def get_field(self, queryset, name):
+        # annotations (the search rank) first: they carry their own output_field
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        try:
+            return queryset.model._meta.pk if name == "pk" else queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise AssertionError(f"KeysetPagination cannot order by {name!r}.")
+
+    def get_keyset_filter(self, position, reverse):
+        # (f1, f2, ..., fn) "after" (v1, v2, ..., vn), expanded into ORs so mixed
+        # directions work; the leading non-strict bound lets the planner seek the index.
+        clauses = []
+        for i, field in enumerate(self.ordering):
+            descending = field.startswith("-") != reverse
+            name = field.lstrip("-")
+            lookup = {f.lstrip("-"): v for f, v in zip(self.ordering[:i], position)}
+            lookup[f"{name}__{'lt' if descending else 'gt'}"] = position[i]
+            clauses.append(Q(**lookup))
+        first = self.ordering[0]
+        bound = "lte" if first.startswith("-") != reverse else "gte"
+        return Q(**{f"{first.lstrip('-')}__{bound}": position[0]}) & reduce(or_, clauses)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            position, reverse = data["p"], bool(data.get("r"))
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError
+            # The cursor is client input: every value must convert, or the query 500s.
+            position = [self._to_python(field, value) for field, value in zip(self.fields, position)]
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, ValidationError, InvalidOperation):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, row, reverse):
+        position = [_encode_value(self._get_value(row, f.lstrip("-"))) for f in self.ordering]
+        payload = json.dumps({"p": position, "r": 1 if reverse else 0}, separators=(",", ":"))
+        encoded = base64.urlsafe_b64encode(payload.encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def _to_python(field, value):
+        if value is None or isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise ValueError
+        value = field.to_python(value)
+        if value is None:
+            raise ValueError
+        return value
+
+    @staticmethod
+    def _get_value(row, name):
+        if name == "pk":
+            name = "id"
+        return row[name] if isinstance(row, dict) else getattr(row, name)
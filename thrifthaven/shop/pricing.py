@@ -0,0 +1,61 @@
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+
+CENT = Decimal("0.01")
+YEARLY_DEPRECIATION_PCT = 10
+MAX_DEPRECIATION_PCT = 70
+MARKUP_PCT = 115
+
+def full_years(purchase_date, today):
+    if not purchase_date:
+        return 0
+    return max(0, today.year - purchase_date.year - ((today.month, today.day) < (purchase_date.month, purchase_date.day)))
+
+def compute_offer_price(item, today=None) -> Decimal:
+    """10% per full year since purchase_date (cap 70%), then add 15% on top."""
+    return offer_for(item.price, item.purchase_date, today or date.today())
+
+def offer_for(price, purchase_date, today):
+    years = full_years(purchase_date, today)
+    depreciation = min(Decimal(years) * Decimal("0.10"), Decimal("0.70"))
+    depreciated = (price * (Decimal("1.00") - depreciation))
+    display = (depreciated * Decimal("1.15"))
+    return display.quantize(CENT, rounding=ROUND_HALF_UP)
+
+def compute_offers(prices, purchase_dates, today=None):
+    """
+    Batch form of ``compute_offer_price`` over two columns; returns offers in input order.
+
+    Works in integer cents: offer = cents * (100 - dep%) * 115 / 10000, rounded
+    half away from zero, which is exactly what the Decimal quantize does. That
+    turns six Decimal operations per item into a few int ops, with ``today``
+    and the depreciation table resolved once per batch.
+    """
+    today = today or date.today()
+    ty, tmd = today.year, (today.month, today.day)
+    factor = [(100 - min(y * YEARLY_DEPRECIATION_PCT, MAX_DEPRECIATION_PCT)) * MARKUP_PCT
+              for y in range(MAX_DEPRECIATION_PCT // YEARLY_DEPRECIATION_PCT + 1)]
+    cap = len(factor) - 1
+    den = 10000
+    offers = []
+    for price, purchased in zip(prices, purchase_dates):
+        if not isinstance(price, Decimal) or not price.is_finite():
+            # None, NaN, ints...: whatever offer_for makes of it, errors included
+            offers.append(offer_for(price, purchased, today))
+            continue
+        n, d = price.as_integer_ratio()
+        cents, rest = divmod(n * 100, d)
+        if rest:
+            # more precision than the column stores; not worth a fast path
+            offers.append(offer_for(price, purchased, today))
+            continue
+        years = 0
+        if purchased:
+            years = ty - purchased.year - (tmd < (purchased.month, purchased.day))
+            years = 0 if years < 0 else cap if years > cap else years
+        num = cents * factor[years]
+        rounded = (2 * num + den) // (2 * den) if num >= 0 else -((-2 * num + den) // (2 * den))
+        offer = Decimal(rounded) * CENT
+        # a negative price that rounds to nothing is -0.00 in Decimal arithmetic
+        offers.append(offer.copy_negate() if not rounded and price.is_signed() else offer)
+    return offers
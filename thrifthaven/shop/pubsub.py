@@ -0,0 +1,101 @@
+"""
+Host-local pub/sub for new-notification events.
+
+Every ASGI worker that has streaming clients binds one Unix datagram socket in
+``NOTIFICATION_PUBSUB_DIR``; ``publish`` (callable from any process: request
+handlers, the job worker, the shell) sends the event to every socket there,
+including the one owned by its own process. Sends never block: a subscriber
+that cannot keep up loses events and its clients fall back to resume-by-id.
+"""
+import atexit
+import json
+import logging
+import os
+import socket
+import stat
+import tempfile
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CHUNK = 200  # notifications per datagram, keeps messages well under the socket buffer
+
+def get_pubsub_dir():
+    path = getattr(settings, "NOTIFICATION_PUBSUB_DIR", None) or os.path.join(tempfile.gettempdir(), "thrifthaven-pubsub")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    # in a shared /tmp someone else may have made it first, to read the events or plant sockets
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.geteuid() or st.st_mode & 0o022:
+        raise PermissionError(f"{path} must be a directory owned by this user and writable by no one else")
+    return path
+
+def publish(notifications):
+    """Announce new ``(id, user_id)`` pairs; ``user_id`` is None for staff broadcasts."""
+    pairs = [[pk, user_id] for pk, user_id in notifications]
+    if not pairs:
+        return
+    try:
+        directory = get_pubsub_dir()
+        targets = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".sock")]
+    except PermissionError as exc:
+        logger.error("Not publishing notifications: %s", exc)
+        return
+    except FileNotFoundError:
+        return
+    if not targets:
+        return
+    messages = [json.dumps({"n": pairs[i:i + CHUNK]}).encode() for i in range(0, len(pairs), CHUNK)]
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+        sock.setblocking(False)
+        for target in targets:
+            for message in messages:
+                try:
+                    sock.sendto(message, target)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # owner died without cleaning up
+                    _unlink(target)
+                    break
+                except BlockingIOError:
+                    logger.warning("Notification subscriber %s is full; dropping event", target)
+                    break
+
+class Subscriber:
+    """The receiving end for one process; ``callback(pairs)`` runs on the event loop."""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.path = os.path.join(get_pubsub_dir(), f"{os.getpid()}-{id(self):x}.sock")
+        self.sock = None
+
+    def start(self, loop):
+        _unlink(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind(self.path)
+        self.sock.setblocking(False)
+        loop.add_reader(self.sock.fileno(), self._drain)
+        atexit.register(self.stop)
+
+    def stop(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        _unlink(self.path)
+
+    def _drain(self):
+        while True:
+            try:
+                data = self.sock.recv(1 << 16)
+            except (BlockingIOError, OSError):
+                return
+            try:
+                pairs = json.loads(data)["n"]
+            except (ValueError, KeyError):
+                continue
+            self.callback(pairs)
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,29 @@
+"""
+``X-DB-Queries``: how many SQL statements a request ran, on every database
+alias, when ``QUERY_COUNT_HEADER`` is on. Counts through execute wrappers, so
+it works without DEBUG's query log.
+"""
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+
+class QueryCountMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "QUERY_COUNT_HEADER", False):
+            return self.get_response(request)
+        count = 0
+
+        def counter(execute, sql, params, many, context):
+            nonlocal count
+            count += 1
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            response = self.get_response(request)
+        response["X-DB-Queries"] = str(count)
+        return response
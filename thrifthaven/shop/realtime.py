@@ -0,0 +1,223 @@
+"""
+Server-Sent Events stream of new notifications, mounted by ``thrifthaven/asgi.py``.
+
+    GET /api/notifications/stream/?token=<SimpleJWT access token>
+
+``Authorization: Bearer`` works too for clients that can set headers. Each
+event's ``id`` is the notification id, so a reconnecting ``EventSource``
+sends ``Last-Event-ID`` (or pass ``?last_id=``) and gets what it missed.
+
+The stream ends when the token expires, and on a heartbeat that finds the user
+deactivated or their staff flag changed; the client reconnects with a fresh
+token and resumes from its Last-Event-ID.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db import close_old_connections
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from . import notifications
+from .models import Notification
+from .pubsub import Subscriber
+from .serializers import NotificationSerializer
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = "/api/notifications/stream/"
+HEARTBEAT_SECONDS = 20
+QUEUE_SIZE = 100
+BACKLOG_LIMIT = 500
+
+class Connection:
+    def __init__(self, user):
+        self.user_id = user.pk
+        self.is_staff = user.is_staff
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # too slow: hang up, the client resumes from its Last-Event-ID
+            self.overflowed = True
+
+class Hub:
+    """Per-process registry of open streams, fed by the host-local pub/sub."""
+
+    def __init__(self):
+        self.by_user = defaultdict(set)
+        self.staff = set()
+        self.subscriber = None
+
+    def subscribe(self, conn):
+        if self.subscriber is None:
+            self.subscriber = Subscriber(self.dispatch)
+            self.subscriber.start(asyncio.get_running_loop())
+        self.by_user[conn.user_id].add(conn)
+        if conn.is_staff:
+            self.staff.add(conn)
+
+    def unsubscribe(self, conn):
+        conns = self.by_user.get(conn.user_id)
+        if conns is not None:
+            conns.discard(conn)
+            if not conns:
+                del self.by_user[conn.user_id]
+        self.staff.discard(conn)
+
+    def dispatch(self, pairs):
+        # Only load rows someone on this worker is actually listening for.
+        wanted = [pk for pk, user_id in pairs if (user_id in self.by_user if user_id else self.staff)]
+        if wanted:
+            asyncio.get_running_loop().create_task(self._deliver(wanted))
+
+    async def _deliver(self, ids):
+        try:
+            rows = await sync_to_async(_load, thread_sensitive=True)(ids)
+        except Exception:
+            logger.exception("Could not load notifications %s for streaming", ids)
+            return
+        for notif_id, user_id, data in rows:
+            targets = self.by_user.get(user_id, ()) if user_id else self.staff
+            for conn in list(targets):
+                conn.push((notif_id, data))
+
+hub = Hub()
+
+def _load(ids):
+    close_old_connections()
+    try:
+        qs = Notification.objects.select_related("item").filter(pk__in=ids).order_by("id")
+        return [(n.pk, n.user_id, NotificationSerializer(n).data) for n in qs]
+    finally:
+        close_old_connections()
+
+def _backlog(user, last_id):
+    close_old_connections()
+    try:
+        qs = notifications.visible_to(user).select_related("item").filter(id__gt=last_id).order_by("id")[:BACKLOG_LIMIT]
+        return [(n.pk, NotificationSerializer(n).data) for n in qs]
+    finally:
+        close_old_connections()
+
+def _authenticate(raw_token):
+    """The token's active user and its expiry (a timestamp), or (None, None)."""
+    close_old_connections()
+    try:
+        token = AccessToken(raw_token)
+        user = User.objects.get(**{jwt_settings.USER_ID_FIELD: token[jwt_settings.USER_ID_CLAIM]})
+        return (user, token["exp"]) if user.is_active else (None, None)
+    except (TokenError, KeyError, User.DoesNotExist):
+        return None, None
+    finally:
+        close_old_connections()
+
+def _still_allowed(user):
+    """Whether ``user`` is still active with the same staff flag the stream was opened with."""
+    close_old_connections()
+    try:
+        return User.objects.filter(pk=user.pk, is_active=True, is_staff=user.is_staff).exists()
+    finally:
+        close_old_connections()
+
+def _event(notif_id, data):
+    payload = json.dumps(data, default=str, separators=(",", ":"))
+    return f"id: {notif_id}\nevent: notification\ndata: {payload}\n\n".encode()
+
+async def _wait_for_disconnect(receive):
+    # the (empty) request body arrives first; only http.disconnect ends the stream
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+async def _reject(send, status, detail):
+    body = json.dumps({"detail": detail}).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": body})
+
+async def notification_stream(scope, receive, send):
+    headers = dict(scope["headers"])
+    query = parse_qs(scope.get("query_string", b"").decode())
+    raw_token = query.get("token", [None])[0]
+    auth = headers.get(b"authorization", b"").decode()
+    if not raw_token and auth.lower().startswith("bearer "):
+        raw_token = auth[7:].strip()
+    if scope["method"] != "GET":
+        return await _reject(send, 405, "Method not allowed.")
+    user, expires = await sync_to_async(_authenticate)(raw_token) if raw_token else (None, None)
+    if user is None:
+        return await _reject(send, 401, "Authentication credentials were not provided or are invalid.")
+
+    last_id = headers.get(b"last-event-id", b"").decode() or query.get("last_id", [""])[0]
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return await _reject(send, 400, "last_id must be an integer.")
+
+    conn = Connection(user)
+    hub.subscribe(conn)  # before the backlog query, so nothing slips between the two
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]})
+        await send({"type": "http.response.body", "body": b": connected\n\n", "more_body": True})
+        # ids replayed from the backlog may also arrive live; send each once
+        replayed = set()
+        while last_id is not None:
+            backlog = await sync_to_async(_backlog)(user, last_id)
+            for notif_id, data in backlog:
+                await send({"type": "http.response.body", "body": _event(notif_id, data), "more_body": True})
+                replayed.add(notif_id)
+                last_id = notif_id
+            if len(backlog) < BACKLOG_LIMIT:
+                break
+
+        disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+        next_event = asyncio.ensure_future(conn.queue.get())
+        try:
+            while not conn.overflowed:
+                remaining = expires - time.time()
+                if remaining <= 0:
+                    break  # the token ran out: the client reconnects with a fresh one
+                done, _ = await asyncio.wait({disconnect, next_event}, timeout=min(HEARTBEAT_SECONDS, remaining),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if disconnect in done:
+                    break
+                if next_event in done:
+                    notif_id, data = next_event.result()
+                    next_event = asyncio.ensure_future(conn.queue.get())
+                    if notif_id in replayed:
+                        replayed.discard(notif_id)
+                        continue
+                    chunk = _event(notif_id, data)
+                elif not await sync_to_async(_still_allowed)(user):
+                    break  # deactivated, or staff access changed what the stream may carry
+                else:
+                    chunk = b": keep-alive\n\n"
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            disconnect.cancel()
+            next_event.cancel()
+        await send({"type": "http.response.body", "body": b""})
+    except OSError:
+        pass  # client went away mid-write
+    finally:
+        hub.unsubscribe(conn)
+
+def with_notification_stream(django_app):
+    """Wrap the Django ASGI app so the stream path is served here, everything else by Django."""
+    async def app(scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == STREAM_PATH:
+            return await notification_stream(scope, receive, send)
+        return await django_app(scope, receive, send)
+    return app
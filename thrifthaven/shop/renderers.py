@@ -0,0 +1,89 @@
+"""
+Faster renderers and parsers for the API, picked by ``Accept`` / ``Content-Type``.
+
+``JSONRenderer`` produces the bytes DRF's JSONRenderer does (compact, UTF-8,
+decimals and datetimes through DRF's encoder, U+2028/U+2029 escaped) but
+encodes with orjson; anything orjson can't take (pretty-printing for the
+browsable API, ints over 64 bits) goes to DRF's renderer. Only float values,
+which serializer fields don't produce (decimals are strings), can come out
+differently: floats Python writes in exponent form are spelled the short way
+(``1e16`` for ``1e+16``, ``0.00001`` for ``1e-05``), and NaN and infinities
+render as ``null`` where DRF refuses them; catching those would mean scanning
+every response. ``JSONParser`` hands DRF's parser whatever orjson rejects or
+would read differently (ints over 64 bits, which orjson reads as floats).
+MessagePack (``application/msgpack``) carries the same values as the JSON does.
+orjson and msgpack are optional: without orjson the JSON classes are DRF's, and
+settings only offer MessagePack when msgpack is installed.
+"""
+import re
+from io import BytesIO
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+# DRF's conversions for what the encoders don't know (Decimal -> float, lazy strings, ...)
+encode_default = JSONEncoder().default
+# 19 digits may not fit orjson's 64-bit ints
+LONG_INT = re.compile(rb"[0-9]{19}")
+
+class JSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if (orjson is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            # datetimes go through DRF's encoder too: it writes UTC as "Z", orjson as "+00:00"
+            ret = orjson.dumps(data, default=encode_default,
+                               option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # same as DRF: keep the output valid inside a <script> tag
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+
+class JSONParser(parsers.JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        if stream is None:
+            raise ParseError("JSON parse error - empty body")
+        body = stream.read()
+        if not LONG_INT.search(body):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass  # DRF's parser has the final say, and the error message
+        return super().parse(BytesIO(body), media_type, parser_context)
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=encode_default, use_bin_type=True, datetime=False)
+
+class MessagePackParser(parsers.BaseParser):
+    media_type = "application/msgpack"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            raise ParseError("MessagePack parse error - empty body")
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError) as exc:  # msgpack's errors are ValueErrors; TypeError for unhashable keys
+            raise ParseError(f"MessagePack parse error - {exc}")
@@ -0,0 +1,119 @@
+from django.conf import settings
+from django.db import connection, transaction
+from . import lifecycle
+from .cache import invalidate
+from .conditional import bump, item_keys
+from .jobs import notify_many
+from .models import Item
+
+BULK_LIMIT = 5000
+CLAIM_LIMIT = 100
+
+def pending_items():
+    """The admin review queue: submitted, not yet offered, not approved."""
+    return Item.objects.filter(lifecycle.STATES["pending"])
+
+def lease_seconds():
+    return getattr(settings, "REVIEW_LEASE_SECONDS", 300)
+
+def claim_pending(user, count):
+    """
+    Lease the ``count`` oldest pending items nobody holds a live lease on to ``user``; returns ``(ids, until)``.
+
+    ``SKIP LOCKED`` passes over rows another admin is claiming at this moment, so
+    concurrent claims take disjoint items without queueing behind each other on
+    the head of the queue. An expired lease is up for grabs again.
+    """
+    table = Item._meta.db_table
+    with connection.cursor() as cur:
+        cur.execute(
+            f"""
+            WITH next AS (
+                SELECT id FROM {table}
+                WHERE NOT approved AND offer_price IS NULL AND (claimed_until IS NULL OR claimed_until <= now())
+                ORDER BY created_at, id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE {table} AS i SET claimed_by_id = %s, claimed_until = now() + make_interval(secs => %s)
+            FROM next WHERE i.id = next.id
+            RETURNING i.id, i.claimed_until
+            """,
+            [count, user.pk, lease_seconds()],
+        )
+        rows = cur.fetchall()
+    return [pk for pk, _ in rows], (rows[0][1] if rows else None)
+
+def release_claims(user, ids=None):
+    """End ``user``'s leases on ``ids`` (all of them if None); returns how many were released."""
+    held = Item.objects.filter(claimed_by=user)
+    if ids is not None:
+        held = held.filter(pk__in=ids)
+    # not shown by the API: no versions to bump
+    return held.update(claimed_by=None, claimed_until=None)
+
+def apply_offers(offers):
+    """
+    Set ``offer_price`` for ``{item_id: offer}`` in one UPDATE and return the ids it applied to.
+
+    This is the ``approve`` transition (shop/lifecycle.py): an item that got an
+    offer (or was approved) concurrently is left alone and reported as not
+    applied instead of being overwritten, and the items it applies to leave
+    their review lease (``claimed_by`` / ``claimed_until`` cleared) like a single approve.
+    """
+    return lifecycle.advance("approve", offers, offer_price=offers)
+
+def apply_reprices(changes):
+    """
+    Move outstanding offers ``{item_id: (old_offer, new_offer)}`` in one UPDATE; returns the ids changed.
+
+    Only rows still holding ``old_offer`` and not yet accepted are touched, so an
+    owner accepting in the meantime keeps the price they accepted.
+    """
+    if not changes:
+        return set()
+    ids = list(changes)
+    old = [changes[pk][0] for pk in ids]
+    new = [changes[pk][1] for pk in ids]
+    with connection.cursor() as cur:
+        cur.execute(
+            f"""
+            UPDATE {Item._meta.db_table} AS i SET offer_price = v.new
+            FROM unnest(%s::bigint[], %s::numeric[], %s::numeric[]) AS v(id, old, new)
+            WHERE i.id = v.id AND i.offer_price = v.old AND NOT i.approved
+            RETURNING i.id
+            """,
+            [ids, old, new],
+        )
+        applied = {row[0] for row in cur.fetchall()}
+    if applied:
+        bump(*item_keys(*applied))
+        invalidate("item", *applied)
+    return applied
+
+def offer_notifications(items, offers, applied):
+    notify_many([
+        dict(
+            user_id=item.user_id,
+            item_id=item.pk,
+            type="OFFER",
+            offer_price=offers[item.pk],
+            message=f"We made an offer for '{item.name}': ${offers[item.pk]}. Accept or decline."
+        )
+        for item in items if item.pk in applied
+    ])
+
+@transaction.atomic
+def decline_items(items):
+    """Delete those of ``items`` still pending and queue their owners' notifications; returns the deleted ids."""
+    deleted = lifecycle.advance("decline", [item.pk for item in items])
+    notify_many([
+        dict(
+            user_id=item.user_id,
+            item_id=None,
+            type="DECLINED",
+            message=f"Your item '{item.name}' was declined and removed."
+        )
+        for item in items if item.pk in deleted
+    ])
+    return deleted
@@ -0,0 +1,151 @@
+"""
+Read replicas for GET traffic, with read-your-writes stickiness.
+
+Reads go to a healthy replica from ``READ_REPLICAS`` only while ReplicaMiddleware
+is handling a GET/HEAD request, outside any transaction, for a user who has not
+written in the last ``REPLICA_STICKY_SECONDS``. Everything else (writes, unsafe
+requests, jobs, commands) uses ``default``. A user's successful POST/PUT/PATCH/
+DELETE pins their reads to the primary for the window, through the cache, so
+replicas need a cache shared by all workers: with a per-process one the next
+GET may land on a worker that never saw the write. The window is never shorter
+than a healthy replica may lag behind (see ``sticky_seconds``).
+
+Each process checks a replica at most every ``REPLICA_CHECK_INTERVAL`` seconds;
+one that fails or lags more than ``REPLICA_MAX_LAG`` seconds is skipped until a
+later check passes, and with none left reads fall back to the primary.
+"""
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.exceptions import TokenError
+from .cache import key, shared
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# {"alias": ...} while a request that may read from a replica is being handled; the
+# replica is picked on the first read, so one request sees one consistent snapshot
+_replica_reads = ContextVar("replica_reads", default=None)
+
+# alias -> (checked at, healthy)
+_health = {}
+_health_lock = threading.Lock()
+
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+def replicas():
+    return [alias for alias in getattr(settings, "READ_REPLICAS", ()) if alias in settings.DATABASES]
+
+def lag(alias):
+    """Replication delay of ``alias`` in seconds (0 for a non-PostgreSQL stand-in); raises DatabaseError."""
+    with connections[alias].cursor() as cur:
+        if connections[alias].vendor != "postgresql":
+            cur.execute("SELECT 1")
+            return 0.0
+        cur.execute(LAG_SQL)
+        return float(cur.fetchone()[0])
+
+def check(alias):
+    try:
+        behind = lag(alias)
+    except DatabaseError as exc:
+        logger.warning("Replica %s is unavailable: %s", alias, exc)
+        connections[alias].close()
+        return False
+    if behind > getattr(settings, "REPLICA_MAX_LAG", 10):
+        logger.warning("Replica %s is %.1fs behind; reading from the primary", alias, behind)
+        return False
+    return True
+
+def is_healthy(alias):
+    now = time.monotonic()
+    with _health_lock:
+        checked, healthy = _health.get(alias, (None, True))
+        due = checked is None or now - checked >= getattr(settings, "REPLICA_CHECK_INTERVAL", 5)
+        if due:
+            # claim the check so concurrent threads keep using the last result meanwhile
+            _health[alias] = (now, healthy)
+    if due:
+        healthy = check(alias)
+        with _health_lock:
+            _health[alias] = (now, healthy)
+    return healthy
+
+def sticky_seconds():
+    # a replica that passed its last check may be up to MAX_LAG behind, plus however far it slipped since
+    floor = getattr(settings, "REPLICA_MAX_LAG", 10) + getattr(settings, "REPLICA_CHECK_INTERVAL", 5)
+    return max(getattr(settings, "REPLICA_STICKY_SECONDS", 15), floor)
+
+def stick(user_id):
+    """Send ``user_id``'s reads to the primary for the sticky window."""
+    if sticky_seconds() > 0:
+        cache.set(key("primary-reads", user_id), True, sticky_seconds())
+
+def is_sticky(user_id):
+    return user_id is not None and bool(cache.get(key("primary-reads", user_id)))
+
+def token_user_id(request):
+    # only picks the database: an unverified id costs a forger nothing but primary reads
+    header = request.headers.get("Authorization", "").split()
+    if len(header) != 2 or header[0] not in jwt_settings.AUTH_HEADER_TYPES:
+        return None
+    try:
+        return AccessToken(header[1], verify=False).get(jwt_settings.USER_ID_CLAIM)
+    except TokenError:
+        return None
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        reads = _replica_reads.get()
+        if reads is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if reads["alias"] is None:
+            healthy = [alias for alias in replicas() if is_healthy(alias)]
+            reads["alias"] = random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+        return reads["alias"]
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # replicas hold the same rows as the primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replicas()
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        if replicas() and not shared():
+            raise ImproperlyConfigured("READ_REPLICAS need a shared cache for read-your-writes stickiness; "
+                                       "set CACHES['default'] to one (see SHOP_CACHE_SHARED).")
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # session users (the admin) always read from the primary
+        reads = (bool(replicas()) and request.method in SAFE_METHODS
+                 and settings.SESSION_COOKIE_NAME not in request.COOKIES and not is_sticky(token_user_id(request)))
+        token = _replica_reads.set({"alias": None} if reads else None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+        # DRF sets request.user to the authenticated (JWT) user on the Django request too
+        user = getattr(request, "user", None)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and user and user.is_authenticated:
+            stick(user.pk)
+        return response
@@ -0,0 +1,70 @@
+from decimal import Decimal, InvalidOperation
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Exists, F, FloatField, OuterRef
+from django.db.models.functions import Cast
+from rest_framework.exceptions import ValidationError
+from .models import Item
+
+SEARCH_CONFIG = "english"
+TRUE_VALUES = {"1", "true", "yes"}
+FALSE_VALUES = {"0", "false", "no"}
+
+def _parse_decimal(params, name):
+    raw = params.get(name)
+    if raw in (None, ""):
+        return None
+    try:
+        value = Decimal(raw)
+    except InvalidOperation:
+        value = None
+    if value is None or not value.is_finite():
+        raise ValidationError({name: "Must be a number."})
+    return value
+
+def _parse_ids(params, name):
+    raw = params.get(name)
+    if not raw:
+        return []
+    try:
+        return [int(v) for v in raw.split(",") if v.strip()]
+    except ValueError:
+        raise ValidationError({name: "Must be a comma-separated list of ids."})
+
+def filter_items(queryset, params):
+    """
+    Apply ?q=, ?category=, ?min_price=, ?max_price= and ?approved= to an item queryset.
+
+    ``q`` matches the GIN-indexed ``search_vector`` and orders by weighted rank
+    (name over description); otherwise the queryset keeps its newest-first order.
+    Both orderings end in ``id`` so results stay keyset-paginated.
+    """
+    category_ids = _parse_ids(params, "category")
+    if category_ids:
+        # EXISTS instead of a join: no duplicate rows when several categories match
+        through = Item.categories.through.objects.filter(item_id=OuterRef("pk"), category_id__in=category_ids)
+        queryset = queryset.filter(Exists(through))
+
+    min_price = _parse_decimal(params, "min_price")
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+    max_price = _parse_decimal(params, "max_price")
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+
+    approved = params.get("approved")
+    if approved:
+        if approved.lower() in TRUE_VALUES:
+            queryset = queryset.filter(approved=True)
+        elif approved.lower() in FALSE_VALUES:
+            queryset = queryset.filter(approved=False)
+        else:
+            raise ValidationError({"approved": "Must be true or false."})
+
+    q = (params.get("q") or "").strip()
+    if q:
+        query = SearchQuery(q, config=SEARCH_CONFIG, search_type="websearch")
+        # ts_rank is float4; widen it so the rank in the cursor round-trips exactly
+        queryset = queryset.filter(search_vector=query).annotate(
+            rank=Cast(SearchRank(F("search_vector"), query), FloatField())
+        ).order_by("-rank", "-created_at", "-id")
+    return queryset
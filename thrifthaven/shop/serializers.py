@@ -1,36 +1,313 @@
+from django.contrib.postgres.expressions import ArraySubquery
+from django.core.files.storage import default_storage
+from django.db.models import OuterRef
+from django.db.models.functions import JSONObject
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
 from rest_framework import serializers
-from .models import Category, Item, Notification
+from .images import FORMATS, PREFIX as VARIANTS, WIDTHS, srcset, thumbnail
+from .models import Category, Item, Notification, Upload
+from . import batch, notifications, sparse
+from .sparse import SparseFieldsMixin
+from .uploads import max_size
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ["id", "name"]
 
-class ItemSerializer(serializers.ModelSerializer):
+class ItemSummarySerializer(serializers.ModelSerializer):
+    """What ``?expand=item`` inlines into a notification."""
+    thumbnail = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Item
+        fields = ["id", "name", "offer_price", "thumbnail"]
+
+    def get_thumbnail(self, obj):
+        return thumbnail(obj.image, self.context.get("request"))
+
+class ItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = serializers.CharField(source="user.username", read_only=True)
     image_url = serializers.SerializerMethodField()
     video_url = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
     categories = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), many=True)
+    # finished chunked uploads (see shop/uploads.py), instead of sending the file in this request
+    image_upload = serializers.UUIDField(write_only=True, required=False)
+    video_upload = serializers.UUIDField(write_only=True, required=False)
 
     class Meta:
         model = Item
         fields = [
             "id","name","description","price","purchase_date",
-            "image","video","image_url","video_url",
-            "categories","user","approved","stock","offer_price","created_at"
+            "image","video","image_url","video_url","image_srcset",
+            "categories","user","approved","stock","offer_price","created_at",
+            "image_upload","video_upload","thumbnail"
         ]
-        read_only_fields = ["user","approved","stock","offer_price","created_at","image_url","video_url"]
+        read_only_fields = ["user","approved","stock","offer_price","created_at","image_url","video_url","image_srcset"]
+        # ?fields= / ?expand= (shop/sparse.py)
+        opt_in_fields = ["thumbnail"]
+        expandable = {"categories": lambda: CategorySerializer(many=True, read_only=True)}
+        field_columns = {
+            "image_url": ["image"], "image_srcset": ["image"], "thumbnail": ["image"],
+            "video_url": ["video"], "user": ["user__username"], "categories": [],
+        }
+
+    def _completed_upload(self, upload_id, kind):
+        request = self.context.get("request")
+        try:
+            return Upload.objects.get(pk=upload_id, user=request.user, kind=kind, status="COMPLETE")
+        except Upload.DoesNotExist:
+            raise serializers.ValidationError({f"{kind}_upload": "No finished upload with this id."})
+
+    def validate(self, data):
+        for kind in ("image", "video"):
+            upload_id = data.pop(f"{kind}_upload", None)
+            if upload_id:
+                data[f"_{kind}_upload"] = self._completed_upload(upload_id, kind)
+        return data
+
+    def _attach_uploads(self, validated_data):
+        uploads = [validated_data.pop(f"_{kind}_upload", None) for kind in ("image", "video")]
+        for kind, upload in zip(("image", "video"), uploads):
+            if upload:
+                validated_data[kind] = upload.file
+        return [u for u in uploads if u]
+
+    def create(self, validated_data):
+        uploads = self._attach_uploads(validated_data)
+        item = super().create(validated_data)
+        Upload.objects.filter(pk__in=[u.pk for u in uploads]).delete()  # the file now belongs to the item
+        return item
+
+    def update(self, instance, validated_data):
+        uploads = self._attach_uploads(validated_data)
+        item = super().update(instance, validated_data)
+        Upload.objects.filter(pk__in=[u.pk for u in uploads]).delete()
+        return item
 
     def get_image_url(self, obj):
         request = self.context.get("request")
         return request.build_absolute_uri(obj.image.url) if obj.image and request else (obj.image.url if obj.image else None)
 
+    def get_image_srcset(self, obj):
+        # resized WebP/JPEG variants by width; grids should use these, not image_url
+        return srcset(obj.image, self.context.get("request"))
+
+    def get_thumbnail(self, obj):
+        return thumbnail(obj.image, self.context.get("request"))
+
     def get_video_url(self, obj):
         request = self.context.get("request")
         return request.build_absolute_uri(obj.video.url) if obj.video and request else (obj.video.url if obj.video else None)
 
-class NotificationSerializer(serializers.ModelSerializer):
+# ----------------- read-only list path -----------------
+# ItemSerializer's output, built from values() rows instead of model instances
+# and DRF fields: list/pending responses are read-only and by far the hottest.
+
+ITEM_LIST_COLUMNS = (
+    "id", "name", "description", "price", "purchase_date", "image", "video",
+    "user__username", "approved", "stock", "offer_price", "created_at",
+)
+
+def item_rows(queryset, names=None, expand=()):
+    """
+    ``queryset`` as rows for ItemListSerializer, reading only the columns ``names``
+    (default: all of ItemSerializer's) need; category ids are aggregated in SQL.
+    """
+    cols = ITEM_LIST_COLUMNS if names is None else ["id", *sparse.columns(ItemSerializer, names, expand)]
+    order = [f.lstrip("-") for f in queryset.query.order_by if isinstance(f, str)]
+    cols = list(dict.fromkeys([*cols, *order]))  # the cursor reads the ordering columns, e.g. search rank
+    annotations = {}
+    if names is None or "categories" in names:
+        through = Item.categories.through.objects.filter(item_id=OuterRef("pk")).order_by("id")
+        if "categories" in expand:
+            annotations["category_objs"] = ArraySubquery(
+                through.values(obj=JSONObject(id="category_id", name="category__name"))
+            )
+        else:
+            annotations["category_ids"] = ArraySubquery(through.values("category_id"))
+    return queryset.prefetch_related(None).select_related(None).values(*cols, **annotations)
+
+def _url_prefix(storage, request):
+    base = storage.url("")
+    return request.build_absolute_uri(base) if request else base
+
+def _datetime(value, tz):
+    # DRF's DateTimeField representation
+    value = value.astimezone(tz).isoformat()
+    return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+class ItemListSerializer:
+    """
+    Read-only ``many=True`` stand-in for ItemSerializer over ``item_rows()``.
+
+    Produces the same JSON as ItemSerializer, ``?fields=``/``?expand=`` included:
+    media URLs are the storage URL appended to one precomputed absolute prefix,
+    decimals and datetimes are formatted the way DRF's fields format them.
+    """
+
+    def __init__(self, instance=None, many=True, context=None, **kwargs):
+        self.instance = instance
+        self.context = context or {}
+
+    @property
+    def data(self):
+        request = self.context.get("request")
+        names, expand = sparse.select(request, ItemSerializer)
+        project = names != sparse.select(None, ItemSerializer)[0]
+        media = _url_prefix(Item._meta.get_field("image").storage, request)
+        videos = _url_prefix(Item._meta.get_field("video").storage, request)
+        variants = _url_prefix(default_storage, request) + VARIANTS
+        suffixes = [(fmt, [(str(w), f".{w}w.{fmt}") for w in WIDTHS]) for fmt in FORMATS]
+        thumb = f".{min(WIDTHS)}w.webp"
+        tz = timezone.get_current_timezone()
+        get = dict.get
+        out = []
+        for row in self.instance:
+            image = get(row, "image")
+            if image:
+                quoted = filepath_to_uri(image).lstrip("/")
+                image = media + quoted
+                image_srcset = {
+                    fmt: {w: variants + quoted + suffix for w, suffix in widths} for fmt, widths in suffixes
+                }
+            else:
+                quoted = image = image_srcset = None
+            video = get(row, "video")
+            video = videos + filepath_to_uri(video).lstrip("/") if video else None
+            price, offer, bought, created = (get(row, "price"), get(row, "offer_price"),
+                                             get(row, "purchase_date"), get(row, "created_at"))
+            item = {
+                "id": row["id"],
+                "name": get(row, "name"),
+                "description": get(row, "description"),
+                "price": None if price is None else f"{price:f}",
+                "purchase_date": None if bought is None else bought.isoformat(),
+                "image": image,
+                "video": video,
+                "image_url": image,
+                "video_url": video,
+                "image_srcset": image_srcset,
+                "categories": row["category_objs"] if "categories" in expand else get(row, "category_ids"),
+                "user": get(row, "user__username"),
+                "approved": get(row, "approved"),
+                "stock": get(row, "stock"),
+                "offer_price": None if offer is None else f"{offer:f}",
+                "created_at": _datetime(created, tz) if created else None,
+            }
+            if project:
+                item["thumbnail"] = variants + quoted + thumb if quoted else None
+                item = {name: item[name] for name in names}
+            out.append(item)
+        return out
+
+class ReadStateField(serializers.BooleanField):
+    def get_attribute(self, instance):
+        # broadcasts are shared rows; their per-user state comes from notifications.visible_to()
+        if instance.audience == "USER":
+            return instance.is_read
+        return getattr(instance, "read_state", instance.is_read)
+
+class NotificationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     item_name = serializers.CharField(source="item.name", read_only=True)
+    is_read = ReadStateField(required=False)
     class Meta:
         model = Notification
         fields = ["id","type","message","item","item_name","offer_price","is_read","created_at"]
+        expandable = {"item": lambda: ItemSummarySerializer(read_only=True)}
+        field_columns = {"item_name": ["item__name"], "is_read": ["is_read", "audience"]}
+        expand_columns = {"item": ["item__name", "item__offer_price", "item__image"]}
+
+    def update(self, instance, validated_data):
+        # is_read goes through shop.notifications, which keeps the unread counter in step;
+        # only the columns sent are saved, so a concurrent mark_read is not written back
+        is_read = validated_data.pop("is_read", None)
+        for name, value in validated_data.items():
+            setattr(instance, name, value)
+        if validated_data:
+            instance.save(update_fields=list(validated_data))
+        if is_read:
+            notifications.mark_read(instance, instance.user)
+        elif is_read is False:
+            notifications.mark_unread(instance)
+        return instance
+
+class UploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Upload
+        fields = ["id","kind","filename","size","sha256","offset","status","created_at"]
+        read_only_fields = ["offset","status","created_at"]
+
+    def validate_size(self, value):
+        if not 0 < value <= max_size():
+            raise serializers.ValidationError(f"Must be between 1 and {max_size()} bytes.")
+        return value
+
+    def validate_sha256(self, value):
+        if value and (len(value) != 64 or any(c not in "0123456789abcdefABCDEF" for c in value)):
+            raise serializers.ValidationError("Must be a hex SHA-256 digest.")
+        return value.lower()
+
+class BatchSerializer(serializers.Serializer):
+    """Body of ``POST /api/batch/`` (see shop/batch.py); a request is a path or ``{"path", "headers"}``."""
+    requests = serializers.ListField(child=serializers.JSONField(), allow_empty=False)
+    parallel = serializers.BooleanField(default=False)
+
+    def validate_requests(self, value):
+        if len(value) > batch.max_requests():
+            raise serializers.ValidationError(f"At most {batch.max_requests()} requests per batch.")
+        specs = []
+        for spec in value:
+            spec = {"path": spec} if isinstance(spec, str) else spec
+            if not isinstance(spec, dict) or not isinstance(spec.get("path"), str) or not spec["path"].startswith("/"):
+                raise serializers.ValidationError("Each request must be an absolute path or {\"path\": ..., \"headers\": {...}}.")
+            headers = spec.get("headers") or {}
+            if not isinstance(headers, dict) or not all(isinstance(v, str) for v in headers.values()):
+                raise serializers.ValidationError("headers must map names to strings.")
+            if {name.lower() for name in headers} - batch.FORWARDED_HEADERS:
+                raise serializers.ValidationError(f"Only these headers can be set: {', '.join(sorted(batch.FORWARDED_HEADERS))}.")
+            specs.append({"path": spec["path"], "headers": headers})
+        return specs
+
+class ItemFilterSerializer(serializers.Serializer):
+    """
+    The ``"filter"`` of a bulk review call: the list filters as JSON values,
+    checked, then handed to ``search.filter_items`` as the query strings it parses.
+    """
+    q = serializers.CharField(required=False, allow_blank=True)
+    category = serializers.JSONField(required=False)
+    min_price = serializers.DecimalField(max_digits=None, decimal_places=None, required=False, allow_null=True)
+    max_price = serializers.DecimalField(max_digits=None, decimal_places=None, required=False, allow_null=True)
+    approved = serializers.BooleanField(required=False, allow_null=True)
+
+    def validate(self, attrs):
+        unknown = set(self.initial_data) - set(self.fields)
+        if unknown:
+            # a misspelt filter would otherwise widen the action to every pending item
+            raise serializers.ValidationError(f"Unknown filter(s) {', '.join(sorted(unknown))}; "
+                                              f"choose from {', '.join(self.fields)}.")
+        return attrs
+
+    def validate_category(self, value):
+        if isinstance(value, str):  # "1,2", as in the query string
+            value = [int(v) if v.strip().isdigit() else v for v in value.split(",") if v.strip()]
+        ids = value if isinstance(value, list) else [value]
+        if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            raise serializers.ValidationError("Must be a category id, a list of them, or a comma-separated string.")
+        return ids
+
+    def to_params(self):
+        data, params = self.validated_data, {}
+        if data.get("q"):
+            params["q"] = data["q"]
+        if data.get("category"):
+            params["category"] = ",".join(map(str, data["category"]))
+        for name in ("min_price", "max_price"):
+            if data.get(name) is not None:
+                params[name] = str(data[name])
+        if data.get("approved") is not None:
+            params["approved"] = "true" if data["approved"] else "false"
+        return params
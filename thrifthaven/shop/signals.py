@@ -1,15 +1,135 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Item, Notification
+from myapp.authentication import users as authenticated_users
+from myapp.models import Profile
+from . import notifications
+from .cache import invalidate
+from .conditional import bump, item_keys, notification_keys
+from .jobs import enqueue
+from .models import Category, Item, Notification
 
 @receiver(post_save, sender=Item)
 def notify_admin_on_item_creation(sender, instance, created, **kwargs):
+    # Fan-out to every staff user happens in the job worker, not in the request.
     if created:
-        for admin in User.objects.filter(is_staff=True):
-            Notification.objects.create(
-                user=admin,
-                item=instance,
-                type="INFO",
-                message=f"🆕 New item submitted: '{instance.name}' for ${instance.price}"
-            )
+        enqueue("notify_staff_new_item", item_id=instance.pk)
+
+# Keep NotificationCounter in step with single saves and with cascades (e.g. item deletion).
+# pre_delete, because broadcast read receipts are gone by post_delete.
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, **kwargs):
+    if created:
+        notifications.created([instance])
+    elif instance.audience == "USER":
+        bump(*notification_keys([instance.user_id]))
+
+@receiver(pre_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    notifications.deleted(instance)
+
+# ETag versions (shop/conditional.py) and cached representations (shop/cache.py).
+# Notifications show their item's name, so an item change also invalidates its
+# owner's and the staff notification lists.
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_categories(sender, instance, **kwargs):
+    bump("categories")
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def uncache_category_items(sender, instance, created=False, **kwargs):
+    # ?expand=categories renders the name; on delete the through rows go in the
+    # cascade, without an m2m_changed
+    if not created:
+        invalidate("item", *instance.item_set.values_list("pk", flat=True))
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def bump_item(sender, instance, **kwargs):
+    bump(*item_keys(instance.pk), *notification_keys([instance.user_id], staff=True))
+    invalidate("item", instance.pk)
+
+@receiver(m2m_changed, sender=Item.categories.through)
+def bump_item_categories(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        invalidate("item", *instance.item_set.values_list("pk", flat=True))
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # from the category side; pk_set is None on clear, and every item page depends on "categories"
+        bump("categories", *item_keys())
+        invalidate("item", *(pk_set or ()))
+    else:
+        bump(*item_keys(instance.pk))
+        invalidate("item", instance.pk)
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def uncache_profile(sender, instance, **kwargs):
+    invalidate("profile", instance.user_id)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def uncache_user_profile(sender, instance, **kwargs):
+    invalidate("profile", instance.pk)
+    # the JWT user cache too (myapp/authentication.py): password changes, deactivation
+    transaction.on_commit(lambda: authenticated_users.forget(instance.pk))
+
+# Items show their seller's username: a rename changes every cached item of theirs
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    instance._loaded_username = instance.__dict__.get("username")  # None when deferred
+
+@receiver(post_save, sender=User)
+def bump_renamed_seller_items(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and "username" not in update_fields):
+        return
+    if instance._loaded_username is not None and instance._loaded_username == instance.username:
+        return
+    instance._loaded_username = instance.username
+    item_ids = list(Item.objects.filter(user_id=instance.pk).values_list("pk", flat=True))
+    if item_ids:
+        bump(*item_keys(*item_ids))
+        invalidate("item", *item_ids)
+
+# Content-addressed media is reference counted (shop/storage.py): give a file's
+# reference back when the row pointing at it is deleted or points elsewhere.
+MEDIA_FIELDS = {Item: ("image", "video"), Profile: ("profile_picture",)}
+
+def _stored_name(value):
+    # only names already in storage; a freshly assigned upload has no reference yet
+    if isinstance(value, FieldFile):
+        return value.name if value._committed else None
+    return (value or None) if isinstance(value, str) else None
+
+def _release(instance, field, name):
+    storage = instance._meta.get_field(field).storage
+    transaction.on_commit(lambda: storage.delete(name))
+
+def remember_media(sender, instance, **kwargs):
+    # raw attribute values: no FieldFile is built, and deferred fields are skipped
+    instance._media_names = {
+        f: _stored_name(instance.__dict__[f]) for f in MEDIA_FIELDS[sender] if f in instance.__dict__
+    }
+
+def release_replaced_media(sender, instance, **kwargs):
+    names = getattr(instance, "_media_names", {})
+    for field, old in names.items():
+        new = _stored_name(instance.__dict__.get(field))
+        if old and old != new:
+            _release(instance, field, old)
+        names[field] = new
+
+def release_deleted_media(sender, instance, **kwargs):
+    for field in MEDIA_FIELDS[sender]:
+        name = _stored_name(instance.__dict__.get(field))
+        if name:
+            _release(instance, field, name)
+
+for model in MEDIA_FIELDS:
+    post_init.connect(remember_media, sender=model)
+    post_save.connect(release_replaced_media, sender=model)
+    post_delete.connect(release_deleted_media, sender=model)
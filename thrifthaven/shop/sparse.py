@@ -0,0 +1,78 @@
+"""
+Sparse fieldsets and opt-in expansion on reads: ``?fields=id,name,thumbnail&expand=categories``.
+
+A serializer using SparseFieldsMixin describes its extras in ``Meta``:
+
+    opt_in_fields   rendered only when named in ``?fields=``
+    expandable      {field: factory of the serializer field that replaces it when expanded}
+    field_columns   {field: model columns it reads} where that is not just the field's name
+    expand_columns  {field: extra model columns its expansion reads}
+
+Views use ``select`` and ``columns`` to narrow their queryset to what will be rendered.
+"""
+from functools import lru_cache
+from rest_framework import serializers
+
+SAFE_METHODS = ("GET", "HEAD")
+
+def query_list(request, name):
+    raw = request.query_params.get(name) if hasattr(request, "query_params") else request.GET.get(name)
+    if raw is None:
+        return None
+    return [part.strip() for part in raw.split(",") if part.strip()]
+
+@lru_cache(maxsize=None)
+def readable(serializer_class):
+    """Every field name the serializer can render, opt-in ones included, in declaration order."""
+    return tuple(name for name, field in serializer_class().get_fields().items() if not field.write_only)
+
+def select(request, serializer_class):
+    """``(names, expand)`` to render for this request; raises ValidationError for unknown names."""
+    meta = serializer_class.Meta
+    available = readable(serializer_class)
+    opt_in = set(getattr(meta, "opt_in_fields", ()))
+    default = [name for name in available if name not in opt_in]
+    if request is None or request.method not in SAFE_METHODS:
+        return default, set()
+    fields, expand = query_list(request, "fields"), query_list(request, "expand") or []
+    errors = {}
+    if fields is not None and set(fields) - set(available):
+        errors["fields"] = f"Unknown field(s) {', '.join(sorted(set(fields) - set(available)))}; " \
+                           f"choose from {', '.join(available)}."
+    expandable = getattr(meta, "expandable", {})
+    if set(expand) - set(expandable):
+        errors["expand"] = f"Cannot expand {', '.join(sorted(set(expand) - set(expandable)))}; " \
+                           f"choose from {', '.join(expandable) or 'nothing'}."
+    if errors:
+        raise serializers.ValidationError(errors)
+    names = default if fields is None else [name for name in available if name in fields]
+    return names, set(expand) & set(names)
+
+def columns(serializer_class, names, expand):
+    """Model columns (``only()``/``values()`` paths) needed to render ``names`` with ``expand``."""
+    meta = serializer_class.Meta
+    field_columns = getattr(meta, "field_columns", {})
+    expand_columns = getattr(meta, "expand_columns", {})
+    needed = []
+    for name in names:
+        needed += field_columns.get(name, [name])
+        if name in expand:
+            needed += expand_columns.get(name, [])
+    return list(dict.fromkeys(needed))
+
+class SparseFieldsMixin:
+    """Drops the fields a read did not ask for and swaps in expansions; writes are left alone."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            for name in getattr(self.Meta, "opt_in_fields", ()):
+                self.fields.pop(name, None)
+            return
+        names, expand = select(request, type(self))
+        keep = set(names)
+        for name in [n for n, field in self.fields.items() if not field.write_only and n not in keep]:
+            self.fields.pop(name)
+        for name in expand:
+            self.fields[name] = self.Meta.expandable[name]()
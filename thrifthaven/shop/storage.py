@@ -0,0 +1,128 @@
+"""
+Content-addressed media storage for item images/videos and profile pictures.
+
+A file is stored once under the SHA-256 of its bytes, ``cas/ab/<sha256>.jpg``,
+whatever it was uploaded as and however many times. ``MediaBlob`` counts the
+model fields pointing at each file; ``save`` takes a reference, ``delete``
+gives one back and the file goes away with the last one. Names never change
+content, so everything under ``cas/`` (and its image variants) is safe to
+cache forever.
+
+Names outside ``cas/`` (files stored before this backend, the default profile
+picture) are never deleted from here; ``gc_media`` deals with those, and with
+blobs whose count leaked.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+
+PREFIX = "cas/"
+NAME_RE = re.compile(r"^cas/[0-9a-f]{2}/[0-9a-f]{64}(\.[a-z0-9]{1,8})?$")
+
+def is_content_name(name):
+    return bool(name) and bool(NAME_RE.match(name))
+
+def _lock(cursor, name):
+    # serialises save/delete of one blob across processes until the transaction ends
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [name])
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        return name  # the name is decided by the content in _save
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1].lower()
+        ext = ext if re.fullmatch(r"\.[a-z0-9]{1,8}", ext) else ""
+        tmp_dir = self.path(PREFIX + "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        # hash while streaming into a temporary file on the same filesystem
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        if hasattr(content, "temporary_file_path"):
+            os.close(fd)
+            file_move_safe(content.temporary_file_path(), tmp_path, allow_overwrite=True)
+            with open(tmp_path, "rb") as fh:
+                for chunk in iter(lambda: fh.read(64 * 1024), b""):
+                    digest.update(chunk)
+                    size += len(chunk)
+        else:
+            with os.fdopen(fd, "wb") as fh:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    size += len(chunk)
+                    fh.write(chunk)
+
+        sha = digest.hexdigest()
+        name = f"{PREFIX}{sha[:2]}/{sha}{ext}"
+        full_path = self.path(name)
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                _lock(cursor, name)
+                cursor.execute(
+                    "INSERT INTO shop_mediablob (name, size, refs, created_at) VALUES (%s, %s, 1, now()) "
+                    "ON CONFLICT (name) DO UPDATE SET refs = shop_mediablob.refs + 1",
+                    [name, size],
+                )
+                if not os.path.exists(full_path):
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    os.replace(tmp_path, full_path)
+                    os.chmod(full_path, self.file_permissions_mode or 0o644)  # mkstemp makes it 0600
+                else:
+                    os.utime(full_path)  # mtime = last stored, which gc_media's --min-age relies on
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)  # a duplicate: the stored copy is already there
+        return name
+
+    def delete(self, name):
+        """Drop one reference; the file itself goes once nothing refers to it."""
+        if not is_content_name(name):
+            return
+        with transaction.atomic(), connection.cursor() as cursor:
+            _lock(cursor, name)
+            cursor.execute(
+                "UPDATE shop_mediablob SET refs = refs - 1 WHERE name = %s AND refs > 0 RETURNING refs", [name]
+            )
+            row = cursor.fetchone()
+            if row is not None and row[0] == 0:
+                cursor.execute("DELETE FROM shop_mediablob WHERE name = %s", [name])
+                transaction.on_commit(lambda: self._remove_if_unreferenced(name))
+
+    def _remove_if_unreferenced(self, name):
+        # re-checked under the lock: a concurrent save may have brought the name back
+        with transaction.atomic(), connection.cursor() as cursor:
+            _lock(cursor, name)
+            cursor.execute("SELECT 1 FROM shop_mediablob WHERE name = %s", [name])
+            if cursor.fetchone() is None:
+                super().delete(name)
+
+    def reclaim(self, name, stored_before, dispose):
+        """
+        Garbage-collect an unreferenced blob: forget its count and pass its path to
+        ``dispose``, unless it was stored again at or after ``stored_before``.
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            _lock(cursor, name)
+            try:
+                if os.path.getmtime(self.path(name)) >= stored_before:
+                    return False
+            except FileNotFoundError:
+                return False
+            cursor.execute("DELETE FROM shop_mediablob WHERE name = %s", [name])
+            dispose(self.path(name))
+        return True
+
+_storage = None
+
+def content_storage():
+    """Storage for the media FileFields (a callable, so migrations don't freeze its settings)."""
+    global _storage
+    if _storage is None:
+        _storage = ContentAddressedStorage()
+    return _storage
@@ -1,3 +1,1227 @@
-from django.test import TestCase
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, OperationalError, connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APIClient
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+from rest_framework_simplejwt.tokens import AccessToken
+from PIL import Image
 
-# Create your tests here.
+from myapp.authentication import CachedJWTAuthentication
+from myapp.models import Profile
+from . import batch, lifecycle, notifications, pubsub, realtime, review, routers, uploads
+from .cache import key as cache_key
+from .conditional import bump, item_keys
+from .jobs import HANDLERS, handler, notify, run_batch
+from .management.commands.bench_list_serializer import Command as ListBench
+from .management.commands.gc_media import BloomFilter
+from .management.commands.import_marketplace import Checkpoint
+from .models import Category, Item, Job, MediaBlob, Notification, NotificationCounter, ResourceVersion, Upload
+from .pricing import compute_offer_price, compute_offers
+from .renderers import JSONParser, JSONRenderer, MessagePackParser, MessagePackRenderer, msgpack
+from .serializers import ItemListSerializer, ItemSerializer, item_rows
+from .storage import content_storage
+
+class JobQueueTests(TransactionTestCase):
+    # TransactionTestCase: the deferred FK checks only run when run_batch's transaction commits
+
+    def test_notify_for_deleted_user_is_dropped(self):
+        gone = User.objects.create_user("gone@example.com")
+        kept = User.objects.create_user("kept@example.com")
+        notify(gone, None, "INFO", "for a user deleted before the worker ran")
+        notify(kept, None, "INFO", "still delivered")
+        gone.delete()
+        self.assertEqual(run_batch(), 2)
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(list(Notification.objects.values_list("user_id", flat=True)), [kept.pk])
+
+    def test_bad_payload_fails_only_its_own_job(self):
+        @handler("test_raw_notify")
+        def raw_notify(payloads):
+            # no existence check: an unknown user only shows up as a deferred FK violation
+            Notification.objects.bulk_create([Notification(user_id=p["user_id"], message="x") for p in payloads])
+        self.addCleanup(HANDLERS.pop, "test_raw_notify")
+        user = User.objects.create_user("ok@example.com")
+        Job.objects.create(kind="test_raw_notify", payload={"user_id": user.pk})
+        bad = Job.objects.create(kind="test_raw_notify", payload={"user_id": user.pk + 1000})
+        Job.objects.create(kind="test_raw_notify", payload={"user_id": user.pk})
+
+        with self.assertLogs("shop.jobs", "ERROR"):
+            self.assertEqual(run_batch(), 3)
+        self.assertEqual(Notification.objects.filter(user=user).count(), 2)
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), ("PENDING", 1))
+        self.assertIn("IntegrityError", bad.last_error)
+        self.assertEqual(list(Job.objects.values_list("pk", flat=True)), [bad.pk])
+        # backing off, not re-claimed straight away
+        self.assertEqual(run_batch(), 0)
+
+class BulkFilterTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user("admin@example.com", is_staff=True)
+        owner = User.objects.create_user("owner@example.com")
+        self.hat = Item.objects.create(user=owner, name="hat", price=5)
+        self.coat = Item.objects.create(user=owner, name="coat", price=50)
+        self.coat.categories.add(Category.objects.create(name="Outerwear"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def decline(self, filters):
+        return self.client.post("/api/items/bulk_decline/", {"filter": filters}, format="json")
+
+    def test_bad_shapes_are_400(self):
+        for filters in ({"category": [1, "x"]}, {"category": True}, {"q": ["x"]}, {"min_price": [1]},
+                        {"max_price": "cheap"}, {"approved": "maybe"}, {"aproved": False}):
+            with self.subTest(filters=filters):
+                self.assertEqual(self.decline(filters).status_code, 400)
+        self.assertEqual(Item.objects.count(), 2)
+        response = self.client.post("/api/items/bulk_decline/", {"filter": {}, "limit": -1}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_json_values(self):
+        category = self.coat.categories.get().pk
+        for filters, expected in (
+            ({"category": category}, {self.coat.pk}),
+            ({"category": [category, category + 1]}, {self.coat.pk}),
+            ({"category": str(category)}, {self.coat.pk}),
+            ({"min_price": 10}, {self.coat.pk}),
+            ({"max_price": 10.5}, {self.hat.pk}),
+            ({"approved": True}, set()),
+            ({"approved": False, "q": "coat"}, {self.coat.pk}),
+            ({"q": 5}, set()),
+        ):
+            with self.subTest(filters=filters), transaction.atomic():
+                response = self.decline(filters)
+                self.assertEqual(response.status_code, 200, response.content)
+                self.assertEqual({r["id"] for r in response.data["results"]}, expected)
+                transaction.set_rollback(True)
+
+class ImportMarketplaceTests(TransactionTestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name, records):
+        path = os.path.join(self.dir.name, name)
+        with open(path, "w") as fh:
+            fh.writelines(json.dumps(record) + "\n" for record in records)
+        return path
+
+    def test_json_numbers_and_bad_types(self):
+        users = self.write("users.jsonl", [
+            {"email": "num@example.com", "phone": 5551234567},
+            {"email": 42, "phone": "5550000001"},
+            {"email": "pw@example.com", "phone": "5550000002", "password": ["x"]},
+        ])
+        items = self.write("items.jsonl", [
+            {"seller_email": "num@example.com", "name": 1984, "price": 12.5},
+            {"seller_email": "num@example.com", "name": ["x"], "price": 1},
+            {"seller_email": ["num@example.com"], "name": "hat", "price": 1},
+        ])
+        rejects = os.path.join(self.dir.name, "rejects.jsonl")
+        call_command("import_marketplace", users=users, items=items, workers=0, rejects=rejects, stdout=io.StringIO())
+        self.assertEqual(Profile.objects.get(user__email="num@example.com").phone, "5551234567")
+        self.assertEqual(list(Item.objects.values_list("name", "price")), [("1984", Decimal("12.50"))])
+        with open(rejects) as fh:
+            reasons = [json.loads(line)["reason"] for line in fh]
+        self.assertEqual(reasons, ["invalid email", "password must be text", "name must be text", "seller_email must be text"])
+
+    def test_out_of_range_prices_are_rejected(self):
+        User.objects.create_user("seller@example.com", email="seller@example.com")
+        prices = ["1e30", 1e30, "99999999.99", "100000000", "12.345", "-1", "NaN", "1e-40", "1E+3"]
+        items = self.write("items.jsonl", [{"seller_email": "seller@example.com", "name": f"p{i}", "price": price}
+                                           for i, price in enumerate(prices)])
+        rejects = os.path.join(self.dir.name, "rejects.jsonl")
+        call_command("import_marketplace", items=items, workers=0, rejects=rejects, stdout=io.StringIO())
+        self.assertEqual(sorted(Item.objects.values_list("name", "price")),
+                         [("p2", Decimal("99999999.99")), ("p8", Decimal("1000.00"))])
+        with open(rejects) as fh:
+            self.assertEqual([json.loads(line)["reason"] for line in fh], ["invalid price"] * 7)
+
+    def test_resume_after_crash_before_checkpoint(self):
+        User.objects.create_user("seller@example.com", email="seller@example.com")
+        items = self.write("items.jsonl", [{"seller_email": "seller@example.com", "name": f"i{i}", "price": 1}
+                                           for i in range(5)])
+        checkpoint = os.path.join(self.dir.name, "checkpoint.json")
+        options = {"items": items, "checkpoint": checkpoint, "chunk_size": 2, "stdout": io.StringIO()}
+        with mock.patch.object(Checkpoint, "advance", side_effect=[None, KeyboardInterrupt]):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command("import_marketplace", **options)  # second chunk committed, not checkpointed
+        self.assertEqual(Item.objects.count(), 4)
+        call_command("import_marketplace", **options)
+        self.assertEqual(sorted(Item.objects.values_list("name", flat=True)), [f"i{i}" for i in range(5)])
+
+class ComputeOffersTests(SimpleTestCase):
+    today = date(2026, 3, 1)
+
+    def assertSameOffers(self, prices, dates):
+        items = [SimpleNamespace(price=p, purchase_date=d) for p, d in zip(prices, dates)]
+        expected = [compute_offer_price(item, self.today) for item in items]
+        offers = compute_offers(prices, dates, self.today)
+        # str too: 0.00 and -0.00 are equal but render differently
+        self.assertEqual([(o, str(o)) for o in offers], [(e, str(e)) for e in expected])
+
+    def test_matches_compute_offer_price(self):
+        rng = random.Random(1234)
+        edge_dates = [None, self.today, self.today + timedelta(days=1), date(2020, 2, 29), date(2024, 2, 29),
+                      date(2025, 3, 1), date(2025, 3, 2), date(1990, 1, 1)]
+        for _ in range(20):
+            prices, dates = [], []
+            for _ in range(500):
+                if rng.random() < 0.1:
+                    cents = rng.choice([0, 1, -1, 5, -5, 49, 50, -50, 99, 100, 10**10 - 1, -(10**10 - 1)])
+                else:
+                    cents = rng.randint(-10**6, 10**10 - 1)
+                prices.append(Decimal(cents).scaleb(-2))
+                dates.append(rng.choice(edge_dates) if rng.random() < 0.2
+                             else self.today - timedelta(days=rng.randint(-400, 365 * 12)))
+            self.assertSameOffers(prices, dates)
+
+    def test_odd_prices(self):
+        self.assertSameOffers([Decimal("-0.01"), Decimal("-0.00"), Decimal("0.001"), Decimal("-12.345"), Decimal("7")],
+                              [None, None, date(2020, 1, 1), None, date(2000, 1, 1)])
+        for price in (None, Decimal("NaN")):
+            with self.subTest(price=price):
+                item = SimpleNamespace(price=price, purchase_date=None)
+                try:
+                    expected = compute_offer_price(item, self.today)
+                except Exception as exc:
+                    with self.assertRaises(type(exc)):
+                        compute_offers([price], [None], self.today)
+                else:
+                    self.assertEqual(str(compute_offers([price], [None], self.today)[0]), str(expected))
+
+class LifecycleTests(TransactionTestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner@example.com")
+        self.admin = User.objects.create_user("admin@example.com", is_staff=True)
+        self.item = Item.objects.create(user=self.owner, name="lamp", price=Decimal("40.00"))
+
+    def race(self, name, workers=8, **values):
+        """Run ``apply(name, item)`` from ``workers`` threads at once; returns the outcomes."""
+        start = threading.Barrier(workers)
+
+        def attempt(_):
+            try:
+                start.wait()
+                lifecycle.apply(name, self.item.pk, **values)
+                return "applied"
+            except lifecycle.Conflict as exc:
+                return exc.state
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(workers) as pool:
+            return sorted(pool.map(attempt, range(workers)))
+
+    def test_concurrent_transitions_apply_once(self):
+        self.assertEqual(self.race("approve", offer_price=Decimal("12.00")), ["applied"] + ["offered"] * 7)
+        self.assertEqual(self.race("accept_offer"), ["applied"] + ["live"] * 7)
+        self.assertEqual(self.race("mark_sold"), ["applied"] + ["sold"] * 7)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.offer_price, self.item.approved, self.item.stock), (Decimal("12.00"), True, True))
+
+    def test_concurrent_decline_offer_deletes_once(self):
+        lifecycle.apply("approve", self.item.pk, offer_price=Decimal("12.00"))
+        self.assertEqual(self.race("decline_offer"), ["applied"] + ["deleted"] * 7)
+
+    def test_conflicting_request_is_409(self):
+        admin, owner = APIClient(), APIClient()
+        admin.force_authenticate(self.admin)
+        owner.force_authenticate(self.owner)
+        url = f"/api/items/{self.item.pk}/"
+        self.assertEqual(owner.post(url + "accept_offer/").status_code, 409)
+        self.assertEqual(admin.post(url + "approve/").status_code, 200)
+        response = admin.post(url + "approve/")
+        self.assertEqual((response.status_code, response.data["state"]), (409, "offered"))
+        self.assertEqual(admin.post(url + "decline/").status_code, 409)
+        self.assertEqual(owner.post(url + "accept_offer/").status_code, 200)
+        self.assertEqual(owner.post(url + "decline_offer/").status_code, 409)
+        self.assertTrue(Item.objects.filter(pk=self.item.pk, approved=True).exists())
+
+@override_settings(READ_REPLICAS=["replica_test"], REPLICA_CHECK_INTERVAL=0, SHOP_CACHE_SHARED=True)
+class ReplicaRouterTests(TransactionTestCase):
+    # the stand-in replica is a second connection to the test database: it holds the same rows,
+    # and where a query went shows in each connection's query log. Added after setUpClass,
+    # as the test runner only sets up the aliases in settings.
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        connections.settings["replica_test"] = {**connections.settings["default"], "OPTIONS": {}}
+        cls.databases = {"default", "replica_test"}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica_test"].close()
+        del connections["replica_test"]
+        del connections.settings["replica_test"]
+
+    def setUp(self):
+        cache.clear()
+        routers._health.clear()
+        self.user = User.objects.create_user("reader@example.com")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.item = Item.objects.create(user=self.user, name="lamp", price=5)
+
+    def get(self, path, **headers):
+        """The response, and how many queries each database served."""
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections["replica_test"]) as replica:
+            response = self.client.get(path, **headers)
+        return response, len(primary), len(replica)
+
+    def test_reads_go_to_the_replica(self):
+        response, primary, replica = self.get("/api/categories/")
+        self.assertEqual((response.status_code, primary), (200, 0))
+        self.assertGreater(replica, 0)
+
+    def test_writer_reads_from_the_primary(self):
+        response = self.client.post("/api/categories/")  # read-only viewset: an unsafe request that fails
+        self.assertEqual(response.status_code, 405)
+        self.assertGreater(self.get("/api/categories/")[2], 0)
+        response = self.client.patch(f"/api/items/{self.item.pk}/", {"name": "desk lamp"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        response, primary, replica = self.get(f"/api/items/{self.item.pk}/")
+        self.assertEqual((response.data["name"], replica), ("desk lamp", 0))
+        cache.delete(cache_key("primary-reads", self.user.pk))  # the sticky window ends
+        self.assertGreater(self.get("/api/categories/")[2], 0)
+
+    def test_falls_back_when_lagging_or_down(self):
+        for failure in ({"return_value": 60.0}, {"side_effect": DatabaseError("down")}):
+            routers._health.clear()
+            with self.subTest(failure=failure), mock.patch.object(routers, "lag", **failure):
+                response, primary, replica = self.get("/api/categories/")
+                self.assertEqual((response.status_code, replica), (200, 0))
+                self.assertGreater(primary, 0)
+
+    def test_replica_reads_stay_out_of_the_shared_cache(self):
+        response, _, replica = self.get(f"/api/items/{self.item.pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(replica, 0)
+        self.assertIsNone(cache.get(cache_key("item", self.item.pk)))
+        self.assertIsNone(cache.get(cache_key("version", f"item:{self.item.pk}")))
+        # the ETag is built from the replica's versions: still valid until the replica sees a change
+        response, _, _ = self.get(f"/api/items/{self.item.pk}/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        bump(*item_keys(self.item.pk))
+        response, _, _ = self.get(f"/api/items/{self.item.pk}/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+    def test_sticky_window_outlasts_replica_lag(self):
+        with override_settings(REPLICA_STICKY_SECONDS=5, REPLICA_MAX_LAG=10, REPLICA_CHECK_INTERVAL=5):
+            self.assertEqual(routers.sticky_seconds(), 15)
+        with override_settings(REPLICA_STICKY_SECONDS=60):
+            self.assertEqual(routers.sticky_seconds(), 60)
+
+    def test_replicas_need_a_shared_cache(self):
+        with override_settings(SHOP_CACHE_SHARED=False), self.assertRaises(ImproperlyConfigured):
+            routers.ReplicaMiddleware(lambda request: None)
+        with override_settings(SHOP_CACHE_SHARED=False, READ_REPLICAS=[]):
+            routers.ReplicaMiddleware(lambda request: None)
+
+@override_settings(SHOP_CACHE_SHARED=True)
+class SellerRenameTests(TestCase):
+    def test_rename_refreshes_cached_items(self):
+        cache.clear()
+        seller = User.objects.create_user("seller@example.com", email="seller@example.com")
+        Profile.objects.create(user=seller, phone="5550000000")
+        item = Item.objects.create(user=seller, name="lamp", price=5)
+        client = APIClient()
+        client.force_authenticate(seller)
+        url = f"/api/items/{item.pk}/"
+        before = client.get(url)
+        self.assertEqual(before.data["user"], "seller@example.com")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.patch("/api/auth/update_profile/", {"username": "vintage-vera"})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=before["ETag"]).status_code, 200)
+        self.assertEqual(client.get(url).data["user"], "vintage-vera")
+
+    def test_login_save_does_not_bump(self):
+        seller = User.objects.create_user("seller@example.com")
+        Item.objects.create(user=seller, name="lamp", price=5)
+        with mock.patch("shop.signals.bump") as bump_:
+            User.objects.get(pk=seller.pk).save(update_fields=["last_login"])
+            User.objects.get(pk=seller.pk).save()
+        bump_.assert_not_called()
+
+class ImageVariantTests(SimpleTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        for name in ("items/a.png", "other/a.png"):
+            os.makedirs(os.path.join(media.name, os.path.dirname(name)), exist_ok=True)
+            Image.new("RGB", (300, 200), "teal").save(os.path.join(media.name, name))
+
+    def test_builds_variants_of_uploads(self):
+        response = self.client.get("/media/variants/items/a.png.200w.webp")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Image.open(io.BytesIO(b"".join(response.streaming_content))).size, (200, 133))
+
+    def test_refuses_other_sources(self):
+        self.client.get("/media/variants/items/a.png.600w.webp")  # variants/items/a.png.600w.webp now exists
+        for name in ("variants/items/a.png.600w.webp.200w.webp", "other/a.png.200w.webp", "items/a.png.300w.webp"):
+            with self.subTest(name):
+                self.assertEqual(self.client.get(f"/media/variants/{name}").status_code, 404)
+
+    def test_decompression_bomb(self):
+        with mock.patch.object(Image, "MAX_IMAGE_PIXELS", 1000), self.assertLogs("shop.images", "ERROR"):
+            self.assertEqual(self.client.get("/media/variants/items/a.png.200w.webp").status_code, 404)
+
+class UploadTests(TransactionTestCase):
+    def setUp(self):
+        media, sessions = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.addCleanup(sessions.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name, CHUNKED_UPLOAD_DIR=sessions.name))
+        self.user = User.objects.create_user("uploader@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.data = b"0123456789"
+
+    def start(self, sha256=None):
+        response = self.client.post("/api/uploads/", {"filename": "clip.mp4", "size": len(self.data), "kind": "video",
+                                                      "sha256": sha256 or hashlib.sha256(self.data).hexdigest()})
+        self.assertEqual(response.status_code, 201, response.content)
+        return Upload.objects.get(pk=response.data["id"])
+
+    def put(self, upload, start, end, body=None, **headers):
+        body = self.data[start:end + 1] if body is None else body
+        return self.client.put(f"/api/uploads/{upload.pk}/", body, content_type="application/octet-stream",
+                               headers={"Content-Range": f"bytes {start}-{end}/{len(self.data)}", **headers})
+
+    def finalize(self, upload):
+        return self.client.post(f"/api/uploads/{upload.pk}/finalize/")
+
+    def test_chunks_and_finalize(self):
+        upload = self.start()
+        self.assertEqual(self.put(upload, 0, 3).data["offset"], 4)
+        response = self.put(upload, 0, 3)  # a retry of a chunk that already landed
+        self.assertEqual((response.status_code, response.data["offset"]), (409, 4))
+        self.assertEqual(self.put(upload, 4, 10).status_code, 400)  # past the end
+        self.assertEqual(self.put(upload, 4, 6, body=b"45").status_code, 400)  # Content-Length != span
+        self.assertEqual(self.put(upload, 4, 9, **{"X-Chunk-SHA256": "0" * 64}).status_code, 400)
+        self.assertEqual(self.finalize(upload).status_code, 400)  # incomplete
+        self.assertEqual(os.path.getsize(uploads.partial_path(upload)), 4)
+        self.assertEqual(self.put(upload, 4, 9, **{"X-Chunk-SHA256": hashlib.sha256(b"456789").hexdigest()}).data["offset"], 10)
+        self.assertEqual(os.listdir(uploads.get_upload_dir()), [f"{upload.pk}.part"])  # no chunk files left over
+        response = self.finalize(upload)
+        self.assertEqual(response.data["status"], "COMPLETE")
+        upload.refresh_from_db()
+        with content_storage().open(upload.file) as fh:
+            self.assertEqual(fh.read(), self.data)
+        self.assertFalse(os.path.exists(uploads.partial_path(upload)))
+        self.assertEqual(self.finalize(upload).status_code, 200)
+        self.assertEqual(MediaBlob.objects.get().refs, 1)
+
+    def test_checksum_mismatch_on_finalize(self):
+        upload = self.start(sha256="a" * 64)
+        self.put(upload, 0, 9)
+        self.assertEqual(self.finalize(upload).status_code, 400)
+        self.assertEqual(Upload.objects.get(pk=upload.pk).status, "OPEN")
+
+    def test_chunk_is_read_without_the_row_lock(self):
+        upload, locked = self.start(), []
+
+        class Stream(io.BytesIO):
+            def read(stream, size=-1):
+                def try_lock():
+                    try:
+                        with transaction.atomic():
+                            Upload.objects.select_for_update(nowait=True).get(pk=upload.pk)
+                    except DatabaseError:
+                        locked.append(True)
+                    finally:
+                        connections.close_all()
+                thread = threading.Thread(target=try_lock)
+                thread.start()
+                thread.join()
+                return super().read(size)
+
+        upload = uploads.write_chunk(upload.pk, self.user, 0, 10, Stream(self.data))
+        self.assertEqual((upload.offset, locked), (10, []))
+
+    def test_concurrent_finalize_stores_once(self):
+        upload = self.start()
+        self.put(upload, 0, 9)
+        file_digest = hashlib.file_digest
+
+        def slow_digest(*args):
+            time.sleep(0.2)  # both finalizes would be past the status check by now
+            return file_digest(*args)
+
+        def finalize():
+            try:
+                return uploads.finalize(Upload.objects.get(pk=upload.pk)).file
+            finally:
+                connections.close_all()
+
+        with mock.patch("shop.uploads.hashlib.file_digest", slow_digest), ThreadPoolExecutor(2) as pool:
+            names = [f.result() for f in [pool.submit(finalize) for _ in range(2)]]
+        self.assertEqual(names[0], names[1])
+        self.assertEqual(MediaBlob.objects.get().refs, 1)
+
+class NotificationStreamTests(TransactionTestCase):
+    def setUp(self):
+        pubsub_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(pubsub_dir.cleanup)
+        self.enterContext(override_settings(NOTIFICATION_PUBSUB_DIR=os.path.join(pubsub_dir.name, "pubsub")))
+        self.hub = self.enterContext(mock.patch.object(realtime, "hub", realtime.Hub()))
+        self.user = User.objects.create_user("listener@example.com")
+
+    def tearDown(self):
+        if self.hub.subscriber is not None:
+            self.hub.subscriber.stop()
+
+    async def open(self, token=None, method="GET", **headers):
+        """Run the stream in a task; returns (task, sent messages, disconnect)."""
+        token = token or str(AccessToken.for_user(self.user))
+        sent, gone = [], asyncio.Event()
+        headers = [(b"authorization", f"Bearer {token}".encode())] + [
+            (name.replace("_", "-").lower().encode(), str(value).encode()) for name, value in headers.items()]
+
+        async def receive():
+            if not sent:
+                return {"type": "http.request", "body": b""}
+            await gone.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": method, "path": realtime.STREAM_PATH, "headers": headers, "query_string": b""}
+        return asyncio.ensure_future(realtime.notification_stream(scope, receive, send)), sent, gone
+
+    def event_ids(self, sent):
+        body = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+        return [int(line[4:]) for line in body.decode().splitlines() if line.startswith("id: ")]
+
+    async def wait_for(self, condition):
+        for _ in range(200):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        self.fail("timed out")
+
+    async def test_rejects_bad_requests(self):
+        inactive = await sync_to_async(User.objects.create_user)("gone@example.com")
+        inactive_token = str(AccessToken.for_user(inactive))
+        await sync_to_async(User.objects.filter(pk=inactive.pk).update)(is_active=False)
+        expired = AccessToken.for_user(self.user)
+        expired.set_exp(lifetime=-timedelta(seconds=1))
+        for token, method, headers, status in [("not-a-token", "GET", {}, 401), (str(expired), "GET", {}, 401),
+                                               (inactive_token, "GET", {}, 401),
+                                               (None, "POST", {}, 405), (None, "GET", {"last_event_id": "x"}, 400)]:
+            with self.subTest(status=status, method=method):
+                task, sent, _ = await self.open(token, method, **headers)
+                await asyncio.wait_for(task, 2)
+                self.assertEqual(sent[0]["status"], status)
+
+    async def test_replays_then_streams_each_event_once(self):
+        create = sync_to_async(Notification.objects.create)
+        seen = await create(user=self.user, message="seen")
+        missed = [await create(user=self.user, message=f"missed {i}") for i in range(2)]
+        with mock.patch.object(realtime, "_backlog", wraps=realtime._backlog) as backlog:
+            task, sent, gone = await self.open(last_event_id=seen.pk)
+            await self.wait_for(lambda: backlog.called and len(self.event_ids(sent)) == 2)
+        # delivered live after the backlog already replayed it
+        self.hub.dispatch([[missed[1].pk, self.user.pk]])
+        live = await create(user=self.user, message="live")
+        await create(user=await sync_to_async(User.objects.create_user)("other@example.com"), message="not mine")
+        await self.wait_for(lambda: live.pk in self.event_ids(sent))
+        gone.set()
+        await asyncio.wait_for(task, 2)
+        self.assertEqual(self.event_ids(sent), [missed[0].pk, missed[1].pk, live.pk])
+        self.assertEqual(sent[-1], {"type": "http.response.body", "body": b""})
+
+    async def test_ends_when_the_token_expires(self):
+        token = AccessToken.for_user(self.user)
+        token.set_exp(lifetime=timedelta(seconds=1))
+        task, sent, _ = await self.open(str(token))
+        await asyncio.wait_for(task, 3)  # without a disconnect
+        self.assertEqual(sent[0]["status"], 200)
+
+    async def test_heartbeat_rechecks_the_user(self):
+        for change in ({"is_active": False}, {"is_staff": True}):
+            with self.subTest(change), mock.patch.object(realtime, "HEARTBEAT_SECONDS", 0.05):
+                await sync_to_async(User.objects.filter(pk=self.user.pk).update)(is_active=True, is_staff=False)
+                task, sent, _ = await self.open()
+                await self.wait_for(lambda: b": keep-alive\n\n" in [m.get("body") for m in sent])
+                await sync_to_async(User.objects.filter(pk=self.user.pk).update)(**change)
+                await asyncio.wait_for(task, 2)
+
+    def test_pubsub_dir_must_be_private(self):
+        path = pubsub.get_pubsub_dir()
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o700)
+        os.chmod(path, 0o777)
+        with self.assertRaises(PermissionError):
+            pubsub.get_pubsub_dir()
+        with self.assertLogs("shop.pubsub", "ERROR"):
+            pubsub.publish([(1, None)])  # a notification's commit does not fail over it
+        with mock.patch("os.geteuid", return_value=os.geteuid() + 1), self.assertRaises(PermissionError):
+            os.chmod(path, 0o700)
+            pubsub.get_pubsub_dir()
+
+class MediaStorageTests(TransactionTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.media = media.name
+        self.user = User.objects.create_user("media@example.com")
+
+    def png(self, color):
+        buf = io.BytesIO()
+        Image.new("RGB", (4, 4), color).save(buf, "PNG")
+        return ContentFile(buf.getvalue(), name="photo.png")
+
+    def refs(self, name):
+        return MediaBlob.objects.filter(name=name).values_list("refs", flat=True).first()
+
+    def test_references_follow_the_rows(self):
+        first = Item.objects.create(user=self.user, name="a", price=1, image=self.png("red"))
+        second = Item.objects.create(user=self.user, name="b", price=1, image=self.png("red"))
+        name = first.image.name
+        self.assertTrue(name.startswith("cas/"))
+        self.assertEqual((second.image.name, self.refs(name)), (name, 2))  # one file for both
+        profile = Profile.objects.create(user=self.user, phone="5550001111", profile_picture=self.png("red"))
+        self.assertEqual(self.refs(name), 3)
+        second.image = self.png("blue")
+        second.save()
+        self.assertEqual((self.refs(name), self.refs(second.image.name)), (2, 1))
+        Item.objects.get(pk=first.pk).delete()  # loaded fresh: the name comes from the row
+        self.assertEqual(self.refs(name), 1)
+        profile.profile_picture = "profile_pictures/default.png"
+        profile.save()
+        self.assertIsNone(self.refs(name))
+        self.assertFalse(os.path.exists(os.path.join(self.media, name)))
+        self.user.delete()  # cascades to the item
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_reclaim(self):
+        name = content_storage().save("items/x.png", self.png("green"))
+        MediaBlob.objects.filter(name=name).update(refs=0)  # a leaked count
+        disposed = []
+        self.assertFalse(content_storage().reclaim(name, time.time() - 60, disposed.append))  # stored since
+        self.assertTrue(content_storage().reclaim(name, time.time() + 60, disposed.append))
+        self.assertEqual(disposed, [content_storage().path(name)])
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertFalse(content_storage().reclaim("cas/00/missing.png", time.time(), disposed.append))
+
+    def test_gc_media(self):
+        kept = Item.objects.create(user=self.user, name="kept", price=1, image=self.png("red")).image.name
+        leaked = content_storage().save("items/y.png", self.png("blue"))
+        MediaBlob.objects.filter(name=leaked).update(refs=0)
+        names = {kept: True, f"variants/{kept}.200w.webp": True, "profile_pictures/default.png": True,
+                 "items/old.png": False, "variants/items/old.png.200w.webp": False, "cas/tmp/abc": False, leaked: False}
+        old = time.time() - 48 * 3600
+        for name in [*names, "items/new.png"]:
+            path = os.path.join(self.media, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if not os.path.exists(path):
+                open(path, "wb").close()
+            if name != "items/new.png":  # too young to collect
+                os.utime(path, (old, old))
+        quarantine = os.path.join(tempfile.mkdtemp(dir=self.media), "q")
+        for options in ({"dry_run": True}, {"exact": True, "dry_run": True}, {"quarantine": quarantine}):
+            with self.subTest(options):
+                call_command("gc_media", sleep=0, stdout=io.StringIO(), **options)
+                removed = "quarantine" in options
+                for name, referenced in names.items():
+                    self.assertEqual(os.path.exists(os.path.join(self.media, name)), referenced or not removed, name)
+                self.assertTrue(os.path.exists(os.path.join(self.media, "items/new.png")))
+        self.assertTrue(os.path.exists(os.path.join(quarantine, leaked)))
+        call_command("gc_media", sleep=0, min_age=0, quarantine=quarantine, stdout=io.StringIO())
+        self.assertTrue(os.path.exists(os.path.join(quarantine, leaked)))  # never collected from the quarantine
+        with self.assertRaises(CommandError):
+            call_command("gc_media", quarantine=self.media, stdout=io.StringIO())
+        self.assertFalse(MediaBlob.objects.filter(name=leaked).exists())
+        self.assertEqual(self.refs(kept), 1)
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(10000)
+        names = [f"items/{i}.png" for i in range(10000)]
+        for name in names:
+            bloom.add(name)
+        self.assertTrue(all(name in bloom for name in names))
+        false_positives = sum(f"other/{i}.png" in bloom for i in range(10000))
+        self.assertLess(false_positives, 30)  # 0.1% would be 10
+        self.assertLess(len(bloom.bits), 10000 * 1.9)
+
+class BatchTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("batch@example.com")
+        self.item = Item.objects.create(user=self.user, name="batched", price=3)
+        Category.objects.create(name="batch")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def batch(self, requests, parallel=False, client=None, **extra):
+        response = (client or self.client).post("/api/batch/", {"requests": requests, "parallel": parallel},
+                                                format="json", **extra)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data["responses"]
+
+    def test_authenticates_once(self):
+        paths = ["/api/categories/", "/api/items/", f"/api/items/{self.item.pk}/", "/api/notifications/unread_count/"]
+        with mock.patch.object(CachedJWTAuthentication, "authenticate", autospec=True,
+                               side_effect=CachedJWTAuthentication.authenticate) as authenticate:
+            responses = self.batch(paths)
+        self.assertEqual(authenticate.call_count, 1)
+        self.assertEqual([r["status"] for r in responses], [200] * 4)
+        self.assertEqual(responses[2]["body"]["name"], "batched")
+
+    def test_anonymous_sub_requests_are_refused(self):
+        responses = self.batch(["/api/categories/", f"/api/items/{self.item.pk}/"], client=APIClient())
+        self.assertEqual([r["status"] for r in responses], [401, 401])
+
+    def test_only_drf_views(self):
+        responses = self.batch(["/api/batch/", "/admin/", "/media/variants/items/a.png.200w.webp", "/nowhere/"])
+        self.assertEqual([r["status"] for r in responses], [404] * 4)
+        self.assertEqual(responses[0]["body"], {"detail": "Not an API endpoint."})
+
+    def test_headers(self):
+        etag = self.client.get("/api/categories/")["ETag"]
+        # the batch request's own conditional headers don't reach the sub-requests
+        responses = self.batch(["/api/categories/", {"path": "/api/categories/", "headers": {"If-None-Match": etag}}],
+                               HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual([r["status"] for r in responses], [200, 304])
+        self.assertEqual(responses[0]["headers"]["ETag"], etag)
+        for headers in ({"Authorization": "Bearer x"}, {"X-Forwarded-For": "1.2.3.4"}, {"If-None-Match": 1}):
+            with self.subTest(headers):
+                response = self.client.post("/api/batch/", {"requests": [{"path": "/api/items/", "headers": headers}]},
+                                            format="json")
+                self.assertEqual(response.status_code, 400)
+        response = self.client.post("/api/batch/", {"requests": ["/api/items/"] * 21}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_parallel(self):
+        paths = ["/api/categories/", "/api/items/", f"/api/items/{self.item.pk}/", "/api/batch/"] * 2
+        serial = self.batch(paths)
+        with mock.patch.object(batch, "_run_in_thread", wraps=batch._run_in_thread) as threaded:
+            parallel = self.batch(paths, parallel=True)
+        self.assertEqual(threaded.call_count, len(paths))
+        self.assertEqual([(r["status"], r["body"]) for r in parallel], [(r["status"], r["body"]) for r in serial])
+
+class ReviewClaimTests(TransactionTestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("claimed@example.com")
+        self.admins = [User.objects.create_user(f"admin{i}@example.com", is_staff=True) for i in range(3)]
+        self.items = [Item.objects.create(user=self.owner, name=f"queued {i}", price=10) for i in range(30)]
+
+    def test_concurrent_claims_are_disjoint(self):
+        start = threading.Barrier(len(self.admins))
+
+        def claim(admin):
+            try:
+                start.wait(5)
+                return review.claim_pending(admin, 10)[0]
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(len(self.admins)) as pool:
+            claimed = list(pool.map(claim, self.admins))
+        self.assertEqual([len(ids) for ids in claimed], [10, 10, 10])
+        self.assertEqual(set().union(*claimed), {item.pk for item in self.items})
+        for admin, ids in zip(self.admins, claimed):
+            self.assertEqual(set(Item.objects.filter(claimed_by=admin).values_list("pk", flat=True)), set(ids))
+        self.assertEqual(review.claim_pending(self.admins[0], 10), ([], None))  # all leased
+
+    def test_leases_expire(self):
+        first, until = review.claim_pending(self.admins[0], 5)
+        self.assertEqual(first, [item.pk for item in self.items[:5]])  # oldest first
+        self.assertGreater(until, timezone.now())
+        self.assertEqual(review.claim_pending(self.admins[1], 5)[0], [item.pk for item in self.items[5:10]])
+        Item.objects.filter(pk__in=first).update(claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(review.claim_pending(self.admins[1], 5)[0], first)
+
+    def test_release(self):
+        mine = review.claim_pending(self.admins[0], 4)[0]
+        theirs = review.claim_pending(self.admins[1], 4)[0]
+        self.assertEqual(review.release_claims(self.admins[0], [mine[0], theirs[0]]), 1)  # not someone else's
+        self.assertEqual(review.claim_pending(self.admins[2], 1)[0], [mine[0]])
+        client = APIClient()
+        client.force_authenticate(self.admins[1])
+        self.assertEqual(client.post("/api/items/release/", {}, format="json").data, {"released": 4})
+        self.assertEqual(review.claim_pending(self.admins[2], 4)[0], theirs)
+        self.assertEqual(Item.objects.filter(claimed_by=self.admins[0]).count(), 3)
+
+    def test_claim_next_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.admins[0])
+        response = client.post("/api/items/claim_next/", {"count": 3}, format="json")
+        self.assertEqual([row["id"] for row in response.data["results"]], [item.pk for item in self.items[:3]])
+        for count in (0, 101, "3", True):
+            with self.subTest(count=count):
+                self.assertEqual(client.post("/api/items/claim_next/", {"count": count}, format="json").status_code, 400)
+        client.force_authenticate(self.owner)
+        self.assertEqual(client.post("/api/items/claim_next/", {}, format="json").status_code, 403)
+
+    def test_offers_end_the_lease(self):
+        ids = review.claim_pending(self.admins[0], 5)[0]
+        applied = review.apply_offers({pk: Decimal("7.00") for pk in ids[:3]})
+        self.assertEqual(applied, set(ids[:3]))
+        self.assertEqual(Item.objects.filter(claimed_by__isnull=False).count(), 2)
+        self.assertFalse(Item.objects.filter(pk__in=applied, claimed_until__isnull=False).exists())
+
+class NotificationUpdateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("reader@example.com")
+        self.notification = Notification.objects.create(user=self.user, message="hello")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def patch(self, data):
+        return self.client.patch(f"/api/notifications/{self.notification.pk}/", data, format="json")
+
+    def test_patch_is_read_keeps_counter(self):
+        self.assertEqual(notifications.unread_count(self.user), 1)
+        response = self.patch({"is_read": True})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIs(response.json()["is_read"], True)
+        self.assertEqual(notifications.unread_count(self.user), 0)
+        self.patch({"is_read": True})
+        self.assertEqual(notifications.unread_count(self.user), 0)
+
+        self.assertIs(self.patch({"is_read": False}).json()["is_read"], False)
+        self.assertEqual(notifications.unread_count(self.user), 1)
+        self.assertEqual(notifications.unread_count(self.user), notifications.count_unread(self.user))
+
+    def test_other_fields_leave_is_read_alone(self):
+        # a concurrent mark_read after the view loaded the row is not written back
+        original = Notification.save
+        def save(instance, *args, **kwargs):
+            Notification.objects.filter(pk=instance.pk).update(is_read=True)
+            return original(instance, *args, **kwargs)
+        with mock.patch.object(Notification, "save", save):
+            self.assertEqual(self.patch({"message": "edited"}).status_code, 200)
+        self.assertTrue(Notification.objects.get(pk=self.notification.pk).is_read)
+
+    def test_broadcasts_are_read_only(self):
+        staff = User.objects.create_user("staff@example.com", is_staff=True)
+        broadcast = Notification.objects.create(audience="STAFF", message="new item")
+        self.client.force_authenticate(staff)
+        response = self.client.patch(f"/api/notifications/{broadcast.pk}/", {"is_read": True}, format="json")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(notifications.unread_count(staff), 1)
+
+class PaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("pager@example.com")
+        cls.items = Item.objects.bulk_create(Item(user=cls.user, name=f"page-{i}", price=1) for i in range(11))
+        # runs of equal created_at: only the id tiebreaker orders them
+        stamps = [datetime(2024, 1, 1, tzinfo=dt_timezone.utc) + timedelta(seconds=i // 4) for i in range(11)]
+        for item, stamp in zip(cls.items, stamps):
+            item.created_at = stamp
+        Item.objects.bulk_update(cls.items, ["created_at"])
+        cls.expected = [item.pk for item in sorted(cls.items, key=lambda i: (i.created_at, i.pk), reverse=True)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, path, link):
+        pages = []
+        while path:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200, response.content)
+            pages.append([row["id"] for row in response.data["results"]])
+            path = response.data[link]
+        return pages
+
+    def cursor(self, position, reverse=0):
+        payload = json.dumps({"p": position, "r": reverse}).encode()
+        return "/api/items/?" + urlencode({"cursor": base64.urlsafe_b64encode(payload).decode()})
+
+    def test_walks_forward_and_back(self):
+        forward = self.walk("/api/items/?page_size=3", "next")
+        self.assertEqual(sum(forward, []), self.expected)
+        self.assertEqual([len(page) for page in forward], [3, 3, 3, 2])
+        last = self.client.get("/api/items/?page_size=3")
+        while last.data["next"]:
+            last = self.client.get(last.data["next"])
+        backward = self.walk(last.data["previous"], "previous")
+        self.assertEqual(backward, forward[-2::-1])
+
+    def test_tampered_cursors_are_404(self):
+        stamp = self.items[0].created_at.isoformat()
+        for position in [["x", 1], [None, None], [{"a": 1}, 1], [stamp, "x"], [stamp, [1]], [stamp, True],
+                         [stamp], "x"]:
+            with self.subTest(position):
+                response = self.client.get(self.cursor(position))
+                self.assertEqual(response.status_code, 404, response.content)
+        for cursor in ["!!", base64.urlsafe_b64encode(b"[1]").decode(), "é"]:
+            with self.subTest(cursor):
+                self.assertEqual(self.client.get(f"/api/items/?{urlencode({'cursor': cursor})}").status_code, 404)
+        # values that convert are fine, even out of the column's range
+        for position in [[stamp, self.items[0].pk], [stamp, 1.5], [stamp, 10 ** 30], ["2024-01-01", "4"]]:
+            with self.subTest(position):
+                self.assertEqual(self.client.get(self.cursor(position)).status_code, 200)
+
+class SearchTests(TestCase):
+    WORDS = ["vintage", "denim", "jacket", "leather", "boots", "oak", "table", "guitar", "electric", "acoustic"]
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(2)
+        cls.user = User.objects.create_user("searcher@example.com")
+        cls.categories = Category.objects.bulk_create([Category(name=f"search-{i}") for i in range(3)])
+        cls.items = Item.objects.bulk_create(
+            Item(user=cls.user, name=" ".join(rng.sample(cls.WORDS, 2)), description=" ".join(rng.sample(cls.WORDS, 3)),
+                 price=Decimal(rng.randrange(0, 50000)) / 100, approved=rng.random() < 0.5)
+            for _ in range(150)
+        )
+        for item in cls.items:
+            item.categories.set(rng.sample(cls.categories, rng.randrange(0, 3)))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def ids(self, path):
+        ids = []
+        while path:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200, response.content)
+            ids += [row["id"] for row in response.data["results"]]
+            path = response.data["next"]
+        return ids
+
+    def words(self, item):
+        return set(f"{item.name} {item.description}".split())
+
+    def test_filters_match_reference(self):
+        cats = [c.pk for c in self.categories]
+        for params in [{"min_price": "100", "max_price": "300.5"}, {"approved": "false"},
+                       {"category": f"{cats[0]},{cats[2]}", "approved": "1"}, {"category": str(cats[1]), "max_price": "99"}]:
+            with self.subTest(params):
+                lo, hi = Decimal(params.get("min_price", "-1")), Decimal(params.get("max_price", "1e9"))
+                wanted = {int(c) for c in params.get("category", "").split(",") if c}
+                expected = [
+                    item.pk for item in sorted(self.items, key=lambda i: (i.created_at, i.pk), reverse=True)
+                    if lo <= item.price <= hi
+                    and ("approved" not in params or item.approved == (params["approved"] in ("1", "true")))
+                    and (not wanted or wanted & {c.pk for c in item.categories.all()})
+                ]
+                self.assertTrue(expected)
+                self.assertEqual(self.ids(f"/api/items/?{urlencode(params)}&page_size=7"), expected)
+
+    def test_text_search(self):
+        cases = {
+            "vintage leather jacket": lambda w: {"vintage", "leather", "jacket"} <= w,
+            "Jackets": lambda w: "jacket" in w,  # stemmed
+            "guitar -electric": lambda w: "guitar" in w and "electric" not in w,
+        }
+        for q, matches in cases.items():
+            with self.subTest(q):
+                ids = self.ids(f"/api/items/?{urlencode({'q': q})}&page_size=5")
+                self.assertTrue(ids)
+                self.assertEqual(len(ids), len(set(ids)))  # keyset pages over the rank: no repeats, no gaps
+                self.assertEqual(set(ids), {item.pk for item in self.items if matches(self.words(item))})
+
+    def test_name_outranks_description(self):
+        by_name = Item.objects.create(user=self.user, name="brass lamp", description="old", price=5)
+        by_description = Item.objects.create(user=self.user, name="old", description="brass lamp", price=5)
+        self.assertEqual(self.ids("/api/items/?q=brass"), [by_name.pk, by_description.pk])
+
+class ItemListSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # media, purchase dates and offers set and empty in every combination (bench_list_serializer's catalogue)
+        ListBench().seed(60)
+        owner = User.objects.create_user("Zoë <list>@example.com")
+        Item.objects.create(user=owner, name="théière   \"pot\"", price=Decimal("0.10"), offer_price=Decimal("-0.00"),
+                            image="items/a b/ç%20d.jpg", video="items/videos/x?y.mp4", purchase_date=date(1999, 12, 31))
+
+    def render(self, path, names=None, expand=()):
+        request = RequestFactory().get(path, HTTP_HOST="testserver")
+        base = Item.objects.select_related("user").defer("search_vector").order_by("-created_at", "-id")
+        slow = ItemSerializer(list(base.prefetch_related("categories")), many=True, context={"request": request}).data
+        fast = ItemListSerializer(list(item_rows(base, names, expand)), many=True, context={"request": request}).data
+        return renderers.JSONRenderer().render(slow), renderers.JSONRenderer().render(fast)
+
+    def test_same_json_as_item_serializer(self):
+        shapes = {
+            "/api/items/": (None, ()),
+            "/api/items/?fields=id,name,price,image_srcset": (["id", "name", "price", "image_srcset"], ()),
+            "/api/items/?fields=id,categories,thumbnail&expand=categories": (["id", "categories", "thumbnail"], ("categories",)),
+        }
+        for path, (names, expand) in shapes.items():
+            with self.subTest(path), timezone.override("America/St_Johns"):  # not UTC: no "Z" shortcut
+                slow, fast = self.render(path, names, expand)
+                self.assertGreater(len(slow), 1000)
+                self.assertEqual(fast, slow)
+
+class RendererTests(SimpleTestCase):
+    def assertSameBytes(self, data):
+        self.assertEqual(renderers.JSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_same_bytes_as_drf(self):
+        utc = datetime(2024, 2, 29, 23, 59, 59, 999999, tzinfo=dt_timezone.utc)
+        self.assertSameBytes({
+            "decimals": [Decimal("1.10"), Decimal("-0.00"), Decimal("1E+2")],
+            "times": [utc, utc.astimezone(dt_timezone(timedelta(hours=-3, minutes=-30))), datetime(2020, 1, 1),
+                      date(1999, 12, 31), dt_time(1, 2, 3, 4), timedelta(days=-1, seconds=5)],
+            "text": ["é\u2028\u2029\x00\"\\</script>", gettext_lazy("hello"), b"bytes"],
+            "keys": {1: "int", None: "none", 1.5: "float", True: "bool"},
+            "ints": [2 ** 63 - 1, -2 ** 63, 2 ** 64, -2 ** 70],
+            "other": [uuid.UUID(int=5), {7}, (1, 2), ReturnDict({"a": ReturnList([], serializer=None)}, serializer=None), [], {}],
+        })
+
+    def test_floats(self):
+        rng = random.Random(3)
+        values = [0.0, -0.0, 0.1, 1 / 3, 1e15, 1e16, 1e-4, 1e-5, 1e300, -1e-300, 5e-324, 2.0 ** 53]
+        values += [rng.uniform(-1, 1) * 10 ** rng.randint(-30, 30) for _ in range(2000)]
+        for value in values:
+            drf, ours = renderers.JSONRenderer().render([value]), JSONRenderer().render([value])
+            self.assertEqual(repr(json.loads(ours)), repr(json.loads(drf)))
+            if 1e-4 <= abs(value) < 1e16 or value == 0:
+                self.assertEqual(ours, drf)  # only exponent forms are spelled differently
+
+    def test_item_list(self):
+        rows = [{"id": i, "name": f"item {i}", "price": Decimal(i) / 7, "created_at": datetime.now(dt_timezone.utc),
+                 "categories": list(range(i % 4)), "image": None} for i in range(300)]
+        self.assertSameBytes({"next": "http://testserver/api/items/?cursor=abc", "previous": None, "results": rows})
+
+    def test_parser(self):
+        for body in [b'{"a": [1, 2.5, -0.0, "\\u00e9\\ud83d\\ude00", null, true], "b": {"c": -9223372036854775808}}',
+                     b'[18446744073709551615, 18446744073709551616, -1180591620717411303424, 1e400]']:
+            with self.subTest(body):
+                self.assertEqual(repr(JSONParser().parse(io.BytesIO(body))), repr(parsers.JSONParser().parse(io.BytesIO(body))))
+        for bad in [b"{", b"", b"[1,]", b"[NaN]"]:
+            with self.subTest(bad), self.assertRaises(ParseError):
+                JSONParser().parse(io.BytesIO(bad))
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack_carries_the_json_values(self):
+        data = {"price": Decimal("1.10"), "at": datetime(2024, 1, 1, tzinfo=dt_timezone.utc), "ids": (1, 2), "name": "é"}
+        packed = MessagePackRenderer().render(data)
+        self.assertEqual(MessagePackParser().parse(io.BytesIO(packed)), json.loads(JSONRenderer().render(data)))
+
+class UnreadCounterTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("badge@example.com")
+        self.staff = User.objects.create_user("badge-staff@example.com", is_staff=True)
+
+    def assertCounted(self, user):
+        self.assertEqual(NotificationCounter.objects.get(pk=user.pk).unread, notifications.count_unread(user))
+
+    def test_mark_all_read_keeps_what_it_did_not_read(self):
+        Notification.objects.create(user=self.user, message="a")
+        self.assertEqual(notifications.unread_count(self.user), 1)
+        # as if a notification's counter bump landed while mark_all_read was running
+        NotificationCounter.objects.filter(pk=self.user.pk).update(unread=3)
+        notifications.mark_all_read(self.user)
+        self.assertEqual(notifications.unread_count(self.user), 2)
+
+    def test_mark_all_read_broadcasts(self):
+        first, second, third = (Notification.objects.create(audience="STAFF", message=str(i)) for i in range(3))
+        self.assertEqual(notifications.unread_count(self.staff), 3)
+        notifications.mark_read(second, self.staff)
+        self.assertEqual(notifications.unread_count(self.staff), 2)
+        notifications.mark_all_read(self.staff)
+        self.assertEqual(notifications.unread_count(self.staff), 0)
+        notifications.mark_read(third, self.staff)  # under the watermark: already read
+        Notification.objects.create(audience="STAFF", message="later")
+        self.assertEqual(notifications.unread_count(self.staff), 1)
+        self.assertCounted(self.staff)
+
+    def test_concurrent_creates(self):
+        # notifications keep arriving while the badge is seeded and cleared; like the
+        # job worker's, each is inserted and counted in one transaction
+        stop = threading.Event()
+
+        def arrive():
+            try:
+                while not stop.is_set():
+                    with transaction.atomic():
+                        Notification.objects.create(user=self.user, message="new")
+                        Notification.objects.create(audience="STAFF", message="new")
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(arrive)]
+            try:
+                for _ in range(30):
+                    for user in (self.user, self.staff):  # one at a time: the creators lock both rows
+                        NotificationCounter.objects.filter(pk=user.pk).delete()
+                    futures += [pool.submit(lambda: (notifications.unread_count(self.staff), connections.close_all()))]
+                    notifications.unread_count(self.user)
+                    notifications.mark_all_read(self.user)
+                    notifications.mark_all_read(self.staff)
+            finally:
+                stop.set()
+            for future in futures:
+                future.result()
+        self.assertCounted(self.user)
+        self.assertCounted(self.staff)
+
+    def test_seeding_only_holds_up_its_own_user(self):
+        seeding, done = threading.Event(), threading.Event()
+
+        def seed():
+            try:
+                with transaction.atomic():
+                    notifications._lock_seeds("pg_advisory_xact_lock", [self.user.pk])
+                    seeding.set()
+                    done.wait(10)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(seed)
+            try:
+                seeding.wait(10)
+                with transaction.atomic(), connection.cursor() as cur:
+                    cur.execute("SET LOCAL lock_timeout = '1s'")
+                    Notification.objects.create(user=self.staff, message="other user")
+                    Notification.objects.create(audience="STAFF", message="broadcast")
+                with self.assertRaises(OperationalError), transaction.atomic(), connection.cursor() as cur:
+                    cur.execute("SET LOCAL lock_timeout = '100ms'")
+                    Notification.objects.create(user=self.user, message="waits for the seed")
+            finally:
+                done.set()
+            future.result()
+
+class ConditionalGetTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("etag@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.items = [Item.objects.create(user=self.user, name=f"etag {i}", description="x" * 100, price=i)
+                      for i in range(20)]
+
+    def test_not_modified_until_a_write(self):
+        for path in ("/api/items/", f"/api/items/{self.items[0].pk}/", "/api/categories/", "/api/notifications/"):
+            with self.subTest(path):
+                etag = self.client.get(path)["ETag"]
+                self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+                self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH='"other", ' + etag).status_code, 304)
+                self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+        listed, detail, other = (self.client.get(path)["ETag"] for path in
+                                 ("/api/items/", f"/api/items/{self.items[0].pk}/", f"/api/items/{self.items[1].pk}/"))
+        self.items[0].name = "renamed"
+        self.items[0].save()
+        self.assertEqual(self.client.get("/api/items/", HTTP_IF_NONE_MATCH=listed).status_code, 200)
+        response = self.client.get(f"/api/items/{self.items[0].pk}/", HTTP_IF_NONE_MATCH=detail)
+        self.assertEqual((response.status_code, response.data["name"]), (200, "renamed"))
+        self.assertEqual(self.client.get(f"/api/items/{self.items[1].pk}/", HTTP_IF_NONE_MATCH=other).status_code, 304)
+
+    def test_weak_comparison_after_compression(self):
+        response = self.client.get("/api/items/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith("W/"))
+        for sent in (etag, etag.removeprefix("W/")):
+            with self.subTest(sent):
+                self.assertEqual(self.client.get("/api/items/", HTTP_ACCEPT_ENCODING="gzip",
+                                                 HTTP_IF_NONE_MATCH=sent).status_code, 304)
+                self.assertEqual(self.client.get("/api/items/", HTTP_IF_NONE_MATCH=sent).status_code, 304)
+
+    def test_list_keys_are_bumped_after_commit(self):
+        etag = self.client.get("/api/items/")["ETag"]
+        saving, done = threading.Event(), threading.Event()
+
+        def slow_write():
+            try:
+                with transaction.atomic():
+                    Item.objects.filter(pk=self.items[0].pk).get().save()
+                    saving.set()
+                    done.wait(10)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(slow_write)
+            try:
+                saving.wait(10)
+                # another seller's write does not wait for the open transaction's "items" row lock
+                with transaction.atomic(), connection.cursor() as cur:
+                    cur.execute("SET LOCAL lock_timeout = '1s'")
+                    Item.objects.create(user=User.objects.create_user("other-seller@example.com"), name="x", price=1)
+            finally:
+                done.set()
+            future.result()
+        self.assertEqual(ResourceVersion.objects.get(key="items").version, 2 + len(self.items))  # both bumped
+        self.assertEqual(self.client.get("/api/items/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+class VersionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("versions@example.com")
+        self.item = Item.objects.create(user=self.user, name="lamp", price=5)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/items/{self.item.pk}/"
+
+    def elsewhere(self, **changes):
+        # a write in another process: its cache invalidation never reaches ours
+        with mock.patch("shop.cache.transaction.on_commit"):
+            Item.objects.filter(pk=self.item.pk).update(**changes)
+            bump(*item_keys(self.item.pk))
+
+    def test_local_cache_checks_versions(self):
+        first = self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+        self.elsewhere(name="desk lamp")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual((response.status_code, response.data["name"]), (200, "desk lamp"))
+        with self.assertNumQueries(1):  # the versions; the body came from the cache
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200)
+
+    @override_settings(SHOP_CACHE_SHARED=True)
+    def test_shared_cache_is_not_refilled_with_an_old_version(self):
+        key = cache_key("version", f"item:{self.item.pk}")
+        add = cache.add
+
+        def bump_first(*args, **kwargs):
+            # the bump commits (and drops the key) after current() read the old row
+            if not bumped:
+                bumped.append(True)
+                with self.captureOnCommitCallbacks(execute=True):
+                    bump(*item_keys(self.item.pk))
+            return add(*args, **kwargs)
+
+        bumped = []
+
+        with mock.patch.object(cache, "add", side_effect=bump_first):
+            self.client.get(self.url)
+        self.assertIsNone(cache.get(key))
+        self.client.get(self.url)
+        self.assertEqual(cache.get(key)[0], ResourceVersion.objects.get(key=f"item:{self.item.pk}").version)
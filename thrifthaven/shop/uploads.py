@@ -0,0 +1,140 @@
+"""
+Resumable chunked uploads (for item videos and large images).
+
+    POST /api/uploads/                  {"filename", "size", "kind": "video"|"image", "sha256"?}
+    PUT  /api/uploads/<id>/             raw bytes, Content-Range: bytes <start>-<end>/<size>
+    GET  /api/uploads/<id>/             current offset, to resume after a failure
+    POST /api/uploads/<id>/finalize/    verify, move into media storage
+
+then create or update an Item with ``{"video_upload": "<id>"}`` (or ``image_upload``).
+Each chunk is streamed from the request into a file of its own outside
+MEDIA_ROOT and only then appended to the upload's partial file under a short
+row lock, so no request holds more than one read buffer in memory, no lock is
+held while a slow client sends, and the worker is free again as soon as its
+chunk is on disk.
+"""
+import hashlib
+import os
+import shutil
+import uuid
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from PIL import Image, UnidentifiedImageError
+from rest_framework.exceptions import ValidationError
+from .models import Item, Upload
+
+READ_SIZE = 64 * 1024
+
+class ChunkConflict(Exception):
+    """The chunk does not start where the upload currently ends."""
+    def __init__(self, offset):
+        self.offset = offset
+
+class _PartialFile(File):
+    # FileSystemStorage moves a file that has a temporary path instead of copying it
+    def temporary_file_path(self):
+        return self.name
+
+def get_upload_dir():
+    path = getattr(settings, "CHUNKED_UPLOAD_DIR", None) or os.path.join(settings.BASE_DIR, "upload_sessions")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def partial_path(upload):
+    return os.path.join(get_upload_dir(), f"{upload.pk}.part")
+
+def max_size():
+    return getattr(settings, "CHUNKED_UPLOAD_MAX_SIZE", 2 * 1024 ** 3)
+
+def parse_content_range(header, size):
+    """``bytes 0-1048575/7340032`` -> (0, 1048576); raises ValidationError when malformed."""
+    try:
+        unit, spec = header.split(" ", 1)
+        span, total = spec.split("/", 1)
+        start, end = (int(v) for v in span.split("-", 1))
+        if unit != "bytes" or int(total) != size or not 0 <= start <= end < size:
+            raise ValueError
+    except ValueError:
+        raise ValidationError({"Content-Range": f"Expected 'bytes <start>-<end>/{size}'."})
+    return start, end - start + 1
+
+def write_chunk(upload_id, user, start, length, stream, chunk_sha256=None):
+    """
+    Append ``length`` bytes read from ``stream`` at ``start``; returns the updated Upload.
+
+    The chunk is read off the socket into its own file with no lock held; only
+    then is the session row locked, the offset re-checked, the chunk appended
+    and the offset advanced, so a slow client never holds a row lock and two
+    PUTs for the same upload (e.g. a retry racing the original) cannot interleave.
+    """
+    upload = Upload.objects.get(pk=upload_id, user=user, status="OPEN")
+    if start != upload.offset:
+        raise ChunkConflict(upload.offset)
+    chunk_path = f"{partial_path(upload)}.{uuid.uuid4().hex}"
+    try:
+        digest = hashlib.sha256()
+        with open(chunk_path, "wb") as fh:
+            remaining = length
+            while remaining:
+                data = stream.read(min(READ_SIZE, remaining))
+                if not data:
+                    break
+                fh.write(data)
+                digest.update(data)
+                remaining -= len(data)
+        if remaining or (chunk_sha256 and digest.hexdigest() != chunk_sha256.lower()):
+            # short body or corrupted in transit: drop the chunk, the offset stays put
+            raise ValidationError({"detail": "Chunk incomplete or checksum mismatch; resend it."})
+        with transaction.atomic():
+            upload = Upload.objects.select_for_update().get(pk=upload_id, user=user, status="OPEN")
+            if start != upload.offset:
+                raise ChunkConflict(upload.offset)
+            path = partial_path(upload)
+            with open(path, "r+b" if os.path.exists(path) else "wb") as fh, open(chunk_path, "rb") as chunk:
+                fh.seek(start)
+                shutil.copyfileobj(chunk, fh, READ_SIZE)
+                fh.truncate(start + length)
+            upload.offset = start + length
+            upload.save(update_fields=["offset", "updated_at"])
+    finally:
+        os.unlink(chunk_path)
+    return upload
+
+def finalize(upload):
+    """Check the assembled file and move it into media storage under the Item field's upload_to."""
+    with transaction.atomic():
+        # a concurrent finalize waits here, then sees COMPLETE instead of a vanished partial file
+        upload = Upload.objects.select_for_update().get(pk=upload.pk)
+        if upload.status == "COMPLETE":
+            return upload
+        if upload.offset != upload.size:
+            raise ValidationError({"detail": f"Upload incomplete: {upload.offset} of {upload.size} bytes received."})
+        path = partial_path(upload)
+        if upload.sha256:
+            with open(path, "rb") as fh:
+                if hashlib.file_digest(fh, "sha256").hexdigest() != upload.sha256.lower():
+                    raise ValidationError({"sha256": "Checksum mismatch; the upload is corrupt."})
+        if upload.kind == "image":
+            try:
+                with Image.open(path) as im:
+                    im.verify()
+            except (UnidentifiedImageError, OSError):
+                raise ValidationError({"detail": "Not a valid image."})
+        field = Item._meta.get_field(upload.kind)
+        with open(path, "rb") as fh:
+            upload.file = field.storage.save(field.generate_filename(None, upload.filename), _PartialFile(fh, name=path))
+        if os.path.exists(path):
+            os.unlink(path)
+        upload.status = "COMPLETE"
+        upload.save(update_fields=["file", "status", "updated_at"])
+    return upload
+
+def discard(upload):
+    path = partial_path(upload)
+    if os.path.exists(path):
+        os.unlink(path)
+    if upload.file:
+        # finalized but never attached to an item: give back its storage reference
+        Item._meta.get_field(upload.kind).storage.delete(upload.file)
+    upload.delete()
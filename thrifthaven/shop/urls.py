@@ -1,12 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet, ItemViewSet, NotificationViewSet
+from .views import CategoryViewSet, ItemViewSet, NotificationViewSet, UploadViewSet, batch_requests
 
 router = DefaultRouter()
 router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'items', ItemViewSet, basename='item')
 router.register(r'notifications', NotificationViewSet, basename='notification')
+router.register(r'uploads', UploadViewSet, basename='upload')
 
 urlpatterns = [
+    path('batch/', batch_requests, name='batch'),
     path('', include(router.urls)),
 ]
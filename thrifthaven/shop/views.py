@@ -1,36 +1,65 @@
-from datetime import date
-from decimal import Decimal, ROUND_HALF_UP
-from rest_framework import viewsets, permissions
-from rest_framework.decorators import action
+from django.db import transaction
+from rest_framework import mixins, status, viewsets, permissions
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied, NotFound
-from .models import Category, Item, Notification
-from .serializers import CategorySerializer, ItemSerializer, NotificationSerializer
-
-def compute_offer_price(item: Item) -> Decimal:
-    """10% per full year since purchase_date (cap 70%), then add 15% on top."""
-    base = item.price
-    years = 0
-    if item.purchase_date:
-        years = max(0, date.today().year - item.purchase_date.year - ((date.today().month, date.today().day) < (item.purchase_date.month, item.purchase_date.day)))
-    depreciation = min(Decimal(years) * Decimal("0.10"), Decimal("0.70"))
-    depreciated = (base * (Decimal("1.00") - depreciation))
-    display = (depreciated * Decimal("1.15"))
-    return display.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+from rest_framework.exceptions import PermissionDenied, NotFound, ValidationError
+from . import batch, lifecycle, notifications, sparse, uploads
+from .cache import CachedRetrieveMixin
+from .conditional import ConditionalGetMixin, notification_keys
+from .jobs import enqueue, notify
+from .models import Category, Item, Upload
+from .pagination import KeysetPagination
+from .pricing import compute_offer_price, compute_offers
+from .review import (
+    BULK_LIMIT, CLAIM_LIMIT, apply_offers, claim_pending, decline_items, offer_notifications, pending_items, release_claims,
+)
+from .search import filter_items
+from .serializers import (
+    BatchSerializer, CategorySerializer, ItemFilterSerializer, ItemListSerializer, ItemSerializer, NotificationSerializer,
+    UploadSerializer, item_rows,
+)
 
 class IsOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return hasattr(obj, "user") and obj.user == request.user
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all().order_by("name")
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class ItemViewSet(viewsets.ModelViewSet):
-    queryset = Item.objects.select_related("user").prefetch_related("categories").all().order_by("-created_at")
+    def version_keys(self, pk):
+        return ["categories"]
+
+class ItemViewSet(ConditionalGetMixin, CachedRetrieveMixin, viewsets.ModelViewSet):
+    queryset = Item.objects.select_related("user").prefetch_related("categories").defer("search_vector").order_by("-created_at", "-id")
     serializer_class = ItemSerializer
+    cache_kind = "item"
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action == "list":
+            # ?q=&category=&min_price=&max_price=&approved=, and ?fields=&expand= for the columns
+            names, expand = sparse.select(self.request, ItemSerializer)
+            qs = item_rows(filter_items(qs, self.request.query_params), names, expand)
+        elif self.action == "retrieve" and "fields" in self.request.query_params:
+            names, expand = sparse.select(self.request, ItemSerializer)
+            if "user" not in names:
+                qs = qs.select_related(None)
+            if "categories" not in names:
+                qs = qs.prefetch_related(None)
+            qs = qs.only(*sparse.columns(ItemSerializer, names, expand))
+        return qs
+
+    def get_serializer_class(self):
+        # list responses are read-only: plain rows, not model instances (see ItemListSerializer)
+        return ItemListSerializer if self.action in ("list", "pending", "claim_next") else ItemSerializer
+
+    def version_keys(self, pk):
+        # a deleted category drops out of items without an m2m_changed signal
+        return ["items" if pk is None else f"item:{pk}", "categories"]
 
     def get_serializer_context(self):
         ctx = super().get_serializer_context()
@@ -39,112 +68,282 @@ class ItemViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         obj = serializer.save(user=self.request.user)
+        if obj.image:
+            enqueue("image_variants", source=obj.image.name)
+        return obj
+
+    def perform_update(self, serializer):
+        obj = serializer.save()
+        if serializer.validated_data.get("image") or serializer.validated_data.get("_image_upload"):
+            enqueue("image_variants", source=obj.image.name)
         return obj
 
     # Admin sees only items that haven't been processed (no offer yet and not approved)
     @action(detail=False, methods=["get"], permission_classes=[permissions.IsAdminUser])
     def pending(self, request):
-        qs = Item.objects.filter(approved=False, offer_price__isnull=True).order_by("created_at")
-        return Response(self.get_serializer(qs, many=True).data)
+        qs = Item.objects.select_related("user").prefetch_related("categories").defer("search_vector").filter(
+            approved=False, offer_price__isnull=True
+        ).order_by("created_at", "id")
+        page = self.paginate_queryset(item_rows(qs, *sparse.select(request, ItemSerializer)))
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    # Admin: lease the next pending items, so admins reviewing side by side get different ones.
+    # Body {"count": n}; a lease lasts REVIEW_LEASE_SECONDS, or until released or the item is reviewed.
+    @action(detail=False, methods=["post"], permission_classes=[permissions.IsAdminUser])
+    def claim_next(self, request):
+        count = request.data.get("count", 10)
+        if not isinstance(count, int) or isinstance(count, bool) or not 0 < count <= CLAIM_LIMIT:
+            raise ValidationError({"count": f"Must be an integer from 1 to {CLAIM_LIMIT}."})
+        ids, until = claim_pending(request.user, count)
+        rows = item_rows(Item.objects.filter(pk__in=ids).order_by("created_at", "id"))
+        return Response({"claimed_until": until, "results": self.get_serializer(rows, many=True).data})
+
+    # Admin: hand leased items back to the queue; body {"ids": [...]}, or nothing for all of mine
+    @action(detail=False, methods=["post"], permission_classes=[permissions.IsAdminUser])
+    def release(self, request):
+        ids = request.data.get("ids")
+        if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+            raise ValidationError({"ids": "Must be a list of item ids."})
+        return Response({"released": release_claims(request.user, ids)})
+
+    # Admin: bulk review. Body is {"ids": [...]} or {"filter": {<same keys as the list filters>}},
+    # optionally with "limit"; only pending items are touched, everything else is reported back.
+    def _bulk_targets(self, request):
+        ids, filters = request.data.get("ids"), request.data.get("filter")
+        qs = pending_items().only("id", "name", "price", "purchase_date", "user_id").order_by("created_at", "id")
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+                raise ValidationError({"ids": "Must be a list of item ids."})
+            if len(ids) > BULK_LIMIT:
+                raise ValidationError({"ids": f"At most {BULK_LIMIT} items per call."})
+            return ids, list(qs.filter(pk__in=ids))
+        if isinstance(filters, dict):
+            limit = request.data.get("limit", BULK_LIMIT)
+            if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+                raise ValidationError({"limit": "Must be a positive integer."})
+            params = ItemFilterSerializer(data=filters)
+            if not params.is_valid():
+                raise ValidationError({"filter": params.errors})
+            items = list(filter_items(qs, params.to_params()).order_by("created_at", "id")[:min(limit, BULK_LIMIT)])
+            return [item.pk for item in items], items
+        raise ValidationError({"detail": 'Send "ids" or "filter".'})
+
+    @action(detail=False, methods=["post"], permission_classes=[permissions.IsAdminUser])
+    def bulk_approve(self, request):
+        requested, items = self._bulk_targets(request)
+        offers = dict(zip(
+            [item.pk for item in items],
+            compute_offers([item.price for item in items], [item.purchase_date for item in items]),
+        ))
+        applied = apply_offers(offers)
+        offer_notifications(items, offers, applied)
+        results = [
+            {"id": pk, "status": "offer_sent", "offer_price": str(offers[pk])} if pk in applied
+            else {"id": pk, "status": "skipped", "detail": "Not pending."}
+            for pk in requested
+        ]
+        return Response({"offer_sent": len(applied), "results": results})
+
+    @action(detail=False, methods=["post"], permission_classes=[permissions.IsAdminUser])
+    def bulk_decline(self, request):
+        requested, items = self._bulk_targets(request)
+        deleted = decline_items(items)
+        results = [
+            {"id": pk, "status": "declined_and_deleted"} if pk in deleted
+            else {"id": pk, "status": "skipped", "detail": "Not pending."}
+            for pk in requested
+        ]
+        return Response({"declined": len(deleted), "results": results})
+
+    # Lifecycle transitions (shop/lifecycle.py): each is one conditional statement,
+    # and an item no longer in the state the action starts from answers 409.
+    def _conflict(self, e):
+        return Response({"detail": f"Cannot {e.transition.replace('_', ' ')}: the item is {e.state}.", "state": e.state},
+                        status=status.HTTP_409_CONFLICT)
 
     # Admin: create offer and notify user (do NOT mark approved)
     @action(detail=True, methods=["post"], permission_classes=[permissions.IsAdminUser])
     def approve(self, request, pk=None):
-        try:
-            item = self.get_object()
-        except:
-            raise NotFound("Item not found")
-        if item.offer_price:  # already offered
-            return Response({"detail":"Offer already sent."}, status=400)
+        item = self.get_object()
         offer = compute_offer_price(item)
-        item.offer_price = offer
-        item.save()
-        Notification.objects.create(
-            user=item.user,
-            item=item,
-            type="OFFER",
-            offer_price=offer,
-            message=f"We made an offer for '{item.name}': ${offer}. Accept or decline."
-        )
+        with transaction.atomic():
+            try:
+                lifecycle.apply("approve", item.pk, offer_price=offer)
+            except lifecycle.Conflict as e:
+                return self._conflict(e)
+            notify(
+                user=item.user,
+                item=item,
+                type="OFFER",
+                offer_price=offer,
+                message=f"We made an offer for '{item.name}': ${offer}. Accept or decline."
+            )
         return Response({"status":"offer_sent","offer_price": str(offer)})
 
     # Admin: decline => delete item and notify owner
     @action(detail=True, methods=["post"], permission_classes=[permissions.IsAdminUser])
     def decline(self, request, pk=None):
         item = self.get_object()
-        Notification.objects.create(
-            user=item.user,
-            item=None,
-            type="DECLINED",
-            message=f"Your item '{item.name}' was declined and removed."
-        )
-        item.delete()
+        with transaction.atomic():
+            try:
+                lifecycle.apply("decline", item.pk)
+            except lifecycle.Conflict as e:
+                return self._conflict(e)
+            notify(
+                user=item.user,
+                item=None,
+                type="DECLINED",
+                message=f"Your item '{item.name}' was declined and removed."
+            )
         return Response({"status":"declined_and_deleted"})
 
     # Owner: accept admin offer => publish listing
     @action(detail=True, methods=["post"], permission_classes=[permissions.IsAuthenticated, IsOwner])
     def accept_offer(self, request, pk=None):
         item = self.get_object()
-        if not item.offer_price:
-            return Response({"detail":"No offer to accept."}, status=400)
-        item.approved = True
-        item.save()
-        Notification.objects.create(
-            user=item.user,
-            item=item,
-            type="APPROVED",
-            message=f"Your item '{item.name}' is now live at ${item.offer_price}."
-        )
+        with transaction.atomic():
+            try:
+                lifecycle.apply("accept_offer", item.pk)
+            except lifecycle.Conflict as e:
+                return self._conflict(e)
+            # the offer may have been re-priced since it was read; it is fixed now
+            item.refresh_from_db(fields=["offer_price"])
+            notify(
+                user=item.user,
+                item=item,
+                type="APPROVED",
+                message=f"Your item '{item.name}' is now live at ${item.offer_price}."
+            )
         return Response({"status":"accepted","approved": True})
 
     # Owner: decline admin offer => delete item
     @action(detail=True, methods=["post"], permission_classes=[permissions.IsAuthenticated, IsOwner])
     def decline_offer(self, request, pk=None):
         item = self.get_object()
-        Notification.objects.create(
-            user=item.user,
-            item=None,
-            type="DECLINED",
-            message=f"You declined the offer for '{item.name}'. The item was removed."
-        )
-        item.delete()
+        with transaction.atomic():
+            try:
+                lifecycle.apply("decline_offer", item.pk)
+            except lifecycle.Conflict as e:
+                return self._conflict(e)
+            notify(
+                user=item.user,
+                item=None,
+                type="DECLINED",
+                message=f"You declined the offer for '{item.name}'. The item was removed."
+            )
         return Response({"status":"declined_and_deleted_by_owner"})
 
-    # (Optional) mark sold by owner
+    # Owner: mark a live listing sold
     @action(detail=True, methods=["post"], permission_classes=[permissions.IsAuthenticated, IsOwner])
     def mark_sold(self, request, pk=None):
         item = self.get_object()
-        item.stock = True
-        item.save()
-        Notification.objects.create(
-            user=item.user,
-            item=item,
-            type="SOLD",
-            message=f"'{item.name}' marked as sold."
-        )
+        with transaction.atomic():
+            try:
+                lifecycle.apply("mark_sold", item.pk)
+            except lifecycle.Conflict as e:
+                return self._conflict(e)
+            notify(
+                user=item.user,
+                item=item,
+                type="SOLD",
+                message=f"'{item.name}' marked as sold."
+            )
         return Response({"status":"sold"})
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        # Only the current user's notifications
-        return Notification.objects.filter(user=self.request.user).order_by("-created_at")
+        # The current user's notifications, plus staff broadcasts for admins
+        qs = notifications.visible_to(self.request.user).select_related("item").order_by("-created_at", "-id")
+        if self.request.method in sparse.SAFE_METHODS and "fields" in self.request.query_params:
+            names, expand = sparse.select(self.request, NotificationSerializer)
+            if "item_name" not in names and "item" not in expand:
+                qs = qs.select_related(None)
+            qs = qs.only("created_at", *sparse.columns(NotificationSerializer, names, expand))
+        return qs
+
+    def version_keys(self, pk):
+        return notification_keys([self.request.user.pk], staff=self.request.user.is_staff)
 
     def perform_create(self, serializer):
         raise PermissionDenied("Notifications are system-generated.")
 
+    def perform_update(self, serializer):
+        if serializer.instance.audience != "USER":
+            raise PermissionDenied("Broadcast notifications are shared.")
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        if instance.audience != "USER":
+            raise PermissionDenied("Broadcast notifications are shared.")
+        instance.delete()
+
     @action(detail=True, methods=["post"])
     def mark_read(self, request, pk=None):
         notif = self.get_object()
-        if notif.user != request.user:
+        if notif.audience == "USER" and notif.user != request.user:
             raise PermissionDenied("Not yours.")
-        notif.is_read = True
-        notif.save()
+        notifications.mark_read(notif, request.user)
         return Response({"status":"read"})
 
     @action(detail=False, methods=["post"])
     def mark_all_read(self, request):
-        Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        notifications.mark_all_read(request.user)
         return Response({"status":"all_read"})
+
+    # Badge polling: served from NotificationCounter, not from the notification rows
+    @action(detail=False, methods=["get"])
+    def unread_count(self, request):
+        return Response({"unread_count": notifications.unread_count(request.user)})
+
+# Resumable chunked uploads; the protocol is described in shop/uploads.py
+class UploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin,
+                    viewsets.GenericViewSet):
+    serializer_class = UploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Upload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        uploads.discard(instance)
+
+    def update(self, request, pk=None):
+        # raw body, read straight off the stream; request.data is never touched
+        upload = self.get_object()
+        if upload.status != "OPEN":
+            raise ValidationError({"detail": "Upload already finalized."})
+        start, length = uploads.parse_content_range(request.headers.get("Content-Range", ""), upload.size)
+        if int(request.headers.get("Content-Length") or 0) != length:
+            raise ValidationError({"Content-Length": "Must match the Content-Range span."})
+        try:
+            upload = uploads.write_chunk(upload.pk, request.user, start, length, request.stream,
+                                         request.headers.get("X-Chunk-SHA256"))
+        except uploads.ChunkConflict as e:
+            return Response({"detail": "Chunk does not start at the current offset.", "offset": e.offset},
+                            status=status.HTTP_409_CONFLICT)
+        except Upload.DoesNotExist:
+            raise NotFound()
+        return Response(self.get_serializer(upload).data)
+
+    @action(detail=True, methods=["post"])
+    def finalize(self, request, pk=None):
+        upload = uploads.finalize(self.get_object())
+        return Response(self.get_serializer(upload).data)
+
+
+# App start: several GETs in one round trip, sharing this request's authentication (see shop/batch.py).
+# Open to anonymous callers; each sub-request applies its own view's permissions.
+@api_view(["POST"])
+@permission_classes([permissions.AllowAny])
+def batch_requests(request):
+    serializer = BatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    return Response({"responses": batch.run(request, data["requests"], data["parallel"])})
@@ -0,0 +1,60 @@
+"""
+Worker warm-up, run by wsgi.py / asgi.py when a worker loads the application
+(``WARM_UP_WORKERS``), so the first requests it takes don't pay for connecting,
+building URL patterns and importing/introspecting serializers.
+
+It must run in the worker, not in a pre-fork master (gunicorn ``--preload``):
+connections opened before a fork would be shared by the children. With
+``--preload``, call ``warm_up()`` from gunicorn's ``post_fork`` hook instead.
+
+Only pooled connections are warmed for the whole process. A persistent
+connection (the primary with ``DATABASE_POOL=0``) belongs to the thread that
+opened it, which is the loading thread, so WSGI request threads still connect
+on their first request; under ASGI each request's sync code runs in a thread
+of its own, so there is nothing to keep. Replicas connect per request
+(``CONN_MAX_AGE=0``) and are not opened here.
+"""
+import logging
+import time
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.db import connections
+from django.urls import get_resolver
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+def open_connections(timeout=10):
+    for alias in connections:
+        conn = connections[alias]
+        try:
+            pool = getattr(conn, "pool", None)
+            if pool is not None:
+                pool.open(wait=True, timeout=timeout)  # until min_size connections are up
+            elif conn.settings_dict["CONN_MAX_AGE"]:
+                conn.ensure_connection()  # kept for this thread by CONN_MAX_AGE
+        except Exception as exc:  # a replica may be down; the router copes with that at request time
+            logger.warning("Warm-up could not connect to %s: %s", alias, exc)
+
+def load_serializers():
+    from myapp import serializers as myapp_serializers
+    from shop import serializers as shop_serializers, sparse
+    for module in (shop_serializers, myapp_serializers):
+        for value in vars(module).values():
+            if isinstance(value, type) and issubclass(value, serializers.Serializer) and value.__module__ == module.__name__:
+                try:
+                    value().fields  # builds the model field mappings and fills the _meta caches
+                    if issubclass(value, sparse.SparseFieldsMixin):
+                        sparse.readable(value)
+                except Exception as exc:
+                    logger.warning("Warm-up could not build %s: %s", value.__name__, exc)
+
+def warm_up():
+    if not getattr(settings, "WARM_UP_WORKERS", False):
+        return
+    start = time.perf_counter()
+    get_resolver().reverse_dict  # imports every view module and compiles the patterns
+    load_serializers()
+    get_hasher()
+    open_connections()
+    logger.info("Worker warmed up in %.0fms", (time.perf_counter() - start) * 1000)
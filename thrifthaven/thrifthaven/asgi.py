@@ -2,6 +2,8 @@
 ASGI config for thrifthaven project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Everything is served by Django except the notification event stream, which is
+a long-lived SSE response handled directly in ``shop.realtime``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,11 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'thrifthaven.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from shop.realtime import with_notification_stream  # noqa: E402  (needs the app registry)
+from shop.warmup import warm_up  # noqa: E402
+
+warm_up()
+
+application = with_notification_stream(django_application)
@@ -1,4 +1,5 @@
 import os
+from importlib.util import find_spec
 """
 Django settings for thrifthaven project.
 """
@@ -24,6 +25,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     'shop.apps.ShopConfig',
@@ -32,11 +34,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'shop.compression.CompressionMiddleware',  # before anything that reads or changes the body
+    'shop.querycount.QueryCountMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # move up
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'shop.routers.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -45,16 +50,56 @@ CORS_ALLOW_ALL_ORIGINS = True  # for testing only
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Partial files of resumable uploads (shop/uploads.py), kept outside MEDIA_ROOT until finalized
+CHUNKED_UPLOAD_DIR = os.path.join(BASE_DIR, 'upload_sessions')
+CHUNKED_UPLOAD_MAX_SIZE = 2 * 1024 ** 3
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'myapp.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',  # default for protected endpoints
     ],
+    # orjson-backed JSON (same bytes as DRF's); MessagePack when msgpack is installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'shop.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        *(['shop.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'shop.renderers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        *(['shop.renderers.MessagePackParser'] if find_spec('msgpack') else []),
+    ],
 }
 
+# Users behind JWTs, cached per process (myapp/authentication.py); 0 turns the cache off
+AUTH_USER_CACHE_TTL = 30  # seconds
+AUTH_USER_CACHE_SIZE = 1024
+
+# Threads verifying password hashes at signin (myapp/credentials.py); None = one per CPU
+PASSWORD_HASH_WORKERS = None
+
+# POST /api/batch/ (shop/batch.py)
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_WORKERS = 4  # threads for "parallel": true, each with its own DB connection
+
+# POST /api/items/claim_next/: how long an admin's lease on a pending item lasts (shop/review.py)
+REVIEW_LEASE_SECONDS = 300
+
+# X-DB-Queries response header: SQL statements run for the request (shop/querycount.py)
+QUERY_COUNT_HEADER = DEBUG
+
+# Response compression (shop/compression.py): brotli if installed, else gzip
+COMPRESSION_MIN_SIZE = 1024  # bytes
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Keyset pagination on item / notification lists (clients may ask for up to 100 with ?page_size=)
+SHOP_PAGE_SIZE = 20
+
 ROOT_URLCONF = 'thrifthaven.urls'
 
 TEMPLATES = [
@@ -73,6 +118,24 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'thrifthaven.wsgi.application'
+ASGI_APPLICATION = 'thrifthaven.asgi.application'
+
+# Where ASGI workers bind their notification-stream sockets (host-local pub/sub, see shop/pubsub.py)
+NOTIFICATION_PUBSUB_DIR = os.environ.get('NOTIFICATION_PUBSUB_DIR', '/tmp/thrifthaven-pubsub')
+
+# Cache for serialized items/profiles and ETag versions (shop/cache.py). The local-memory
+# default is per process: with several workers point this at a shared backend, e.g.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'thrifthaven'),
+    }
+}
+SHOP_CACHE_TIMEOUT = 300  # seconds
+# Whether that cache is shared by all processes; None guesses from CACHE_BACKEND (local memory is not).
+# Per-process caches only hold item bodies checked against their ETag versions (shop/cache.py).
+SHOP_CACHE_SHARED = None
 
 # Database
 DATABASES = {
@@ -86,6 +149,47 @@ DATABASES = {
     }
 }
 
+# Pooled connections (psycopg_pool, through Django's pool support): requests borrow a ready
+# connection instead of connecting each time. max_size bounds what one worker process holds,
+# so it should cover its request threads; a request waits up to `timeout` seconds for one.
+# DATABASE_POOL=0, or no psycopg_pool, falls back to persistent per-thread connections.
+if os.environ.get('DATABASE_POOL', '1') != '0' and find_spec('psycopg_pool'):
+    DATABASES['default']['OPTIONS'] = {'pool': {
+        'min_size': int(os.environ.get('DATABASE_POOL_MIN', 2)),
+        'max_size': int(os.environ.get('DATABASE_POOL_MAX', 20)),
+        'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
+        'max_idle': 300,  # seconds; idle connections above min_size are closed
+        'max_lifetime': 1800,  # seconds; recycled so backends don't grow forever
+    }}
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = 60
+# a pooled connection is checked before it is lent out, a persistent one before it is reused
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Open connections and load URL patterns / serializers in each worker before it serves (shop/warmup.py)
+WARM_UP_WORKERS = os.environ.get('WARM_UP_WORKERS', '1') != '0'
+
+# Read replicas for GET requests (shop/routers.py), e.g. DATABASE_REPLICA_HOSTS=10.0.0.2,10.0.0.3:5433.
+# Each is a copy of 'default' on another host; tests read through 'default' (MIRROR). Replicas
+# connect per request (CONN_MAX_AGE=0) rather than through a pool each: a pool would hold min_size
+# connections per replica per process, and a dead replica's health check would wait out the
+# pool timeout instead of connect_timeout. Persistent connections would not be reused under ASGI:
+# each request's sync code runs in its own thread-sensitive context, so every request would open
+# one more and leave it to the garbage collector.
+for _n, _host in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(',')), start=1):
+    _host, _, _port = _host.strip().partition(':')
+    _options = {k: v for k, v in DATABASES['default'].get('OPTIONS', {}).items() if k != 'pool'}
+    DATABASES[f'replica{_n}'] = {**DATABASES['default'], 'HOST': _host, 'PORT': _port or DATABASES['default']['PORT'],
+                                 'OPTIONS': {**_options, 'connect_timeout': 2}, 'CONN_MAX_AGE': 0,
+                                 'TEST': {'MIRROR': 'default'}}
+READ_REPLICAS = [alias for alias in DATABASES if alias.startswith('replica')]
+DATABASE_ROUTERS = ['shop.routers.ReplicaRouter']
+# A user's reads stay on the primary this long after they write; never less than MAX_LAG + CHECK_INTERVAL,
+# how far behind a replica still in use may be. Stickiness goes through the cache, so it must be shared.
+REPLICA_STICKY_SECONDS = 15
+REPLICA_MAX_LAG = 10  # seconds; a replica further behind is skipped
+REPLICA_CHECK_INTERVAL = 5  # seconds between health / lag checks of a replica, per process
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
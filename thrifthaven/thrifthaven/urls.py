@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from shop.images import serve_variant
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,4 +11,6 @@ urlpatterns = [
     path('api/', include('myapp.urls')),
 ]
 
+# Resized picture variants (cache-forever headers, built on demand if missing); before the media catch-all
+urlpatterns += [path(f'{settings.MEDIA_URL.lstrip("/")}variants/<path:name>', serve_variant)]
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
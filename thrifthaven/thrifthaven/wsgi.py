@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'thrifthaven.settings')
 
 application = get_wsgi_application()
+
+from shop.warmup import warm_up  # noqa: E402  (needs the app registry)
+
+warm_up()